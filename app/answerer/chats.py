@@ -1,11 +1,18 @@
+import json
 from enum import Enum
+from typing import Callable
 
+from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.answerer.pull import BusinessJourney
 from app.answerer.push import UserJourney
+from app.answerer.schemas import AnswerOutput, MessageInput
 from app.constants import WHATSAPP_PULL_NUMBER_ID, WHATSAPP_PUSH_NUMBER_ID
 from app.db.models import BusinessConversationORM, BusinessORM, ConversationORM, UserORM
+from app.db.schemas import ConversationUpd
+from app.db.services import merge_temp_conversations, update_temp_conversation
+from app.utils.whatsapp_client import get_whatsapp_client
 
 
 class ChatType(str, Enum):
@@ -22,6 +29,7 @@ class Chat:
 
     def __init__(self, wa_number_id: str, db: Session | None = None) -> None:
         self.wa_number_id = wa_number_id
+        self.db = db
 
         if self.wa_number_id == WHATSAPP_PUSH_NUMBER_ID:
             self.chat_type = ChatType.push
@@ -39,3 +47,62 @@ class Chat:
             raise Exception(
                 f"Cannot accept chat with WhatsApp number ID: {self.wa_number_id}."
             )
+
+    def answer(
+        self,
+        messages: list[MessageInput],
+        db_conversations: list[ConversationORM | BusinessConversationORM],
+        before_send: Callable[[], None] | None = None,
+    ) -> AnswerOutput:
+        """
+        Run the user journey on a burst of messages of the same user, send the
+        answer back to the user and complete the temporary conversations with it.
+        Messages are merged into a single query that is answered once: the last
+        conversation stores the answer and links the WhatsApp IDs of all messages,
+        the previous ones are marked as merged.
+        before_send is called right before the answer is sent, and raises to abort.
+        """
+        message = MessageInput(
+            wa_id=messages[-1].wa_id,
+            phone_number=messages[-1].phone_number,
+            body="\n".join([m.body for m in messages]),
+            timestamp=messages[-1].timestamp,
+        )
+        output, output_user_id = self.user_journey.run(message)
+
+        if output.answer is not None:
+            if before_send is not None:
+                before_send()
+            wa_client = get_whatsapp_client(self.wa_number_id)
+            wa_response = wa_client.send_message(
+                to_phone_number=message.phone_number,
+                message=output.answer,
+            )
+            if wa_response.status_code != status.HTTP_200_OK:
+                raise HTTPException(
+                    status_code=wa_response.status_code,
+                    detail="Answer failed to be sent.",
+                )
+
+        if len(db_conversations) > 1:
+            merge_temp_conversations(
+                db=self.db,
+                db_conversations=db_conversations[:-1],
+                user_id=output_user_id,
+            )
+        update_temp_conversation(
+            db=self.db,
+            db_conversation=db_conversations[-1],
+            conversation_update_in=ConversationUpd(
+                user_id=output_user_id,
+                to_message=output.answer,
+                answer_type=output.type,
+                used_event_ids=json.dumps(output.used_event_ids),
+                merged_wa_ids=(
+                    json.dumps([m.wa_id for m in messages])
+                    if len(messages) > 1
+                    else None
+                ),
+            ),
+        )
+        return output
@@ -31,7 +31,11 @@ from app.answerer.pull.prompts import (
 from app.answerer.schemas import AnswerOutput, DayTimeEnum
 from app.db.enums import AnswerType, CityEnum
 from app.db.schemas import BusinessInDB, Event
-from app.db.services import get_event_by_id, register_event, update_business_info
+from app.db.services import (
+    get_event_by_id,
+    register_events_bulk,
+    update_business_info,
+)
 from app.loader.loader import Loader
 from app.utils.conn import get_llm
 
@@ -124,10 +128,11 @@ class AiAgent:
                 location=location,
                 url=url,
             )
-            db_event = register_event(
-                db=self.db, event_in=event, source=PULL_CHAT_SOURCE
+            # an event sent again is confirmed or cancelled as pending
+            inserted_ids, skipped_ids = register_events_bulk(
+                db=self.db, events_in=[event], source=PULL_CHAT_SOURCE
             )
-            event_ids = [db_event.id]
+            event_ids = inserted_ids + skipped_ids
         else:
             event_ids = []
 
@@ -152,11 +157,11 @@ class AiAgent:
                 raise Exception(
                     f"Pending registration of event (id={self._pending_event_id}) failed. Event not in db."
                 )
-            if is_confirmed:
+            # an event confirmed on a previous registration is left as it is
+            if is_confirmed and not db_event.is_vectorized:
                 events_loader = Loader(db=self.db)
-                # AWS Lambda cannot run functions asynchronously
-                events_loader.vectorize_event(db_event, async_add=False)
-            else:
+                events_loader.vectorize_event(db_event)
+            elif not is_confirmed and not db_event.is_vectorized:
                 self.db.delete(db_event)
 
         return AnswerOutput(
@@ -1,5 +1,4 @@
 import datetime
-import json
 
 from sqlalchemy.orm import Session
 
@@ -14,7 +13,12 @@ from app.constants import (
 from app.db.enums import AnswerType
 from app.db.models import BusinessConversationORM, BusinessORM
 from app.db.schemas import Business, BusinessInDB
-from app.db.services import get_business, get_user_conversations, register_business
+from app.db.services import (
+    get_business,
+    get_conversation_event_ids,
+    get_user_conversations,
+    register_business,
+)
 from app.utils.conversation_utils import db_to_langchain_conversation
 
 
@@ -51,7 +55,17 @@ class BusinessJourney:
             len(db_conversations) > 0
             and db_conversations[-1].answer_type == AnswerType.ai
         ):
-            pending_event_id = json.loads(db_conversations[-1].used_event_ids)[0]
+            # the event may have been deleted since, and unlinked
+            pending_event_id = next(
+                iter(
+                    get_conversation_event_ids(
+                        db=self.db,
+                        conversation_id=db_conversations[-1].id,
+                        orm=BusinessConversationORM,
+                    )
+                ),
+                None,
+            )
         else:
             pending_event_id = None
 
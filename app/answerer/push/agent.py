@@ -3,7 +3,7 @@ import logging
 from typing import Optional
 
 from langchain.agents.output_parsers.openai_tools import OpenAIToolsAgentOutputParser
-from langchain.chains.query_constructor.ir import Comparison, Operation, StructuredQuery
+from langchain.chains.query_constructor.ir import Comparison, Operation
 from langchain.prompts import ChatPromptTemplate, PromptTemplate
 from langchain.prompts.chat import SystemMessagePromptTemplate
 from langchain.schema.agent import AgentFinish
@@ -22,11 +22,12 @@ from app.answerer.push.prompts import (
 from app.answerer.schemas import AnswerOutput, DayTimeEnum
 from app.constants import N_EVENTS_CONTEXT, N_EVENTS_MAX
 from app.db.enums import AnswerType
+from app.db.models import EventORM
 from app.db.schemas import Click, UserInDB
-from app.db.services import get_event_by_id
-from app.utils.conn import get_llm, get_vectorstore, get_vectorstore_translator
+from app.utils.conn import get_embeddings, get_llm
 from app.utils.custom_url import get_custom_url
 from app.utils.datetime_utils import date_to_timestamp
+from app.vectorstore import get_vector_backend
 
 
 class SearchEventsToolInput(BaseModel):
@@ -40,6 +41,75 @@ class SearchEventsToolInput(BaseModel):
     )
 
 
+def get_events_filter(
+    today_date: datetime.date,
+    start_date: datetime.date | None = None,
+    end_date: datetime.date | None = None,
+    time_of_day: DayTimeEnum | None = None,
+) -> Operation:
+    """Build the vectorstore filter of the events available in a date range."""
+    # filter out events based on start and end dates
+    start_date_dt = today_date if start_date is None else start_date
+    end_date_dt = (
+        today_date + datetime.timedelta(days=6) if end_date is None else end_date
+    )
+
+    filters = [
+        Comparison(
+            comparator="lte",
+            attribute="start_date",
+            value=date_to_timestamp(end_date_dt),
+        ),
+        Comparison(
+            comparator="gte",
+            attribute="end_date",
+            value=date_to_timestamp(start_date_dt),
+        ),
+    ]
+
+    # filter out events that are closed in the query's days of the week
+    # the code finds all days of the week in the given range
+    # it then adds a filter where the event must be open in at least one day in the range
+    # example: query is from Monday to Tuesday,
+    # the filter becomes: OR(NOT closed on Monday, NOT closed on Tuesday)
+    days_of_week_in_range = set(
+        [
+            (start_date_dt + datetime.timedelta(days=i)).strftime("%A")
+            for i in range((end_date_dt - start_date_dt).days + 1)
+        ]
+    )
+
+    map_closed_days = {
+        "Monday": "is_closed_mon",
+        "Tuesday": "is_closed_tue",
+        "Wednesday": "is_closed_wed",
+        "Thursday": "is_closed_thu",
+        "Friday": "is_closed_fri",
+        "Saturday": "is_closed_sat",
+        "Sunday": "is_closed_sun",
+    }
+    filters_closed_days = []
+    for day_of_week, attribute in map_closed_days.items():
+        if day_of_week in days_of_week_in_range:
+            filters_closed_days.append(
+                Comparison(comparator="eq", attribute=attribute, value=False)
+            )
+
+    filters.append(Operation(operator="or", arguments=filters_closed_days))
+
+    # filter out events based on time of the day
+    if time_of_day == DayTimeEnum.daytime:
+        filters.append(
+            Comparison(comparator="eq", attribute="is_during_day", value=True)
+        )
+    elif time_of_day == DayTimeEnum.nighttime:
+        filters.append(
+            Comparison(comparator="eq", attribute="is_during_night", value=True)
+        )
+
+    return Operation(operator="and", arguments=filters)
+
+
 class AiAgent:
     def __init__(
         self,
@@ -53,11 +123,23 @@ class AiAgent:
             today_date if today_date is not None else datetime.date.today()
         )
         self.llm = get_llm()
-        self.vectorstore = get_vectorstore()
-        self.vectorstore_translator = get_vectorstore_translator()
+        self.embeddings = get_embeddings()
+        self.vector_backend = get_vector_backend(db=db)
         self.set_tools()
         self._retrieved_events: dict[str, int] = {}
 
+    def get_relevant_events(
+        self, user_query: str, events_filter: Operation
+    ) -> list[EventORM]:
+        """Get the events most relevant to the user's query among the filtered ones."""
+        embedding = self.embeddings.embed_query(user_query)
+        return [
+            db_event
+            for db_event, _ in self.vector_backend.query_events(
+                self.db, embedding, k=N_EVENTS_CONTEXT, filter=events_filter
+            )
+        ]
+
     def search_events(
         self,
         user_query: str,
@@ -66,86 +148,15 @@ class AiAgent:
         time_of_day: DayTimeEnum | None = None,
     ) -> str:
         """Search available events that are most relevant to the user's query."""
-        # filter out events based on start and end dates
-        start_date_dt = self.today_date if start_date is None else start_date
-        end_date_dt = (
-            self.today_date + datetime.timedelta(days=6)
-            if end_date is None
-            else end_date
-        )
-
-        filters = [
-            Comparison(
-                comparator="lte",
-                attribute="start_date",
-                value=date_to_timestamp(end_date_dt),
-            ),
-            Comparison(
-                comparator="gte",
-                attribute="end_date",
-                value=date_to_timestamp(start_date_dt),
-            ),
-        ]
-
-        # filter out events that are closed in the query's days of the week
-        # the code finds all days of the week in the given range
-        # it then adds a filter where the event must be open in at least one day in the range
-        # example: query is from Monday to Tuesday,
-        # the filter becomes: OR(NOT closed on Monday, NOT closed on Tuesday)
-        days_of_week_in_range = set(
-            [
-                (start_date_dt + datetime.timedelta(days=i)).strftime("%A")
-                for i in range((end_date_dt - start_date_dt).days + 1)
-            ]
+        events_filter = get_events_filter(
+            today_date=self.today_date,
+            start_date=start_date,
+            end_date=end_date,
+            time_of_day=time_of_day,
         )
-
-        map_closed_days = {
-            "Monday": "is_closed_mon",
-            "Tuesday": "is_closed_tue",
-            "Wednesday": "is_closed_wed",
-            "Thursday": "is_closed_thu",
-            "Friday": "is_closed_fri",
-            "Saturday": "is_closed_sat",
-            "Sunday": "is_closed_sun",
-        }
-        filters_closed_days = []
-        for day_of_week, attribute in map_closed_days.items():
-            if day_of_week in days_of_week_in_range:
-                filters_closed_days.append(
-                    Comparison(comparator="eq", attribute=attribute, value=False)
-                )
-
-        filters.append(Operation(operator="or", arguments=filters_closed_days))
-
-        # filter out events based on time of the day
-        if time_of_day == DayTimeEnum.daytime:
-            filters.append(
-                Comparison(comparator="eq", attribute="is_during_day", value=True)
-            )
-        elif time_of_day == DayTimeEnum.nighttime:
-            filters.append(
-                Comparison(comparator="eq", attribute="is_during_night", value=True)
-            )
-
-        _, filter_kwargs = self.vectorstore_translator.visit_structured_query(
-            structured_query=StructuredQuery(
-                query=user_query, filter=Operation(operator="and", arguments=filters)
-            )
-        )
-
-        relevant_docs = self.vectorstore.similarity_search(
-            user_query, k=N_EVENTS_CONTEXT, **filter_kwargs
-        )
-
         doc_texts = []
         self._retrieved_events = {}
-        for doc in relevant_docs:
-            db_event = get_event_by_id(db=self.db, id=doc.metadata["id"])
-            if db_event is None:
-                raise Exception(
-                    f"Event in vectorstore is not present in db (id={doc.metadata['id']})."
-                )
-
+        for db_event in self.get_relevant_events(user_query, events_filter):
             custom_url = get_custom_url(
                 Click(event_id=db_event.id, user_id=self.user.id)
             )
@@ -153,7 +164,7 @@ class AiAgent:
 
             doc_texts.append(
                 f"ID: {db_event.id}\n"
-                + f"Description: {doc.page_content}\n"
+                + f"Description: {db_event.description}\n"
                 + (
                     f"Location: {db_event.location}\n"
                     if db_event.location is not None
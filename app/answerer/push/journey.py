@@ -21,19 +21,21 @@ from app.constants import (
     THRESHOLD_NOT_DELIVERED_ANSWER,
 )
 from app.db.enums import AnswerType
-from app.db.models import ConversationORM, UserORM
+from app.db.models import UserORM
 from app.db.schemas import User, UserInDB
 from app.db.services import (
+    UserContext,
+    admit_user,
     block_user,
-    get_user,
-    get_user_answers_count,
-    get_user_conversations,
-    get_user_count,
+    load_user_context,
     register_user,
     unblock_user,
 )
+from app.utils.blocked_users_cache import blocked_users_cache
 from app.utils.conversation_utils import db_to_langchain_conversation
 
+LIMITS_TIMEDELTA = datetime.timedelta(days=7)  # window of the weekly limits
+
 
 class UserJourney:
     def __init__(self, db: Session) -> None:
@@ -47,16 +49,17 @@ class UserJourney:
             db_user = unblock_user(db=self.db, db_user=db_user)
             return AnswerOutput(answer=MESSAGE_GOT_UNBLOCKED, type=AnswerType.template)
 
+        # next messages of the user are dropped by the webhook until the block expires
+        blocked_users_cache.add(db_user.phone_number, db_user.block_expires_at)
         return AnswerOutput(answer=None, type=AnswerType.unanswered)
 
     def _new_user_journey(self, phone_number: str) -> tuple[AnswerOutput, UserORM]:
-        num_users = get_user_count(db=self.db)
-        if num_users > LIMIT_MAX_USERS:
-            new_user_answer = MESSAGE_REACHED_MAX_USERS
-            is_blocked = True
-        else:
+        if admit_user(db=self.db, limit=LIMIT_MAX_USERS):
             new_user_answer = MESSAGE_WELCOME
             is_blocked = False
+        else:
+            new_user_answer = MESSAGE_REACHED_MAX_USERS
+            is_blocked = True
 
         db_user = register_user(
             db=self.db, user_in=User(phone_number=phone_number, is_blocked=is_blocked)
@@ -67,23 +70,19 @@ class UserJourney:
 
     def _check_user_limit_by_answertype(
         self,
-        db_user: UserORM,
+        user_context: UserContext,
         answer_type: AnswerType,
-        timedelta: datetime.timedelta,
         limit: int,
         block_message: str,
     ) -> AnswerOutput | None:
-        count, first_datetime = get_user_answers_count(
-            db=self.db,
-            user_id=db_user.id,
-            answer_type=answer_type,
-            datetime_limit=(datetime.datetime.utcnow() - timedelta),
-        )
+        count, first_datetime = user_context.answers_counts[answer_type]
 
         if count >= limit:
-            block_expires_at = first_datetime + timedelta
-            db_user = block_user(
-                db=self.db, db_user=db_user, block_expires_at=block_expires_at
+            block_expires_at = first_datetime + LIMITS_TIMEDELTA
+            block_user(
+                db=self.db,
+                db_user=user_context.user,
+                block_expires_at=block_expires_at,
             )
             return AnswerOutput(
                 answer=block_message.format(
@@ -95,13 +94,10 @@ class UserJourney:
 
         return None
 
-    def _check_user_limits(self, db_user: UserORM) -> AnswerOutput | None:
-        timedelta = datetime.timedelta(days=7)
-
+    def _check_user_limits(self, user_context: UserContext) -> AnswerOutput | None:
         output = self._check_user_limit_by_answertype(
-            db_user=db_user,
+            user_context=user_context,
             answer_type=AnswerType.ai,
-            timedelta=timedelta,
             limit=LIMIT_ANSWERS_PER_WEEK,
             block_message=MESSAGE_WEEK_ANSWERS_LIMIT,
         )
@@ -109,9 +105,8 @@ class UserJourney:
             return output
 
         output = self._check_user_limit_by_answertype(
-            db_user=db_user,
+            user_context=user_context,
             answer_type=AnswerType.blocked,
-            timedelta=timedelta,
             limit=LIMIT_BLOCKS_PER_WEEK,
             block_message=MESSAGE_WEEK_BLOCKS_LIMIT,
         )
@@ -120,29 +115,22 @@ class UserJourney:
 
         return None
 
-    def _get_previous_conversation(self, user_id: int) -> list[tuple[str, str]]:
-        db_conversations = get_user_conversations(
-            db=self.db,
-            user_id=user_id,
-            from_datetime=(
-                datetime.datetime.now()
-                - datetime.timedelta(hours=CONVERSATION_HOURS_WINDOW)
-            ),
-            orm=ConversationORM,
-            max_messages=CONVERSATION_MAX_MESSAGES,
-        )
-        return db_to_langchain_conversation(db_conversations)
-
-    def _standard_user_journey(self, db_user: UserORM, user_query: str) -> AnswerOutput:
+    def _standard_user_journey(
+        self, user_context: UserContext, user_query: str
+    ) -> AnswerOutput:
         output = (
-            self._check_user_limits(db_user=db_user) if not db_user.is_admin else None
+            self._check_user_limits(user_context=user_context)
+            if not user_context.user.is_admin
+            else None
         )
 
         if output is None:
-            agent = AiAgent(db=self.db, user=UserInDB.from_orm(db_user))
+            agent = AiAgent(db=self.db, user=UserInDB.from_orm(user_context.user))
             output = agent.run(
                 user_query,
-                previous_conversation=self._get_previous_conversation(db_user.id),
+                previous_conversation=db_to_langchain_conversation(
+                    user_context.conversations
+                ),
             )
 
         return output
@@ -150,10 +138,24 @@ class UserJourney:
     def run(self, message: MessageInput) -> tuple[AnswerOutput, int]:
         current_timestamp = int(datetime.datetime.utcnow().timestamp())
 
-        db_user = get_user(self.db, phone_number=message.phone_number)
-        if db_user is None:
+        # user, answers counters and previous conversation are loaded at once
+        user_context = load_user_context(
+            db=self.db,
+            phone_number=message.phone_number,
+            answer_types=[AnswerType.ai, AnswerType.blocked],
+            answers_from_datetime=datetime.datetime.utcnow() - LIMITS_TIMEDELTA,
+            conversations_from_datetime=(
+                datetime.datetime.now()
+                - datetime.timedelta(hours=CONVERSATION_HOURS_WINDOW)
+            ),
+            max_messages=CONVERSATION_MAX_MESSAGES,
+        )
+        if user_context is None:
             output, db_user = self._new_user_journey(phone_number=message.phone_number)
         else:
+            db_user = user_context.user
+            # the block may have been lifted by another process since it was cached
+            blocked_users_cache.discard(db_user.phone_number)
             if db_user.is_blocked:
                 output = self._blocked_user_journey(db_user=db_user)
             elif current_timestamp - message.timestamp > THRESHOLD_NOT_DELIVERED_ANSWER:
@@ -162,7 +164,7 @@ class UserJourney:
                 )
             else:
                 output = self._standard_user_journey(
-                    db_user=db_user, user_query=message.body
+                    user_context=user_context, user_query=message.body
                 )
 
         return (output, db_user.id)
@@ -1,12 +1,43 @@
 from enum import Enum
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.db.enums import AnswerType
 
 
+class WebhookText(BaseModel):
+    body: str
+
+
+class WebhookMessage(BaseModel):
+    # unsupported and system messages may lack any of these, they are skipped
+    from_: str | None = Field(default=None, alias="from")
+    id: str | None = None
+    timestamp: int | None = None
+    type: str | None = None
+    text: WebhookText | None = None
+
+
+class WebhookMetadata(BaseModel):
+    phone_number_id: str
+
+
+class WebhookValue(BaseModel):
+    # status callbacks carry "statuses" instead of "messages", left unparsed
+    metadata: WebhookMetadata | None = None
+    messages: list[WebhookMessage] | None = None
+
+
+class WebhookChange(BaseModel):
+    value: WebhookValue
+
+
+class WebhookEntry(BaseModel):
+    changes: list[WebhookChange] = []
+
+
 class WebhookPayload(BaseModel):
-    entry: list
+    entry: list[WebhookEntry]
     object: str
 
 
@@ -1,36 +1,49 @@
+import asyncio
 import datetime
-import json
+import logging
+from collections import Counter
 
-from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.requests import Request
-from sqlalchemy.orm import Session
+from pydantic import ValidationError
 
 from app.answerer.chats import Chat
-from app.answerer.schemas import MessageInput, WebhookPayload
-from app.constants import WHATSAPP_HOOK_TOKEN
-from app.db.db import get_db
-from app.db.schemas import ConversationTemp, ConversationUpd
-from app.db.services import (
-    delete_temp_conversation,
-    get_conversation_by_waid,
-    register_temp_conversation,
-    update_temp_conversation,
+from app.answerer.schemas import AnswerOutput, MessageInput, WebhookPayload
+from app.constants import (
+    WEBHOOK_STATS_LOG_INTERVAL,
+    WEBHOOK_USE_QUEUE,
+    WHATSAPP_HOOK_TOKEN,
+    WHATSAPP_PUSH_NUMBER_ID,
 )
-from app.utils.whatsapp_client import WhatsappWrapper
+from app.db.async_services import (
+    claim_temp_conversations,
+    delete_temp_conversations,
+    register_jobs,
+)
+from app.db.db import SessionLocal, engine_metrics, get_async_engine, get_async_session
+from app.db.schemas import ConversationTemp, Job
+from app.db.services import delete_temp_conversations as delete_temp_conversations_sync
+from app.db.services import get_conversations_by_ids
+from app.utils.blocked_users_cache import blocked_users_cache
+from app.utils.whatsapp_client import get_whatsapp_client
 
 webhook = APIRouter()
 
+# requests received by the webhook of this process, and the ones that skipped the db
+webhook_stats: Counter[str] = Counter()
+
 
 # @webhook.post("/send_template_message")
 async def send_template_message(from_number_id: str, to_phone_number: str):
-    wa_client = WhatsappWrapper(number_id=from_number_id)
+    wa_client = get_whatsapp_client(from_number_id)
     response = wa_client.send_template_message(to_phone_number, "hello_world", "en_US")
     return {"status_code": response.status_code, "content": response.text}
 
 
 # @webhook.post("/send_text_message")
 async def send_text_message(from_number_id: str, to_phone_number: str, message: str):
-    wa_client = WhatsappWrapper(number_id=from_number_id)
+    wa_client = get_whatsapp_client(from_number_id)
     response = wa_client.send_message(to_phone_number, message)
     return {"status_code": response.status_code, "content": response.text}
 
@@ -56,86 +69,220 @@ async def webhook_get_request(request: Request):
     )
 
 
-@webhook.post("/webhooks", include_in_schema=False)
-async def webhook_post_request(payload: WebhookPayload, db: Session = Depends(get_db)):
-    db_conversation = None
+def _answer_user_messages(
+    wa_number_id: str, messages: list[tuple[MessageInput, int]]
+) -> AnswerOutput:
+    """
+    Answer the messages of a single user, given with the ids of their temporary
+    conversations, all at once. A dedicated db session is used so that different
+    users can be answered concurrently.
+    """
+    db = SessionLocal()
     try:
-        payload_value = payload.entry[0]["changes"][0]["value"]
-        if "messages" not in payload_value:
-            return Response(
-                content="Not answering - request is not a message.",
-                status_code=status.HTTP_200_OK,
+        chat = Chat(wa_number_id=wa_number_id, db=db)
+        conversation_ids = [conversation_id for _, conversation_id in messages]
+        try:
+            return chat.answer(
+                messages=[message for message, _ in messages],
+                db_conversations=get_conversations_by_ids(
+                    db=db, ids=conversation_ids, orm=chat.conversation_orm
+                ),
+            )
+        except Exception:
+            db.rollback()
+            delete_temp_conversations_sync(
+                db=db, ids=conversation_ids, orm=chat.conversation_orm
             )
+            raise
+    finally:
+        db.close()
 
-        from_number_id = payload_value["metadata"]["phone_number_id"]
-        chat = Chat(wa_number_id=from_number_id, db=db)
 
-        input_message = payload_value["messages"][0]
-        if "type" not in input_message or input_message["type"] != "text":
-            return Response(
-                content="Not answering - message type is not text.",
-                status_code=status.HTTP_200_OK,
-            )
+def _parse_text_messages(
+    payload: WebhookPayload,
+) -> tuple[bool, dict[str, list[MessageInput]]]:
+    """
+    Classify a webhook payload without touching the db: return whether it
+    carries any message, and its text messages grouped by WhatsApp number ID.
+    Status callbacks (sent, delivered, read) carry no messages, and the
+    messages that are not text or lack a field are skipped.
+    """
+    has_messages = False
+    messages_per_number_id: dict[str, list[MessageInput]] = {}
+    for entry in payload.entry:
+        for change in entry.changes:
+            if change.value.messages is None:
+                continue
+            has_messages = True
+
+            if change.value.metadata is None:
+                continue
+            from_number_id = change.value.metadata.phone_number_id
+            for input_message in change.value.messages:
+                if (
+                    input_message.type != "text"
+                    or input_message.text is None
+                    or input_message.from_ is None
+                    or input_message.id is None
+                    or input_message.timestamp is None
+                ):
+                    continue
+                messages_per_number_id.setdefault(from_number_id, []).append(
+                    MessageInput(
+                        phone_number=input_message.from_,
+                        wa_id=input_message.id,
+                        body=input_message.text.body,
+                        timestamp=input_message.timestamp,
+                    )
+                )
+    return has_messages, messages_per_number_id
+
 
-        message = MessageInput(
-            phone_number=input_message["from"],
-            wa_id=input_message["id"],
-            body=input_message["text"]["body"],
-            timestamp=int(input_message["timestamp"]),
+@webhook.post("/webhooks", include_in_schema=False)
+async def webhook_post_request(request_payload: dict):
+    webhook_stats["requests"] += 1
+    if webhook_stats["requests"] % WEBHOOK_STATS_LOG_INTERVAL == 0:
+        logging.info(
+            "Webhook requests that skipped the database: "
+            + f"{webhook_stats['db_skipped'] / webhook_stats['requests']:.1%} "
+            + f"of {webhook_stats['requests']}, "
+            + f"messages of blocked users dropped: {webhook_stats['blocked_dropped']}."
+        )
+        logging.info(f"Db engine metrics: {engine_metrics.snapshot()}")
+        _, async_engine_metrics = get_async_engine()
+        logging.info(f"Async db engine metrics: {async_engine_metrics.snapshot()}")
+
+    # any payload is acknowledged, otherwise Meta retries it and may disable the hook
+    try:
+        payload = WebhookPayload.parse_obj(request_payload)
+    except ValidationError as e:
+        logging.warning(f"Unexpected webhook payload: {e}")
+        webhook_stats["db_skipped"] += 1
+        return Response(
+            content="Not answering - unexpected payload.",
+            status_code=status.HTTP_200_OK,
+        )
+    has_messages, messages_per_number_id = _parse_text_messages(payload)
+    if not has_messages:
+        webhook_stats["db_skipped"] += 1
+        return Response(
+            content="Not answering - request is not a message.",
+            status_code=status.HTTP_200_OK,
+        )
+    if len(messages_per_number_id) == 0:
+        webhook_stats["db_skipped"] += 1
+        return Response(
+            content="Not answering - message type is not text.",
+            status_code=status.HTTP_200_OK,
         )
 
-        db_conversation = get_conversation_by_waid(
-            db=db, wa_id=message.wa_id, orm=chat.conversation_orm
+    # messages of users known to be blocked are dropped before any db write
+    if WHATSAPP_PUSH_NUMBER_ID in messages_per_number_id:
+        messages = messages_per_number_id.pop(WHATSAPP_PUSH_NUMBER_ID)
+        allowed_messages = [
+            m for m in messages if not blocked_users_cache.is_blocked(m.phone_number)
+        ]
+        webhook_stats["blocked_dropped"] += len(messages) - len(allowed_messages)
+        if len(allowed_messages) > 0:
+            messages_per_number_id[WHATSAPP_PUSH_NUMBER_ID] = allowed_messages
+    if len(messages_per_number_id) == 0:
+        webhook_stats["db_skipped"] += 1
+        return Response(
+            content="Not answering - user is blocked.",
+            status_code=status.HTTP_200_OK,
         )
-        if db_conversation is not None:
+
+    # the db session is opened only once there are text messages to answer
+    db = get_async_session()
+    # temporary conversations not yet handed to the answering tasks or to the queue
+    pending_conversations: list[tuple[type, list[int]]] = []
+    try:
+        jobs_in: list[Job] = []
+        answer_tasks = []
+        for from_number_id, messages in messages_per_number_id.items():
+            chat = Chat(wa_number_id=from_number_id)
+
+            # claim the messages, the ones already processed are dropped
+            claimed_conversation_ids = await claim_temp_conversations(
+                db=db,
+                conversations_temp_in=[
+                    ConversationTemp(
+                        from_message=message.body,
+                        wa_id=message.wa_id,
+                        received_at=datetime.datetime.utcfromtimestamp(
+                            message.timestamp
+                        ),
+                    )
+                    for message in messages
+                ],
+                orm=chat.conversation_orm,
+            )
+            if len(claimed_conversation_ids) == 0:
+                continue
+            pending_conversations.append(
+                (chat.conversation_orm, list(claimed_conversation_ids.values()))
+            )
+
+            messages_per_user: dict[str, list[tuple[MessageInput, int]]] = {}
+            for message in sorted(messages, key=lambda m: m.timestamp):
+                conversation_id = claimed_conversation_ids.pop(message.wa_id, None)
+                if conversation_id is None:
+                    continue
+
+                if WEBHOOK_USE_QUEUE:
+                    # the answer is elaborated and sent by the background worker
+                    jobs_in.append(
+                        Job(
+                            wa_number_id=from_number_id,
+                            conversation_id=conversation_id,
+                            **message.dict(),
+                        )
+                    )
+                else:
+                    messages_per_user.setdefault(message.phone_number, []).append(
+                        (message, conversation_id)
+                    )
+
+            answer_tasks += [
+                run_in_threadpool(_answer_user_messages, from_number_id, user_messages)
+                for user_messages in messages_per_user.values()
+            ]
+
+        if len(pending_conversations) == 0:
             return Response(
                 content="Not answering - message already processed.",
                 status_code=status.HTTP_200_OK,
             )
-        db_conversation = register_temp_conversation(
-            db=db,
-            conversation_temp_in=ConversationTemp(
-                from_message=message.body,
-                wa_id=message.wa_id,
-                received_at=datetime.datetime.utcfromtimestamp(message.timestamp),
-            ),
-            user_orm=chat.user_orm,
-            conversation_orm=chat.conversation_orm,
-        )
-
-        output, output_user_id = chat.user_journey.run(message)
 
-        if output.answer is not None:
-            wa_client = WhatsappWrapper(number_id=chat.wa_number_id)
-            wa_response = wa_client.send_message(
-                to_phone_number=message.phone_number,
-                message=output.answer,
+        if WEBHOOK_USE_QUEUE:
+            await register_jobs(db=db, jobs_in=jobs_in)
+            return Response(
+                content=f"OK - {len(jobs_in)} messages queued.",
+                status_code=status.HTTP_200_OK,
             )
-            if wa_response.status_code != status.HTTP_200_OK:
-                raise HTTPException(
-                    status_code=wa_response.status_code,
-                    detail="Answer failed to be sent.",
-                )
 
-        db_conversation = update_temp_conversation(
-            db=db,
-            db_conversation=db_conversation,
-            conversation_update_in=ConversationUpd(
-                user_id=output_user_id,
-                to_message=output.answer,
-                answer_type=output.type,
-                used_event_ids=json.dumps(output.used_event_ids),
-            ),
-        )
+        # users are answered concurrently, each task cleans up its own failures
+        pending_conversations = []
+        results = await asyncio.gather(*answer_tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
 
         return Response(
-            content=f"OK - correctly answered with type: {output.type}.",
+            content=(
+                "OK - correctly answered with types: "
+                + ", ".join(output.type for output in results)
+                + "."
+            ),
             status_code=status.HTTP_200_OK,
         )
 
     except Exception as e:
-        if db_conversation:
-            delete_temp_conversation(db=db, db_conversation=db_conversation)
+        await db.rollback()
+        for conversation_orm, conversation_ids in pending_conversations:
+            await delete_temp_conversations(
+                db=db, ids=conversation_ids, orm=conversation_orm
+            )
 
         if type(e) == HTTPException:
             raise e
@@ -144,3 +291,6 @@ async def webhook_post_request(payload: WebhookPayload, db: Session = Depends(ge
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Something went wrong - {e}",
         )
+
+    finally:
+        await db.close()
@@ -0,0 +1,148 @@
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from sqlalchemy.orm import Session
+
+from app.answerer.chats import Chat
+from app.answerer.schemas import MessageInput
+from app.constants import WORKER_CONCURRENCY, WORKER_POLL_INTERVAL
+from app.db.db import SessionLocal
+from app.db.services import (
+    claim_user_jobs,
+    complete_jobs,
+    delete_temp_conversations,
+    fail_jobs,
+    fail_timed_out_jobs,
+    get_conversations_by_ids,
+    get_jobs_by_ids,
+    renew_job_leases,
+)
+
+
+class Worker:
+    """
+    Background worker answering the messages queued by the webhook.
+    Jobs are claimed from the database and processed in a bounded thread pool.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = WORKER_CONCURRENCY,
+        poll_interval: float = WORKER_POLL_INTERVAL,
+    ) -> None:
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._futures: set[Future] = set()
+
+    @staticmethod
+    def renew_leases(job_ids: list[int], job_attempts: dict[int, int]) -> None:
+        """
+        Check that the jobs were not claimed again after their timeout, and
+        restart it, in a session of its own not to commit the answer's changes.
+        """
+        with SessionLocal() as lease_db:
+            if not renew_job_leases(db=lease_db, job_attempts=job_attempts):
+                raise Exception(f"Jobs (ids={job_ids}) claimed again by a worker.")
+
+    def process_jobs(self, job_ids: list[int]) -> None:
+        """
+        Answer the messages of the jobs of a single user all at once,
+        with a dedicated database session. The answer is sent only if the jobs
+        are still held: the attempt they were claimed with is their lease.
+        """
+        db = SessionLocal()
+        db_jobs = get_jobs_by_ids(db=db, ids=job_ids)
+        job_attempts = {db_job.id: db_job.attempts for db_job in db_jobs}
+        db_conversations = None
+        try:
+            chat = Chat(wa_number_id=db_jobs[0].wa_number_id, db=db)
+            db_conversations = get_conversations_by_ids(
+                db=db,
+                ids=[db_job.conversation_id for db_job in db_jobs],
+                orm=chat.conversation_orm,
+            )
+
+            output = chat.answer(
+                messages=[
+                    MessageInput(
+                        wa_id=db_job.wa_id,
+                        phone_number=db_job.phone_number,
+                        body=db_job.body,
+                        timestamp=db_job.timestamp,
+                    )
+                    for db_job in db_jobs
+                ],
+                db_conversations=db_conversations,
+                before_send=lambda: self.renew_leases(job_ids, job_attempts),
+            )
+            complete_jobs(db=db, db_jobs=db_jobs)
+            logging.info(f"Jobs (ids={job_ids}) answered with type: {output.type}.")
+
+        except Exception as e:
+            logging.exception(f"Jobs (ids={job_ids}) failed: {e}")
+            db.rollback()
+            if not renew_job_leases(db=db, job_attempts=job_attempts):
+                # the jobs are handled by the worker that claimed them again
+                return
+            is_failed = fail_jobs(db=db, db_jobs=db_jobs, error=str(e))
+            if is_failed and db_conversations:
+                delete_temp_conversations(
+                    db=db,
+                    ids=[db_conversation.id for db_conversation in db_conversations],
+                    orm=chat.conversation_orm,
+                )
+
+        finally:
+            db.close()
+
+    def fail_timed_out_jobs(self, db: Session) -> None:
+        """Fail the timed out jobs out of attempts, and drop their conversations."""
+        conversation_ids_per_number_id: dict[str, list[int]] = {}
+        for job in fail_timed_out_jobs(db=db):
+            logging.warning(f"Job (id={job.id}) timed out after its last attempt.")
+            conversation_ids_per_number_id.setdefault(job.wa_number_id, []).append(
+                job.conversation_id
+            )
+        for wa_number_id, conversation_ids in conversation_ids_per_number_id.items():
+            delete_temp_conversations(
+                db=db,
+                ids=conversation_ids,
+                orm=Chat(wa_number_id=wa_number_id, db=db).conversation_orm,
+            )
+
+    def run_once(self) -> int:
+        """
+        Fail the timed out jobs, then claim the jobs of as many users as there
+        are free slots and submit them.
+        """
+        self._futures = {f for f in self._futures if not f.done()}
+        free_slots = self.concurrency - len(self._futures)
+        if free_slots <= 0:
+            return 0
+
+        db = SessionLocal()
+        try:
+            self.fail_timed_out_jobs(db=db)
+            jobs_ids_per_user = [
+                [db_job.id for db_job in user_jobs]
+                for user_jobs in claim_user_jobs(db=db, limit=free_slots)
+            ]
+        finally:
+            db.close()
+
+        for job_ids in jobs_ids_per_user:
+            self._futures.add(self.executor.submit(self.process_jobs, job_ids))
+        return len(jobs_ids_per_user)
+
+    def run(self) -> None:
+        logging.info(f"Starting worker with concurrency: {self.concurrency}")
+        while True:
+            if self.run_once() == 0:
+                time.sleep(self.poll_interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    Worker().run()
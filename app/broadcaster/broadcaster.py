@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import datetime
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable
+
+from sqlalchemy.orm import Session
+
+from app.constants import (
+    BROADCAST_BATCH_SIZE,
+    BROADCAST_CONCURRENCY,
+    BROADCAST_MAX_ATTEMPTS,
+    BROADCAST_RETRY_INTERVAL,
+    BROADCAST_STATUS_FLUSH_SIZE,
+    WHATSAPP_MESSAGES_PER_SECOND,
+    WHATSAPP_PUSH_NUMBER_ID,
+)
+from app.db.enums import BroadcastStatus
+from app.db.models import BroadcastORM
+from app.db.schemas import Broadcast
+from app.db.services import (
+    get_broadcast_by_id,
+    get_pending_broadcast_messages,
+    register_broadcast,
+    update_broadcast_messages,
+)
+from app.utils.whatsapp_client import get_whatsapp_client
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the rate of asynchronous operations.
+    The capacity is the burst let through on top of the rate, so it is kept
+    small by default for the rate never to be exceeded by more than a token.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(self.capacity)
+        self._updated_at = self.clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and consume it."""
+        async with self._lock:
+            self._refill()
+            # a missing token is borrowed and waited for, the next refill repays it
+            self._tokens -= 1
+            if self._tokens < 0:
+                await self.sleep(-self._tokens / self.rate)
+
+
+def get_message_status(status_code: int | None, attempts: int) -> BroadcastStatus:
+    """
+    Status of a message after a send attempt: the ones rejected with a
+    retryable error (not reachable, rate limited or server error) are left
+    pending until their attempts are exhausted.
+    """
+    if status_code == 200:
+        return BroadcastStatus.sent
+    is_retryable = status_code is None or status_code == 429 or status_code >= 500
+    if is_retryable and attempts < BROADCAST_MAX_ATTEMPTS:
+        return BroadcastStatus.pending
+    return BroadcastStatus.failed
+
+
+class Broadcaster:
+    """
+    Send a template message to many users through the WhatsApp Cloud API.
+    Sends are concurrent and throttled by a token bucket sized to the WhatsApp tier,
+    and the status of each message is stored so that a broadcast can be resumed.
+    """
+
+    def __init__(
+        self,
+        db: Session | None,
+        wa_number_id: str,
+        rate: float = WHATSAPP_MESSAGES_PER_SECOND,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        batch_size: int = BROADCAST_BATCH_SIZE,
+    ) -> None:
+        self.db = db
+        self.wa_number_id = wa_number_id
+        # the messages are retried by the passes of send_pending, not by the
+        # client, so that a message is sent at most BROADCAST_MAX_ATTEMPTS times
+        self.wa_client = get_whatsapp_client(wa_number_id, max_retries=0)
+        self.rate = rate
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+    def create_broadcast(
+        self,
+        template_name: str,
+        language_code: str,
+        phone_numbers: list[str] | None = None,
+    ) -> BroadcastORM:
+        """Register a broadcast, to all the users that are not blocked by default."""
+        return register_broadcast(
+            db=self.db,
+            broadcast_in=Broadcast(
+                wa_number_id=self.wa_number_id,
+                template_name=template_name,
+                language_code=language_code,
+            ),
+            phone_numbers=phone_numbers,
+        )
+
+    async def send_batch(
+        self,
+        messages: list[tuple[int, str]],
+        template_name: str,
+        language_code: str,
+        token_bucket: TokenBucket,
+        executor: ThreadPoolExecutor,
+    ) -> AsyncIterator[tuple[int, int | None]]:
+        """
+        Send a template message to a batch of (message id, phone number).
+        Yield the status code of each send as it completes, None if WhatsApp
+        was not reachable.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(message_id: int, phone_number: str) -> tuple[int, int | None]:
+            async with semaphore:
+                await token_bucket.acquire()
+                try:
+                    response = await loop.run_in_executor(
+                        executor,
+                        functools.partial(
+                            self.wa_client.send_template_message,
+                            to_phone_number=phone_number,
+                            template_name=template_name,
+                            language_code=language_code,
+                        ),
+                    )
+                except Exception as e:
+                    logging.warning(f"Failed to send message to {phone_number}: {e}")
+                    return message_id, None
+                return message_id, response.status_code
+
+        for result in asyncio.as_completed([send(*m) for m in messages]):
+            yield await result
+
+    async def send_pending(
+        self,
+        db_broadcast: BroadcastORM,
+        token_bucket: TokenBucket,
+        executor: ThreadPoolExecutor,
+        stats: dict[str, int],
+    ) -> None:
+        """
+        Send the pending messages of a broadcast once, batch by batch.
+        Statuses are stored every BROADCAST_STATUS_FLUSH_SIZE sends.
+        """
+        started_at = time.monotonic()
+        last_id = 0
+        while True:
+            db_messages = get_pending_broadcast_messages(
+                db=self.db,
+                broadcast_id=db_broadcast.id,
+                after_id=last_id,
+                limit=self.batch_size,
+            )
+            if len(db_messages) == 0:
+                break
+            last_id = db_messages[-1].id
+            # read before the statuses are committed, which expires the messages
+            attempts = {m.id: m.attempts + 1 for m in db_messages}
+            messages = [(m.id, m.phone_number) for m in db_messages]
+
+            messages_update_in = []
+            async for message_id, status_code in self.send_batch(
+                messages=messages,
+                template_name=db_broadcast.template_name,
+                language_code=db_broadcast.language_code,
+                token_bucket=token_bucket,
+                executor=executor,
+            ):
+                status = get_message_status(status_code, attempts[message_id])
+                stats[status.value] += 1
+                messages_update_in.append(
+                    {
+                        "id": message_id,
+                        "status": status,
+                        "attempts": attempts[message_id],
+                        "status_code": status_code,
+                        "sent_at": datetime.datetime.utcnow(),
+                    }
+                )
+                if len(messages_update_in) >= BROADCAST_STATUS_FLUSH_SIZE:
+                    update_broadcast_messages(
+                        db=self.db, messages_update_in=messages_update_in
+                    )
+                    messages_update_in = []
+            if len(messages_update_in) > 0:
+                update_broadcast_messages(
+                    db=self.db, messages_update_in=messages_update_in
+                )
+
+            elapsed = time.monotonic() - started_at
+            logging.info(
+                f"Broadcast (id={db_broadcast.id}): {stats['sent']} sent, "
+                + f"{stats['failed']} failed, {stats['pending']} to retry, "
+                + f"{sum(stats.values()) / elapsed:.1f} messages/s."
+            )
+
+    async def run(
+        self, broadcast_id: int, retry_interval: float = BROADCAST_RETRY_INTERVAL
+    ) -> dict[str, int | float]:
+        """
+        Send all the pending messages of a broadcast. The statuses are stored
+        while the messages are sent: if the process crashes, running the
+        broadcast again only sends the messages still pending. The messages
+        failed with a retryable error are sent again by later passes.
+        """
+        db_broadcast = get_broadcast_by_id(db=self.db, id=broadcast_id)
+        if db_broadcast is None:
+            raise Exception(f"Broadcast (id={broadcast_id}) not present in database.")
+        if db_broadcast.wa_number_id != self.wa_number_id:
+            raise Exception(
+                f"Broadcast (id={broadcast_id}) is sent from another WhatsApp number."
+            )
+
+        token_bucket = TokenBucket(rate=self.rate)
+        stats = {"sent": 0, "failed": 0, "retried": 0}
+        started_at = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                pass_stats = {"sent": 0, "failed": 0, "pending": 0}
+                await self.send_pending(
+                    db_broadcast, token_bucket, executor, pass_stats
+                )
+                stats["sent"] += pass_stats["sent"]
+                stats["failed"] += pass_stats["failed"]
+                if pass_stats["pending"] == 0:
+                    break
+                # the attempts are bounded, so the passes end
+                stats["retried"] += pass_stats["pending"]
+                await asyncio.sleep(retry_interval)
+
+        stats["elapsed"] = time.monotonic() - started_at
+        return stats
+
+
+if __name__ == "__main__":
+    from app.db.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Broadcast a template message.")
+    broadcast_group = parser.add_mutually_exclusive_group(required=True)
+    broadcast_group.add_argument("--template", help="Name of the template to send.")
+    broadcast_group.add_argument(
+        "--resume", type=int, help="ID of a broadcast to resume."
+    )
+    parser.add_argument("--language", default="it", help="Language of the template.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        broadcaster = Broadcaster(db=db, wa_number_id=WHATSAPP_PUSH_NUMBER_ID)
+        if args.resume is not None:
+            broadcast_id = args.resume
+        else:
+            broadcast_id = broadcaster.create_broadcast(
+                template_name=args.template, language_code=args.language
+            ).id
+        logging.info(asyncio.run(broadcaster.run(broadcast_id)))
+    finally:
+        db.close()
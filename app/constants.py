@@ -11,10 +11,53 @@ LIMIT_MAX_USERS = 1000
 
 THRESHOLD_NOT_DELIVERED_ANSWER = 300  # in seconds
 
+BLOCKED_USERS_CACHE_TTL = 3600  # in seconds
+BLOCKED_USERS_CACHE_SIZE = 10000
+BLOCKED_USERS_AUDIT_INTERVAL = 600  # in seconds, between recorded messages
+
+MESSAGE_DEBOUNCE_INTERVAL = 3  # in seconds
+
+WEBHOOK_STATS_LOG_INTERVAL = 100  # in number of requests
+
+WHATSAPP_TIMEOUT = (3.05, 20)  # connect and read timeouts, in seconds
+WHATSAPP_MAX_RETRIES = 3
+WHATSAPP_MAX_BACKOFF = 30  # in seconds
+WHATSAPP_POOL_SIZE = 20
+WHATSAPP_MESSAGES_PER_SECOND = 80  # throughput of the WhatsApp Cloud API tier
+
+BROADCAST_CONCURRENCY = 32
+BROADCAST_BATCH_SIZE = 500
+BROADCAST_STATUS_FLUSH_SIZE = 20  # statuses stored at once, resent after a crash
+BROADCAST_MAX_ATTEMPTS = 3  # for the messages failed with a retryable error
+BROADCAST_RETRY_INTERVAL = 60  # in seconds, between the passes of the retries
+
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30  # in seconds
+DB_POOL_RECYCLE = 1800  # in seconds
+DB_LAMBDA_POOL_RECYCLE = 300  # in seconds
+
+WORKER_CONCURRENCY = 4
+WORKER_POLL_INTERVAL = 1  # in seconds
+JOB_MAX_ATTEMPTS = 3
+JOB_TIMEOUT = 300  # in seconds
+
+# candidates of the hnsw index scan, the filters are applied to them
+VECTORSTORE_HNSW_EF_SEARCH = 200
+VECTORSTORE_REINDEX_BATCH_SIZE = 1000
+VECTORSTORE_UPSERT_CONCURRENCY = 8  # parallel upsert requests to pinecone
+VECTORIZE_BATCH_SIZE = 500  # events embedded and marked as vectorized at once
+EMBEDDING_BATCH_MAX_TOKENS = 50000  # tokens per request to the embedding api
+VECTORSTORE_GC_BATCH_SIZE = 1000  # events deleted from the vectorstore at once
+VECTORSTORE_GC_INTERVAL = 86400  # in seconds
+VECTORSTORE_GC_LATENCY_QUERIES = 20  # queries timed before and after a collection
+
 # non-mutable
 TIMESTAMP_ORIGIN = "2023-01-01"
 FAKE_USER_ID = -1
+ADMITTED_USERS_COUNTER = "admitted_users"  # name of the counter of users
 VECTORSTORE_TEXT_KEY = "text"
+EMBEDDING_MODEL = "text-embedding-ada-002"
 EMBEDDING_SIZE = 1536  # that's specific to OpenAIEmbeddings
 CUSTOM_ROOT_URL = "https://api.wklnd.com"  # set on AWS
 
@@ -34,6 +77,13 @@ PINECONE_ENV = os.environ.get("PINECONE_ENV")
 PINECONE_INDEX = os.environ.get("PINECONE_INDEX")
 PINECONE_NAMESPACE = os.environ.get("PINECONE_NAMESPACE")
 
+# vectorstore backend: "pinecone", "local" (in-process) or "postgres" (pgvector)
+# (blank values, as in .env.example, mean the defaults)
+VECTORSTORE_BACKEND = os.environ.get("VECTORSTORE_BACKEND") or "pinecone"
+LOCAL_VECTORSTORE_PATH = (
+    os.environ.get("LOCAL_VECTORSTORE_PATH") or ".vectorstore/events.npz"
+)
+
 SQLALCHEMY_DATABASE_URL = f"""\
 postgresql\
 ://{os.environ.get("POSTGRES_USER")}\
@@ -42,8 +92,23 @@ postgresql\
 :{os.environ.get("POSTGRES_PORT")}\
 /{os.environ.get("POSTGRES_DATABASE")}\
 """
+SQLALCHEMY_ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace(
+    "postgresql://", "postgresql+asyncpg://", 1
+)
 
+# pooling profile of the db engine: "lambda", "server" or "pgbouncer"
+# (a blank value, as in .env.example, means the default)
+DB_ENGINE_PROFILE = os.environ.get("DB_ENGINE_PROFILE") or (
+    "lambda" if "AWS_LAMBDA_FUNCTION_NAME" in os.environ else "server"
+)
+
+WHATSAPP_API_URL = (
+    os.environ.get("WHATSAPP_API_URL") or "https://graph.facebook.com/v17.0/"
+)
 WHATSAPP_API_TOKEN = os.environ.get("WHATSAPP_API_TOKEN")
 WHATSAPP_PUSH_NUMBER_ID = os.environ.get("WHATSAPP_PUSH_NUMBER_ID")
 WHATSAPP_PULL_NUMBER_ID = os.environ.get("WHATSAPP_PULL_NUMBER_ID")
 WHATSAPP_HOOK_TOKEN = os.environ.get("WHATSAPP_HOOK_TOKEN")
+
+# answer messages from the background worker instead of within the webhook request
+WEBHOOK_USE_QUEUE = os.environ.get("WEBHOOK_USE_QUEUE", "false").lower() == "true"
@@ -1,8 +1,13 @@
 from app.db.db import Base
 from app.db.models import (
+    BroadcastMessageORM,
+    BroadcastORM,
     BusinessConversationORM,
     BusinessORM,
     ConversationORM,
+    CounterORM,
     EventORM,
+    JobORM,
+    UserAnswerCounterORM,
     UserORM,
 )
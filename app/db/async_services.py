@@ -0,0 +1,79 @@
+"""
+Awaitable versions of the services used by the routes, on the asyncio engine.
+The synchronous services remain for the scripts, the loader and the worker.
+"""
+
+import datetime
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.constants import FAKE_USER_ID
+from app.db.models import (
+    BusinessConversationORM,
+    BusinessORM,
+    ClickORM,
+    ConversationORM,
+    EventORM,
+    JobORM,
+    UserORM,
+)
+from app.db.schemas import Click, ConversationTemp, Job
+from app.db.services import claim_temp_conversations_stmt, jobs_rows
+
+
+# User
+async def get_user_by_id(
+    db: AsyncSession, id: int, orm: type[UserORM] | type[BusinessORM]
+) -> UserORM | BusinessORM | None:
+    return await db.get(orm, id)
+
+
+# Conversation
+async def claim_temp_conversations(
+    db: AsyncSession,
+    conversations_temp_in: list[ConversationTemp],
+    orm: type[ConversationORM] | type[BusinessConversationORM],
+) -> dict[str, int]:
+    """
+    Claim messages atomically by registering their temporary conversations,
+    see the synchronous service.
+    """
+    rows = (
+        await db.execute(claim_temp_conversations_stmt(conversations_temp_in, orm))
+    ).all()
+    await db.commit()
+    return {row.wa_id: row.id for row in rows}
+
+
+async def delete_temp_conversations(
+    db: AsyncSession,
+    ids: list[int],
+    orm: type[ConversationORM] | type[BusinessConversationORM],
+) -> None:
+    await db.execute(delete(orm).where(orm.id.in_(ids), orm.user_id == FAKE_USER_ID))
+    await db.commit()
+
+
+# Event
+async def get_event_by_id(db: AsyncSession, id: int) -> EventORM | None:
+    return await db.get(EventORM, id)
+
+
+# Click
+async def register_click(db: AsyncSession, click_in: Click) -> ClickORM:
+    click_dict = click_in.dict()
+    click_dict["registered_at"] = datetime.datetime.utcnow()
+
+    db_click = ClickORM(**click_dict)
+    db.add(db_click)
+    await db.commit()
+    await db.refresh(db_click)
+    return db_click
+
+
+# Job
+async def register_jobs(db: AsyncSession, jobs_in: list[Job]) -> None:
+    """Queue a batch of jobs with a single statement."""
+    await db.execute(insert(JobORM), jobs_rows(jobs_in))
+    await db.commit()
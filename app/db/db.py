@@ -1,11 +1,215 @@
-from sqlalchemy import create_engine
+import functools
+import threading
+import time
+from enum import Enum
+
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool, QueuePool
+
+from app.constants import (
+    DB_ENGINE_PROFILE,
+    DB_LAMBDA_POOL_RECYCLE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    SQLALCHEMY_DATABASE_URL,
+)
+
+
+class EngineProfile(str, Enum):
+    """Pooling profiles of the db engine, by deployment."""
+
+    aws_lambda = "lambda"  # one connection kept warm per Lambda container
+    server = "server"  # long-running process, e.g. uvicorn or the worker
+    pgbouncer = "pgbouncer"  # connections pooled by an external pooler
+
+    @classmethod
+    def from_setting(cls, value: str) -> "EngineProfile":
+        """Get the profile set by DB_ENGINE_PROFILE."""
+        try:
+            return cls(value)
+        except ValueError:
+            raise Exception(
+                f"DB_ENGINE_PROFILE not supported: {value}. "
+                + f"Valid profiles: {', '.join(p.value for p in cls)}."
+            ) from None
+
+
+class PoolMetrics:
+    """Connect times and checkout waits of the connections of an engine."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.connects = 0
+            self.connect_time = 0.0
+            self.checkouts = 0
+            self.checkout_wait = 0.0
+            self.max_checkout_wait = 0.0
+
+    def record_connect(self, elapsed: float) -> None:
+        with self._lock:
+            self.connects += 1
+            self.connect_time += elapsed
+
+    def record_checkout(self, elapsed: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait += elapsed
+            self.max_checkout_wait = max(self.max_checkout_wait, elapsed)
+
+    def snapshot(self) -> dict[str, int | float]:
+        """Return the metrics, times are in milliseconds."""
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "avg_connect_ms": 1000 * self.connect_time / max(self.connects, 1),
+                "checkouts": self.checkouts,
+                "avg_checkout_wait_ms": (
+                    1000 * self.checkout_wait / max(self.checkouts, 1)
+                ),
+                "max_checkout_wait_ms": 1000 * self.max_checkout_wait,
+            }
+
+
+def _timed_pool_class(pool_class: type[Pool], metrics: PoolMetrics) -> type[Pool]:
+    """
+    Subclass a pool to time each checkout, including the wait for a free
+    connection and the time to open a new one.
+    The class is kept when the pool is recreated, so are the metrics.
+    """
+
+    def connect(self):
+        started_at = time.perf_counter()
+        try:
+            return pool_class.connect(self)
+        finally:
+            metrics.record_checkout(time.perf_counter() - started_at)
+
+    return type(f"Timed{pool_class.__name__}", (pool_class,), {"connect": connect})
+
+
+def _pool_options(
+    profile: EngineProfile, asynchronous: bool = False
+) -> tuple[type[Pool], dict]:
+    """Get the pool class and the engine options of a profile."""
+    queue_pool_class = AsyncAdaptedQueuePool if asynchronous else QueuePool
+    if profile == EngineProfile.aws_lambda:
+        # a single connection survives across the invocations of a container,
+        # overflow connections of concurrent tasks are closed once released
+        return queue_pool_class, {
+            "pool_size": 1,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_LAMBDA_POOL_RECYCLE,
+            "pool_pre_ping": True,
+        }
+    elif profile == EngineProfile.server:
+        return queue_pool_class, {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+            "pool_use_lifo": True,  # idle connections beyond the load can expire
+        }
+    elif profile == EngineProfile.pgbouncer:
+        # the pooler owns the connections, a connection is opened per checkout;
+        # asyncpg prepared statements do not survive transaction pooling
+        return NullPool, (
+            {"connect_args": {"statement_cache_size": 0}} if asynchronous else {}
+        )
+    else:
+        raise Exception(f"Engine profile not supported: {profile}.")
 
-from app.constants import SQLALCHEMY_DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+def _instrument_engine(engine: Engine, metrics: PoolMetrics) -> None:
+    """Time the opening of the connections of an engine."""
+
+    @event.listens_for(engine, "do_connect")
+    def start_connect_timer(dialect, connection_record, cargs, cparams):
+        connection_record.info["connect_started_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "connect")
+    def stop_connect_timer(dbapi_connection, connection_record):
+        started_at = connection_record.info.pop("connect_started_at", None)
+        if started_at is not None:
+            metrics.record_connect(time.perf_counter() - started_at)
+
+
+def create_db_engine(
+    url: str, profile: EngineProfile, **kwargs
+) -> tuple[Engine, PoolMetrics]:
+    """Create an engine pooled as by the given profile, along with its metrics."""
+    pool_class, pool_kwargs = _pool_options(profile)
+    metrics = PoolMetrics()
+    engine = create_engine(
+        url,
+        poolclass=_timed_pool_class(pool_class, metrics),
+        **(pool_kwargs | kwargs),
+    )
+    _instrument_engine(engine, metrics)
+    return engine, metrics
+
+
+def create_async_db_engine(
+    url: str, profile: EngineProfile, **kwargs
+) -> tuple[AsyncEngine, PoolMetrics]:
+    """Create an asyncio engine pooled as by the given profile, with its metrics."""
+    pool_class, pool_kwargs = _pool_options(profile, asynchronous=True)
+    metrics = PoolMetrics()
+    engine = create_async_engine(
+        url,
+        poolclass=_timed_pool_class(pool_class, metrics),
+        **(pool_kwargs | kwargs),
+    )
+    _instrument_engine(engine.sync_engine, metrics)
+    return engine, metrics
+
+
+engine, engine_metrics = create_db_engine(
+    SQLALCHEMY_DATABASE_URL, EngineProfile.from_setting(DB_ENGINE_PROFILE)
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+@functools.cache
+def get_async_engine() -> tuple[AsyncEngine, PoolMetrics]:
+    """
+    Get the asyncio engine used by the routes, so that queries do not block the
+    event loop. It is created on first use: the processes that only query
+    synchronously, e.g. the worker or the loader, don't keep a second pool.
+    """
+    return create_async_db_engine(
+        SQLALCHEMY_ASYNC_DATABASE_URL, EngineProfile.from_setting(DB_ENGINE_PROFILE)
+    )
+
+
+@functools.cache
+def _get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    async_engine, _ = get_async_engine()
+    return async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+def get_async_session() -> AsyncSession:
+    """Open an asyncio session, creating the asyncio engine if needed."""
+    return _get_async_sessionmaker()()
+
+
 Base = declarative_base()
 
 
@@ -15,3 +219,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with get_async_session() as db:
+        yield db
@@ -12,13 +12,31 @@ class AnswerType(str, Enum):
     blocked = "blocked"  # ai blocked message for invalid query
     conversational = "conversational"  # ai conversational answer
     failed = "failed"  # answer failed to be elaborated
+    merged = "merged"  # message merged into the answer of a following one
     template = "template"  # template message
     unanswered = "unanswered"  # no answer delivered
 
 
+class JobStatus(str, Enum):
+    """Status of the jobs queued for the background worker."""
+
+    pending = "pending"  # waiting to be picked up by a worker
+    running = "running"  # being processed by a worker
+    done = "done"  # answer delivered
+    failed = "failed"  # failed after all attempts
+
+
 class PriceLevel(str, Enum):
     free = "Free"
     inexpensive = "€"
     moderate = "€€"
     expensive = "€€€"
     very_expensive = "€€€€"
+
+
+class BroadcastStatus(str, Enum):
+    """Status of the messages of a broadcast."""
+
+    pending = "pending"  # waiting to be sent, or to be retried
+    sent = "sent"  # accepted by WhatsApp
+    failed = "failed"  # rejected by WhatsApp or not reachable
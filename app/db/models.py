@@ -1,11 +1,13 @@
 import datetime
 from typing import Optional
 
-from sqlalchemy import ForeignKey
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import ForeignKey, Index, PrimaryKeyConstraint, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from app.constants import EMBEDDING_SIZE
 from app.db.db import Base
-from app.db.enums import AnswerType, CityEnum, PriceLevel
+from app.db.enums import AnswerType, BroadcastStatus, CityEnum, JobStatus, PriceLevel
 
 
 class UserORM(Base):
@@ -25,11 +27,38 @@ class UserORM(Base):
         return f"UserORM(id={self.id!r}, phone_number={self.phone_number!r})"
 
 
+class UserAnswerCounterORM(Base):
+    """Answers of a user by type and day, maintained as answers are registered."""
+
+    __tablename__ = "user_answer_counters"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    answer_type: Mapped[AnswerType] = mapped_column(primary_key=True)
+    day: Mapped[datetime.date] = mapped_column(primary_key=True)
+    count: Mapped[int]
+    first_registered_at: Mapped[datetime.datetime]
+
+    def __repr__(self) -> str:
+        return f"UserAnswerCounterORM(user_id={self.user_id!r}, answer_type={self.answer_type!r}, day={self.day!r})"
+
+
+class CounterORM(Base):
+    """Counters updated atomically, e.g. to enforce caps under concurrency."""
+
+    __tablename__ = "counters"
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    value: Mapped[int]
+
+    def __repr__(self) -> str:
+        return f"CounterORM(name={self.name!r}, value={self.value!r})"
+
+
 class BusinessORM(Base):
     __tablename__ = "businesses"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    phone_number: Mapped[str]
+    phone_number: Mapped[str] = mapped_column(index=True)
     name: Mapped[Optional[str]]
     description: Mapped[Optional[str]]
     registered_at: Mapped[datetime.datetime]
@@ -46,17 +75,22 @@ class BusinessORM(Base):
 
 class BaseConversation:
     id: Mapped[int] = mapped_column(primary_key=True)
-    wa_id: Mapped[str] = mapped_column(index=True)  # format: "wamid.ID"
+    wa_id: Mapped[str] = mapped_column(index=True, unique=True)  # format: "wamid.ID"
     from_message: Mapped[str]
     to_message: Mapped[Optional[str]]
     answer_type: Mapped[AnswerType]
     used_event_ids: Mapped[str]  # json.dumps(list[ForeignKey("events.id")]))
+    merged_wa_ids: Mapped[Optional[str]]  # json.dumps(list[wa_id]) of merged messages
     received_at: Mapped[datetime.datetime]
     registered_at: Mapped[datetime.datetime]
 
 
 class ConversationORM(Base, BaseConversation):
     __tablename__ = "conversations"
+    __table_args__ = (
+        Index("ix_conversations_user_id_registered_at", "user_id", "registered_at"),
+        Index("ix_conversations_received_at", "received_at"),
+    )
 
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     # relationships
@@ -68,6 +102,13 @@ class ConversationORM(Base, BaseConversation):
 
 class BusinessConversationORM(Base, BaseConversation):
     __tablename__ = "business_conversations"
+    __table_args__ = (
+        Index(
+            "ix_business_conversations_user_id_registered_at",
+            "user_id",
+            "registered_at",
+        ),
+    )
 
     user_id: Mapped[int] = mapped_column(ForeignKey("businesses.id"))
     # relationships
@@ -77,8 +118,57 @@ class BusinessConversationORM(Base, BaseConversation):
         return f"BusinessConversationORM(id={self.id!r}, from_id={self.user_id!r}, at={self.registered_at!r})"
 
 
+class BaseConversationEvent:
+    # the events used to answer a message, in the order of used_event_ids
+    position: Mapped[int]
+    event_id: Mapped[int] = mapped_column(
+        ForeignKey("events.id", ondelete="CASCADE"), index=True
+    )
+
+
+class ConversationEventORM(Base, BaseConversationEvent):
+    __tablename__ = "conversation_events"
+    __table_args__ = (PrimaryKeyConstraint("conversation_id", "position"),)
+
+    conversation_id: Mapped[int] = mapped_column(
+        ForeignKey("conversations.id", ondelete="CASCADE")
+    )
+
+    def __repr__(self) -> str:
+        return f"ConversationEventORM(conversation_id={self.conversation_id!r}, event_id={self.event_id!r})"
+
+
+class BusinessConversationEventORM(Base, BaseConversationEvent):
+    __tablename__ = "business_conversation_events"
+    __table_args__ = (PrimaryKeyConstraint("conversation_id", "position"),)
+
+    conversation_id: Mapped[int] = mapped_column(
+        ForeignKey("business_conversations.id", ondelete="CASCADE")
+    )
+
+    def __repr__(self) -> str:
+        return f"BusinessConversationEventORM(conversation_id={self.conversation_id!r}, event_id={self.event_id!r})"
+
+
 class EventORM(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        UniqueConstraint(
+            "source",
+            "url",
+            "start_date",
+            "end_date",
+            name="uq_events_source_url_start_date_end_date",
+        ),
+        # approximate nearest neighbours of the postgres vectorstore backend
+        Index(
+            "ix_events_embedding",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     description: Mapped[str]
@@ -107,6 +197,17 @@ class EventORM(Base):
     url: Mapped[str]
     price_level: Mapped[Optional[PriceLevel]]
 
+    # id of the vector in the vectorstore, to delete it directly
+    vector_id: Mapped[Optional[str]]
+    # hashes of the text and metadata in the vectorstore, to tell the changes
+    vectorized_text_hash: Mapped[Optional[str]]
+    vectorized_metadata_hash: Mapped[Optional[str]]
+
+    # vector of the postgres vectorstore backend
+    embedding: Mapped[Optional[list[float]]] = mapped_column(
+        Vector(EMBEDDING_SIZE), deferred=True
+    )
+
     # relationships
     business: Mapped["BusinessORM"] = relationship(back_populates="events")
 
@@ -114,13 +215,31 @@ class EventORM(Base):
         return f"EventORM(id={self.id!r})"
 
 
+class EventEmbeddingORM(Base):
+    """Embedding of the description of an event, to fill the vectorstores again."""
+
+    __tablename__ = "event_embeddings"
+
+    event_id: Mapped[int] = mapped_column(
+        ForeignKey("events.id", ondelete="CASCADE"), primary_key=True
+    )
+    model: Mapped[str]
+    content_hash: Mapped[str]  # sha256 of the text embedded
+    embedding: Mapped[list[float]] = mapped_column(Vector(EMBEDDING_SIZE))
+    registered_at: Mapped[datetime.datetime]
+
+    def __repr__(self) -> str:
+        return f"EventEmbeddingORM(event_id={self.event_id!r}, model={self.model!r})"
+
+
 class ClickORM(Base):
     __tablename__ = "clicks"
+    __table_args__ = (Index("ix_clicks_event_id_user_id", "event_id", "user_id"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     event_id: Mapped[int] = mapped_column(ForeignKey("events.id"))
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-    registered_at: Mapped[datetime.datetime]
+    registered_at: Mapped[datetime.datetime] = mapped_column(index=True)
 
     # relationships
     event: Mapped["EventORM"] = relationship()
@@ -128,3 +247,63 @@ class ClickORM(Base):
 
     def __repr__(self) -> str:
         return f"ClickORM(id={self.id!r}, event_id={self.event_id!r}, user_id={self.user_id!r})"
+
+
+class JobORM(Base):
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    status: Mapped[JobStatus] = mapped_column(index=True)
+    attempts: Mapped[int]
+    error: Mapped[Optional[str]]
+    registered_at: Mapped[datetime.datetime]
+    available_at: Mapped[datetime.datetime]  # end of the debounce window
+    started_at: Mapped[Optional[datetime.datetime]]
+    finished_at: Mapped[Optional[datetime.datetime]]
+
+    # message to answer
+    wa_number_id: Mapped[str]
+    conversation_id: Mapped[int]  # temp conversation of the chat's conversation ORM
+    wa_id: Mapped[str]
+    phone_number: Mapped[str]
+    body: Mapped[str]
+    timestamp: Mapped[int]
+
+    def __repr__(self) -> str:
+        return f"JobORM(id={self.id!r}, wa_id={self.wa_id!r}, status={self.status!r})"
+
+
+class BroadcastORM(Base):
+    __tablename__ = "broadcasts"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    wa_number_id: Mapped[str]
+    template_name: Mapped[str]
+    language_code: Mapped[str]
+    registered_at: Mapped[datetime.datetime]
+
+    # relationships
+    messages: Mapped[list["BroadcastMessageORM"]] = relationship(
+        back_populates="broadcast"
+    )
+
+    def __repr__(self) -> str:
+        return f"BroadcastORM(id={self.id!r}, template_name={self.template_name!r})"
+
+
+class BroadcastMessageORM(Base):
+    __tablename__ = "broadcast_messages"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    broadcast_id: Mapped[int] = mapped_column(ForeignKey("broadcasts.id"), index=True)
+    phone_number: Mapped[str]
+    status: Mapped[BroadcastStatus]
+    attempts: Mapped[int]
+    status_code: Mapped[Optional[int]]
+    sent_at: Mapped[Optional[datetime.datetime]]
+
+    # relationships
+    broadcast: Mapped["BroadcastORM"] = relationship(back_populates="messages")
+
+    def __repr__(self) -> str:
+        return f"BroadcastMessageORM(id={self.id!r}, status={self.status!r})"
@@ -2,7 +2,7 @@ import datetime
 
 from pydantic import BaseModel
 
-from app.db.enums import AnswerType, CityEnum, PriceLevel
+from app.db.enums import AnswerType, CityEnum, JobStatus, PriceLevel
 from app.db.models import EventORM
 from app.utils.datetime_utils import date_to_timestamp
 
@@ -47,6 +47,7 @@ class ConversationUpd(BaseModel):
     to_message: str | None
     answer_type: AnswerType
     used_event_ids: str
+    merged_wa_ids: str | None = None
 
 
 class Conversation(ConversationTemp, ConversationUpd):
@@ -138,3 +139,40 @@ class ClickInDB(Click):
 
     class Config:
         orm_mode = True
+
+
+class Job(BaseModel):
+    wa_number_id: str
+    conversation_id: int
+    wa_id: str
+    phone_number: str
+    body: str
+    timestamp: int
+
+
+class JobInDB(Job):
+    id: int
+    status: JobStatus
+    attempts: int
+    error: str | None = None
+    registered_at: datetime.datetime
+    available_at: datetime.datetime
+    started_at: datetime.datetime | None = None
+    finished_at: datetime.datetime | None = None
+
+    class Config:
+        orm_mode = True
+
+
+class Broadcast(BaseModel):
+    wa_number_id: str
+    template_name: str
+    language_code: str
+
+
+class BroadcastInDB(Broadcast):
+    id: int
+    registered_at: datetime.datetime
+
+    class Config:
+        orm_mode = True
@@ -1,36 +1,89 @@
 import datetime
+import functools
+import json
+import logging
+from dataclasses import dataclass
 
-import pinecone
 from fastapi import HTTPException
-from sqlalchemy import desc, func
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    and_,
+    bindparam,
+    desc,
+    distinct,
+    exists,
+    func,
+    insert,
+    literal,
+    literal_column,
+    or_,
+    select,
+    true,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session, aliased
 
 from app.constants import (
-    EMBEDDING_SIZE,
+    ADMITTED_USERS_COUNTER,
     FAKE_USER_ID,
-    PINECONE_API_KEY,
-    PINECONE_ENV,
-    PINECONE_INDEX,
-    PINECONE_NAMESPACE,
+    JOB_MAX_ATTEMPTS,
+    JOB_TIMEOUT,
+    MESSAGE_DEBOUNCE_INTERVAL,
 )
-from app.db.enums import AnswerType
+from app.db.enums import AnswerType, BroadcastStatus, JobStatus
 from app.db.models import (
+    BroadcastMessageORM,
+    BroadcastORM,
+    BusinessConversationEventORM,
     BusinessConversationORM,
     BusinessORM,
     ClickORM,
+    ConversationEventORM,
     ConversationORM,
+    CounterORM,
+    EventEmbeddingORM,
     EventORM,
+    JobORM,
+    UserAnswerCounterORM,
     UserORM,
 )
 from app.db.schemas import (
+    Broadcast,
     Business,
     Click,
     Conversation,
     ConversationTemp,
     ConversationUpd,
     Event,
+    Job,
     User,
 )
+from app.utils.blocked_users_cache import blocked_users_cache
+from app.vectorstore import get_vector_backend
+
+CONVERSATION_EVENTS_ORMS = {
+    ConversationORM: ConversationEventORM,
+    BusinessConversationORM: BusinessConversationEventORM,
+}
+
+# columns of the events updated when they are imported again
+EVENT_UPDATABLE_COLUMNS = [
+    "description",
+    "city",
+    "is_closed_mon",
+    "is_closed_tue",
+    "is_closed_wed",
+    "is_closed_thu",
+    "is_closed_fri",
+    "is_closed_sat",
+    "is_closed_sun",
+    "is_during_day",
+    "is_during_night",
+    "name",
+    "location",
+    "price_level",
+]
 
 
 # User
@@ -48,6 +101,24 @@ def get_user_count(db: Session) -> int:
     return db.query(func.count(UserORM.id)).scalar()
 
 
+def admit_user(db: Session, limit: int) -> bool:
+    """
+    Take a slot among the users admitted to the service, if any is left, without
+    committing: the slot is kept only if the user is registered in the same
+    transaction. The counter row is incremented atomically, so concurrent
+    signups wait for each other and cannot overshoot the limit.
+    The counter counts the registered users but the fake one, which is never
+    admitted: it is seeded without it by the migration.
+    """
+    admitted_count = db.execute(
+        update(CounterORM)
+        .where(CounterORM.name == ADMITTED_USERS_COUNTER, CounterORM.value < limit)
+        .values(value=CounterORM.value + 1)
+        .returning(CounterORM.value)
+    ).scalar()
+    return admitted_count is not None
+
+
 def get_user_answers_count(
     db: Session,
     user_id: int,
@@ -73,6 +144,178 @@ def get_user_answers_count(
     ).first()
 
 
+@dataclass
+class UserContext:
+    """Everything the push journey needs to know about a returning user."""
+
+    user: UserORM
+    # number of answers of each type and datetime of the first one, in the window
+    answers_counts: dict[AnswerType, tuple[int, datetime.datetime | None]]
+    # ordered from the oldest to the newest
+    conversations: list[ConversationORM]
+
+
+@functools.cache
+def _user_context_stmt(answer_types: tuple[AnswerType, ...]):
+    """
+    Statement loading the context of a user, built once for each set of answer
+    types since building it costs more than running it.
+    Counters and conversations are lateral joins on the user, so the user
+    is repeated on each row of its conversations.
+    Answers are counted from the daily counters for the days entirely within the
+    window, and from the conversations for the day the window starts in.
+    """
+    daily_counters = (
+        select(
+            *[
+                column
+                for answer_type in answer_types
+                for column in (
+                    func.coalesce(
+                        func.sum(UserAnswerCounterORM.count).filter(
+                            UserAnswerCounterORM.answer_type == answer_type
+                        ),
+                        0,
+                    ).label(f"{answer_type.value}_count"),
+                    func.min(UserAnswerCounterORM.first_registered_at)
+                    .filter(UserAnswerCounterORM.answer_type == answer_type)
+                    .label(f"{answer_type.value}_first_datetime"),
+                )
+            ]
+        )
+        .where(
+            UserAnswerCounterORM.user_id == UserORM.id,
+            UserAnswerCounterORM.day > bindparam("answers_from_day"),
+        )
+        .lateral("daily_counters")
+    )
+    first_day_counters = (
+        select(
+            *[
+                column
+                for answer_type in answer_types
+                for column in (
+                    func.count()
+                    .filter(ConversationORM.answer_type == answer_type)
+                    .label(f"{answer_type.value}_first_day_count"),
+                    func.min(ConversationORM.registered_at)
+                    .filter(ConversationORM.answer_type == answer_type)
+                    .label(f"{answer_type.value}_first_day_first_datetime"),
+                )
+            ]
+        )
+        .where(
+            ConversationORM.user_id == UserORM.id,
+            ConversationORM.registered_at >= bindparam("answers_from_datetime"),
+            ConversationORM.registered_at < bindparam("answers_to_first_day_end"),
+        )
+        .lateral("first_day_counters")
+    )
+    last_conversations = (
+        select(ConversationORM)
+        .where(
+            ConversationORM.user_id == UserORM.id,
+            ConversationORM.registered_at >= bindparam("conversations_from_datetime"),
+        )
+        .order_by(desc(ConversationORM.id))
+        .limit(bindparam("max_messages"))
+        .lateral("last_conversations")
+    )
+    conversation_alias = aliased(ConversationORM, last_conversations)
+
+    return (
+        select(UserORM, *daily_counters.c, *first_day_counters.c, conversation_alias)
+        .select_from(UserORM)
+        .join(daily_counters, true())
+        .join(first_day_counters, true())
+        .outerjoin(conversation_alias, true())
+        .where(
+            UserORM.phone_number == bindparam("phone_number"),
+            # the owner of the temporary conversations is not a user
+            UserORM.id != FAKE_USER_ID,
+        )
+        .order_by(conversation_alias.id)
+    )
+
+
+def load_user_context(
+    db: Session,
+    phone_number: str,
+    answer_types: list[AnswerType],
+    answers_from_datetime: datetime.datetime,
+    conversations_from_datetime: datetime.datetime,
+    max_messages: int,
+) -> UserContext | None:
+    """
+    Load a user, the counts of its answers by type and its last conversations
+    with a single query, instead of one query for each of them.
+    """
+    answers_from_day = answers_from_datetime.date()
+    rows = db.execute(
+        _user_context_stmt(tuple(answer_types)),
+        {
+            "phone_number": phone_number,
+            "answers_from_datetime": answers_from_datetime,
+            "answers_from_day": answers_from_day,
+            "answers_to_first_day_end": datetime.datetime.combine(
+                answers_from_day + datetime.timedelta(days=1), datetime.time.min
+            ),
+            "conversations_from_datetime": conversations_from_datetime,
+            "max_messages": max_messages,
+        },
+    ).all()
+    if len(rows) == 0:
+        return None
+
+    answers_counts = {}
+    counters = rows[0]._mapping
+    for answer_type in answer_types:
+        first_day_count = counters[f"{answer_type.value}_first_day_count"]
+        answers_counts[answer_type] = (
+            first_day_count + counters[f"{answer_type.value}_count"],
+            (
+                counters[f"{answer_type.value}_first_day_first_datetime"]
+                if first_day_count > 0
+                else counters[f"{answer_type.value}_first_datetime"]
+            ),
+        )
+
+    return UserContext(
+        user=rows[0].UserORM,
+        answers_counts=answers_counts,
+        conversations=[row[-1] for row in rows if row[-1] is not None],
+    )
+
+
+def increment_user_answer_counter(
+    db: Session, user_id: int, answer_type: AnswerType, registered_at: datetime.datetime
+) -> None:
+    """Count an answer in the daily counters of the user, without committing."""
+    db.execute(
+        postgresql.insert(UserAnswerCounterORM)
+        .values(
+            user_id=user_id,
+            answer_type=answer_type,
+            day=registered_at.date(),
+            count=1,
+            first_registered_at=registered_at,
+        )
+        .on_conflict_do_update(
+            index_elements=[
+                UserAnswerCounterORM.user_id,
+                UserAnswerCounterORM.answer_type,
+                UserAnswerCounterORM.day,
+            ],
+            set_={
+                "count": UserAnswerCounterORM.count + 1,
+                "first_registered_at": func.least(
+                    UserAnswerCounterORM.first_registered_at, registered_at
+                ),
+            },
+        )
+    )
+
+
 def block_user(
     db: Session, db_user: UserORM, block_expires_at: datetime.datetime
 ) -> UserORM:
@@ -81,6 +324,7 @@ def block_user(
     db_user.is_blocked = True
     db_user.block_expires_at = block_expires_at
     db.commit()
+    blocked_users_cache.add(db_user.phone_number, block_expires_at)
     return db_user
 
 
@@ -90,6 +334,7 @@ def unblock_user(db: Session, db_user: UserORM) -> UserORM:
     db_user.is_blocked = False
     db_user.block_expires_at = None
     db.commit()
+    blocked_users_cache.discard(db_user.phone_number)
     return db_user
 
 
@@ -156,6 +401,19 @@ def get_conversation_by_waid(
     return db.query(orm).filter(orm.wa_id == wa_id).first()
 
 
+def get_conversations_by_ids(
+    db: Session,
+    ids: list[int],
+    orm: type[ConversationORM] | type[BusinessConversationORM],
+) -> list[ConversationORM | BusinessConversationORM]:
+    """Get conversations from their ids with one query, in the same order as the ids."""
+    db_conversations = {c.id: c for c in db.query(orm).filter(orm.id.in_(ids))}
+    missing_ids = [id for id in ids if id not in db_conversations]
+    if len(missing_ids) > 0:
+        raise Exception(f"Conversations (ids={missing_ids}) not present in database.")
+    return [db_conversations[id] for id in ids]
+
+
 def get_user_conversations(
     db: Session,
     user_id: int,
@@ -194,52 +452,50 @@ def register_conversation(
     return db_conversation
 
 
-def register_temp_conversation(
+def claim_temp_conversations_stmt(
+    conversations_temp_in: list[ConversationTemp],
+    orm: type[ConversationORM] | type[BusinessConversationORM],
+):
+    """Statement claiming messages, shared with the async services."""
+    registered_at = datetime.datetime.utcnow()
+    return (
+        postgresql.insert(orm)
+        .values(
+            [
+                Conversation(
+                    from_message=conversation_temp_in.from_message,
+                    wa_id=conversation_temp_in.wa_id,
+                    received_at=conversation_temp_in.received_at,
+                    # temporary values ->
+                    user_id=FAKE_USER_ID,
+                    to_message=None,
+                    answer_type=AnswerType.unanswered,
+                    used_event_ids="null",
+                ).dict()
+                | {"registered_at": registered_at}
+                for conversation_temp_in in conversations_temp_in
+            ]
+        )
+        .on_conflict_do_nothing(index_elements=[orm.wa_id])
+        .returning(orm.wa_id, orm.id)
+    )
+
+
+def claim_temp_conversations(
     db: Session,
-    conversation_temp_in: ConversationTemp,
-    user_orm: type[UserORM] | type[BusinessORM],
-    conversation_orm: type[ConversationORM] | type[BusinessConversationORM],
-) -> ConversationORM | BusinessConversationORM:
+    conversations_temp_in: list[ConversationTemp],
+    orm: type[ConversationORM] | type[BusinessConversationORM],
+) -> dict[str, int]:
     """
-    Conversation is registered temporarily with no answer to avoid
+    Conversations are registered temporarily with no answer to avoid
     accepting a request with the same message while it is being processed.
+    Messages are claimed atomically with a single INSERT ... ON CONFLICT DO NOTHING
+    on the unique WhatsApp ID: only the messages not already registered are
+    returned, as a mapping from their WhatsApp ID to the conversation id.
     """
-    fake_user = get_user_by_id(db=db, id=FAKE_USER_ID, orm=user_orm)
-    if fake_user is None:
-        if user_orm == UserORM:
-            fake_user = UserORM(
-                id=FAKE_USER_ID,
-                phone_number="000000000000",
-                is_blocked=False,
-                is_admin=False,
-                registered_at=datetime.datetime.utcnow(),
-            )
-        elif user_orm == BusinessORM:
-            fake_user = BusinessORM(
-                id=FAKE_USER_ID,
-                phone_number="000000000000",
-                registered_at=datetime.datetime.utcnow(),
-            )
-        else:
-            raise Exception(f"User ORM of type {user_orm} is not accepted.")
-        db.add(fake_user)
-        db.commit()
-
-    db_conversation = register_conversation(
-        db=db,
-        conversation_in=Conversation(
-            from_message=conversation_temp_in.from_message,
-            wa_id=conversation_temp_in.wa_id,
-            received_at=conversation_temp_in.received_at,
-            # temporary values ->
-            user_id=FAKE_USER_ID,
-            to_message=None,
-            answer_type=AnswerType.unanswered,
-            used_event_ids="null",
-        ),
-        orm=conversation_orm,
-    )
-    return db_conversation
+    rows = db.execute(claim_temp_conversations_stmt(conversations_temp_in, orm)).all()
+    db.commit()
+    return {row.wa_id: row.id for row in rows}
 
 
 def update_temp_conversation(
@@ -249,10 +505,79 @@ def update_temp_conversation(
 ) -> ConversationORM | BusinessConversationORM:
     for attr_name, attr_value in vars(conversation_update_in).items():
         setattr(db_conversation, attr_name, attr_value)
+    # the answer is counted and linked to its events in the same transaction
+    # it is registered with
+    register_conversation_events(
+        db=db,
+        db_conversation=db_conversation,
+        event_ids=json.loads(conversation_update_in.used_event_ids) or [],
+    )
+    if isinstance(db_conversation, ConversationORM):
+        increment_user_answer_counter(
+            db=db,
+            user_id=db_conversation.user_id,
+            answer_type=db_conversation.answer_type,
+            registered_at=db_conversation.registered_at,
+        )
     db.commit()
     return db_conversation
 
 
+def register_conversation_events(
+    db: Session,
+    db_conversation: ConversationORM | BusinessConversationORM,
+    event_ids: list[int],
+) -> None:
+    """
+    Link a conversation to the events used to answer it, without committing.
+    Events no longer present in database are not linked.
+    """
+    if len(event_ids) == 0:
+        return
+    orm = CONVERSATION_EVENTS_ORMS[type(db_conversation)]
+    ids = (
+        func.unnest(postgresql.array(event_ids))
+        .table_valued("event_id", with_ordinality="position")
+        .render_derived()
+    )
+    db.execute(
+        postgresql.insert(orm)
+        .from_select(
+            ["conversation_id", "event_id", "position"],
+            select(literal(db_conversation.id), ids.c.event_id, ids.c.position)
+            .join(EventORM, EventORM.id == ids.c.event_id)
+            .order_by(ids.c.position),
+        )
+        .on_conflict_do_nothing()
+    )
+
+
+def get_conversation_event_ids(
+    db: Session,
+    conversation_id: int,
+    orm: type[ConversationORM] | type[BusinessConversationORM],
+) -> list[int]:
+    """Get the ids of the events used to answer a conversation, in order."""
+    events_orm = CONVERSATION_EVENTS_ORMS[orm]
+    return db.scalars(
+        select(events_orm.event_id)
+        .where(events_orm.conversation_id == conversation_id)
+        .order_by(events_orm.position)
+    ).all()
+
+
+def merge_temp_conversations(
+    db: Session,
+    db_conversations: list[ConversationORM | BusinessConversationORM],
+    user_id: int,
+) -> None:
+    """Mark conversations whose message is answered together with a following one."""
+    for db_conversation in db_conversations:
+        db_conversation.user_id = user_id
+        db_conversation.answer_type = AnswerType.merged
+    db.commit()
+
+
 def delete_temp_conversation(
     db: Session, db_conversation: ConversationORM | BusinessConversationORM
 ) -> None:
@@ -261,11 +586,33 @@ def delete_temp_conversation(
         db.commit()
 
 
+def delete_temp_conversations(
+    db: Session,
+    ids: list[int],
+    orm: type[ConversationORM] | type[BusinessConversationORM],
+) -> None:
+    db.query(orm).filter(orm.id.in_(ids), orm.user_id == FAKE_USER_ID).delete()
+    db.commit()
+
+
 # Event
 def get_event_by_id(db: Session, id: int) -> EventORM | None:
     return db.query(EventORM).filter_by(id=id).first()
 
 
+def get_events_by_ids(db: Session, ids: list[int]) -> list[EventORM]:
+    """
+    Get events from their ids with one query, in the same order as the ids.
+    The ids not in the db are skipped, e.g. the vectors left in the vectorstore
+    by the duplicated events deleted by the natural key migration.
+    """
+    db_events = {e.id: e for e in db.query(EventORM).filter(EventORM.id.in_(ids))}
+    missing_ids = [id for id in ids if id not in db_events]
+    if len(missing_ids) > 0:
+        logging.warning(f"Events in vectorstore (ids={missing_ids}) not present in db.")
+    return [db_events[id] for id in ids if id in db_events]
+
+
 def get_event(
     db: Session,
     source: str,
@@ -297,11 +644,124 @@ def register_event(db: Session, event_in: Event, source: str) -> EventORM:
     return db_event
 
 
-def delete_event_by_id(db: Session, event_id: int, from_vectorstore_only: bool = True):
+def get_event_urls(db: Session, source: str, urls: list[str]) -> set[str]:
+    """Get which of the urls have events of a source, with one query."""
+    return set(
+        db.scalars(
+            select(EventORM.url).where(
+                EventORM.source == source, EventORM.url.in_(urls)
+            )
+        )
+    )
+
+
+def register_events_bulk(
+    db: Session, events_in: list[Event], source: str, update_existing: bool = False
+) -> tuple[list[int], list[int]]:
     """
-    Delete event by id from vectorstore and (optionally) from database.
-    This implementation is Pinecone-specific.
+    Register a batch of events with a single upsert, skipping the events
+    already present with the same source, url, start and end date, or
+    updating the columns that changed if update_existing.
+    Return the ids of the inserted events and of the ones already present.
     """
+    if len(events_in) == 0:
+        return [], []
+
+    registered_at = datetime.datetime.utcnow()
+    stmt = postgresql.insert(EventORM)
+    index_elements = [
+        EventORM.source,
+        EventORM.url,
+        EventORM.start_date,
+        EventORM.end_date,
+    ]
+    if update_existing:
+        # an upsert can't update a row twice, the last of the duplicates is kept
+        events_in = list(
+            {(e.url, e.start_date, e.end_date): e for e in events_in}.values()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={c: stmt.excluded[c] for c in EVENT_UPDATABLE_COLUMNS},
+            where=tuple_(
+                *[getattr(EventORM, c) for c in EVENT_UPDATABLE_COLUMNS]
+            ).is_distinct_from(
+                tuple_(*[stmt.excluded[c] for c in EVENT_UPDATABLE_COLUMNS])
+            ),
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+    returned_rows = db.execute(
+        stmt.returning(
+            EventORM.id,
+            EventORM.url,
+            EventORM.start_date,
+            EventORM.end_date,
+            # the rows updated are returned too, they are told apart by xmax
+            literal_column("xmax = 0").label("is_inserted"),
+        ),
+        [
+            event_in.dict() | {"source": source, "registered_at": registered_at}
+            for event_in in events_in
+        ],
+    ).all()
+    inserted_rows = [row for row in returned_rows if row.is_inserted]
+
+    skipped_keys = {(e.url, e.start_date, e.end_date) for e in events_in} - {
+        (row.url, row.start_date, row.end_date) for row in inserted_rows
+    }
+    skipped_ids = []
+    if len(skipped_keys) > 0:
+        skipped_ids = db.scalars(
+            select(EventORM.id)
+            .where(
+                EventORM.source == source,
+                tuple_(EventORM.url, EventORM.start_date, EventORM.end_date).in_(
+                    skipped_keys
+                ),
+            )
+            .order_by(EventORM.id)
+        ).all()
+    db.commit()
+    return [row.id for row in inserted_rows], list(skipped_ids)
+
+
+def get_expired_vectorized_events(db: Session, today: datetime.date) -> list:
+    """Get the ids and vector ids of the vectorized events that ended before today."""
+    return db.execute(
+        select(EventORM.id, EventORM.vector_id)
+        .where(EventORM.is_vectorized == True, EventORM.end_date < today)
+        .order_by(EventORM.id)
+    ).all()
+
+
+def set_events_vectorized(db: Session, vectors_in: list[dict]) -> None:
+    """
+    Flag a batch of events as vectorized with the columns of their vectors,
+    as dicts of id and vector_id, vectorized_text_hash, vectorized_metadata_hash.
+    """
+    db.execute(update(EventORM), [v | {"is_vectorized": True} for v in vectors_in])
+    db.commit()
+
+
+def set_events_not_vectorized(db: Session, event_ids: list[int]) -> None:
+    """Flag a batch of events as not vectorized with a single update."""
+    db.execute(
+        update(EventORM)
+        .where(EventORM.id.in_(event_ids))
+        .values(
+            is_vectorized=False,
+            vector_id=None,
+            vectorized_text_hash=None,
+            vectorized_metadata_hash=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def delete_event_by_id(db: Session, event_id: int, from_vectorstore_only: bool = True):
+    """Delete event by id from vectorstore and (optionally) from database."""
     db_event = get_event_by_id(db=db, id=event_id)
 
     if db_event is None:
@@ -309,25 +769,12 @@ def delete_event_by_id(db: Session, event_id: int, from_vectorstore_only: bool =
     if not db_event.is_vectorized:
         raise Exception(f"Event (id={event_id}) is not vectorized.")
 
-    pinecone.init(api_key=PINECONE_API_KEY, environment=PINECONE_ENV)
-    index = pinecone.Index(PINECONE_INDEX)
-
-    queries = index.query(
-        top_k=1,
-        vector=[0] * EMBEDDING_SIZE,
-        namespace=PINECONE_NAMESPACE,
-        include_metadata=True,
-        include_values=False,
-        filter={"id": event_id},
-    )
-    doc_event = [q for q in queries["matches"]][0]
-    delete_response = index.delete(ids=[doc_event.id], namespace=PINECONE_NAMESPACE)
-    if delete_response:
-        raise Exception(
-            f"Pinecone failed to delete event (id={event_id}). Response: {delete_response}"
-        )
+    get_vector_backend(db=db).delete_events({event_id: db_event.vector_id})
 
     db_event.is_vectorized = False
+    db_event.vector_id = None
+    db_event.vectorized_text_hash = None
+    db_event.vectorized_metadata_hash = None
 
     if not from_vectorstore_only:
         db.delete(db_event)
@@ -335,6 +782,79 @@ def delete_event_by_id(db: Session, event_id: int, from_vectorstore_only: bool =
     db.commit()
 
 
+def get_event_embeddings(
+    db: Session, event_ids: list[int], model: str
+) -> dict[int, EventEmbeddingORM]:
+    """Get the stored embeddings of the events made with a model, by event id."""
+    return {
+        e.event_id: e
+        for e in db.query(EventEmbeddingORM).filter(
+            EventEmbeddingORM.event_id.in_(event_ids),
+            EventEmbeddingORM.model == model,
+        )
+    }
+
+
+def register_event_embeddings(db: Session, event_embeddings_in: list[dict]) -> None:
+    """
+    Store the embeddings of a batch of events, replacing the previous ones.
+    Rows are dicts of event_id, model, content_hash and embedding, which is
+    not validated by a schema as that costs more than the insert.
+    """
+    if len(event_embeddings_in) == 0:
+        return
+
+    registered_at = datetime.datetime.utcnow()
+    stmt = postgresql.insert(EventEmbeddingORM)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[EventEmbeddingORM.event_id],
+            set_={
+                "model": stmt.excluded.model,
+                "content_hash": stmt.excluded.content_hash,
+                "embedding": stmt.excluded.embedding,
+                "registered_at": stmt.excluded.registered_at,
+            },
+        ),
+        [e | {"registered_at": registered_at} for e in event_embeddings_in],
+    )
+    db.commit()
+
+
+def get_events_recommendation_stats(
+    db: Session, from_datetime: datetime.datetime, to_datetime: datetime.datetime
+) -> list:
+    """
+    Get how many times each event was recommended to the users over a period,
+    how many users it was recommended to and how many of them clicked it after.
+    """
+    return db.execute(
+        select(
+            ConversationEventORM.event_id,
+            func.count(distinct(ConversationEventORM.conversation_id)).label(
+                "recommendations"
+            ),
+            func.count(distinct(ConversationORM.user_id)).label("users"),
+            func.count(distinct(ClickORM.user_id)).label("clicked_users"),
+        )
+        .join(
+            ConversationORM,
+            ConversationORM.id == ConversationEventORM.conversation_id,
+        )
+        .outerjoin(
+            ClickORM,
+            and_(
+                ClickORM.event_id == ConversationEventORM.event_id,
+                ClickORM.user_id == ConversationORM.user_id,
+                ClickORM.registered_at >= ConversationORM.registered_at,
+            ),
+        )
+        .where(ConversationORM.received_at.between(from_datetime, to_datetime))
+        .group_by(ConversationEventORM.event_id)
+        .order_by(desc("recommendations"))
+    ).all()
+
+
 # Click
 def register_click(db: Session, click_in: Click) -> ClickORM:
     click_dict = click_in.dict()
@@ -345,3 +865,246 @@ def register_click(db: Session, click_in: Click) -> ClickORM:
     db.commit()
     db.refresh(db_click)
     return db_click
+
+
+# Job
+def get_jobs_by_ids(db: Session, ids: list[int]) -> list[JobORM]:
+    return db.query(JobORM).filter(JobORM.id.in_(ids)).order_by(JobORM.id).all()
+
+
+def jobs_rows(jobs_in: list[Job]) -> list[dict]:
+    """
+    Rows of jobs to queue, shared with the async services.
+    Jobs become available only after the debounce interval, so that
+    the messages sent in a burst by the same user are answered together.
+    """
+    registered_at = datetime.datetime.utcnow()
+    available_at = registered_at + datetime.timedelta(seconds=MESSAGE_DEBOUNCE_INTERVAL)
+    return [
+        job_in.dict()
+        | {
+            "status": JobStatus.pending,
+            "attempts": 0,
+            "registered_at": registered_at,
+            "available_at": available_at,
+        }
+        for job_in in jobs_in
+    ]
+
+
+def register_jobs(db: Session, jobs_in: list[Job]) -> None:
+    """Queue a batch of jobs with a single statement."""
+    db.execute(insert(JobORM), jobs_rows(jobs_in))
+    db.commit()
+
+
+def _claimable_jobs_filter(now: datetime.datetime):
+    """
+    Filter jobs waiting to be processed, including jobs left running
+    by a crashed worker after a timeout.
+    """
+    return and_(
+        or_(
+            JobORM.status == JobStatus.pending,
+            and_(
+                JobORM.status == JobStatus.running,
+                JobORM.started_at < now - datetime.timedelta(seconds=JOB_TIMEOUT),
+            ),
+        ),
+        JobORM.attempts < JOB_MAX_ATTEMPTS,
+    )
+
+
+def claim_user_jobs(db: Session, limit: int) -> list[list[JobORM]]:
+    """
+    Claim the jobs of the users that have been waiting the longest and mark them
+    as running. Jobs are grouped per user and a user is claimed only when
+    the debounce window of its last message is over.
+    Rows are locked with SKIP LOCKED so that concurrent workers never
+    claim the same job.
+    """
+    now = datetime.datetime.utcnow()
+    debouncing_job = aliased(JobORM)
+    db_jobs = (
+        db.query(JobORM)
+        .filter(
+            _claimable_jobs_filter(now),
+            JobORM.available_at <= now,
+            ~exists().where(
+                debouncing_job.wa_number_id == JobORM.wa_number_id,
+                debouncing_job.phone_number == JobORM.phone_number,
+                debouncing_job.status == JobStatus.pending,
+                debouncing_job.available_at > now,
+            ),
+        )
+        .order_by(JobORM.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    users = list(dict.fromkeys((j.wa_number_id, j.phone_number) for j in db_jobs))
+    if len(users) == 0:
+        db.commit()
+        return []
+
+    # the other jobs of the same users may have been left out by the limit
+    db_jobs = (
+        db.query(JobORM)
+        .filter(
+            _claimable_jobs_filter(now),
+            tuple_(JobORM.wa_number_id, JobORM.phone_number).in_(users),
+        )
+        .order_by(JobORM.id)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    jobs_per_user: dict[tuple[str, str], list[JobORM]] = {user: [] for user in users}
+    for db_job in db_jobs:
+        db_job.status = JobStatus.running
+        db_job.attempts += 1
+        db_job.started_at = now
+        jobs_per_user[(db_job.wa_number_id, db_job.phone_number)].append(db_job)
+    db.commit()
+    return [user_jobs for user_jobs in jobs_per_user.values() if len(user_jobs) > 0]
+
+
+def complete_jobs(db: Session, db_jobs: list[JobORM]) -> None:
+    finished_at = datetime.datetime.utcnow()
+    for db_job in db_jobs:
+        db_job.status = JobStatus.done
+        db_job.error = None
+        db_job.finished_at = finished_at
+    db.commit()
+
+
+def fail_jobs(db: Session, db_jobs: list[JobORM], error: str) -> bool:
+    """
+    Put the jobs back in the queue, or mark them as failed if out of attempts.
+    Return whether the jobs are failed for good.
+    """
+    is_failed = any(db_job.attempts >= JOB_MAX_ATTEMPTS for db_job in db_jobs)
+    for db_job in db_jobs:
+        if is_failed:
+            db_job.status = JobStatus.failed
+            db_job.finished_at = datetime.datetime.utcnow()
+        else:
+            db_job.status = JobStatus.pending
+        db_job.error = error
+    db.commit()
+    return is_failed
+
+
+def renew_job_leases(db: Session, job_attempts: dict[int, int]) -> bool:
+    """
+    Restart the timeout of running jobs, given the attempt they were claimed
+    with by id: a job claimed again after its timeout has another attempt.
+    Return whether the jobs are still held by the claimer.
+    """
+    result = db.execute(
+        update(JobORM)
+        .where(
+            tuple_(JobORM.id, JobORM.attempts).in_(list(job_attempts.items())),
+            JobORM.status == JobStatus.running,
+        )
+        .values(started_at=datetime.datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == len(job_attempts)
+
+
+def fail_timed_out_jobs(db: Session) -> list:
+    """
+    Mark as failed the jobs left running by a crashed worker after a timeout
+    that are out of attempts, as they are not claimed again.
+    Return their id, WhatsApp number ID and temporary conversation id.
+    """
+    now = datetime.datetime.utcnow()
+    rows = db.execute(
+        update(JobORM)
+        .where(
+            JobORM.status == JobStatus.running,
+            JobORM.started_at < now - datetime.timedelta(seconds=JOB_TIMEOUT),
+            JobORM.attempts >= JOB_MAX_ATTEMPTS,
+        )
+        .values(status=JobStatus.failed, finished_at=now, error="Timed out.")
+        .returning(JobORM.id, JobORM.wa_number_id, JobORM.conversation_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return rows
+
+
+# Broadcast
+def get_broadcast_by_id(db: Session, id: int) -> BroadcastORM | None:
+    return db.query(BroadcastORM).filter_by(id=id).first()
+
+
+def register_broadcast(
+    db: Session, broadcast_in: Broadcast, phone_numbers: list[str] | None = None
+) -> BroadcastORM:
+    """
+    Register a broadcast with a pending message for each recipient.
+    If no phone numbers are given, all the users that are not blocked are recipients.
+    """
+    broadcast_dict = broadcast_in.dict()
+    broadcast_dict["registered_at"] = datetime.datetime.utcnow()
+
+    db_broadcast = BroadcastORM(**broadcast_dict)
+    db.add(db_broadcast)
+    db.flush()
+
+    if phone_numbers is None:
+        db.execute(
+            insert(BroadcastMessageORM).from_select(
+                ["broadcast_id", "phone_number", "status", "attempts"],
+                select(
+                    literal(db_broadcast.id),
+                    UserORM.phone_number,
+                    literal(BroadcastStatus.pending, BroadcastMessageORM.status.type),
+                    literal(0),
+                )
+                .filter(UserORM.id != FAKE_USER_ID, UserORM.is_blocked == False)
+                .order_by(UserORM.id),
+            )
+        )
+    elif len(phone_numbers) > 0:
+        db.execute(
+            insert(BroadcastMessageORM),
+            [
+                {
+                    "broadcast_id": db_broadcast.id,
+                    "phone_number": phone_number,
+                    "status": BroadcastStatus.pending,
+                    "attempts": 0,
+                }
+                for phone_number in phone_numbers
+            ],
+        )
+
+    db.commit()
+    db.refresh(db_broadcast)
+    return db_broadcast
+
+
+def get_pending_broadcast_messages(
+    db: Session, broadcast_id: int, after_id: int, limit: int
+) -> list[BroadcastMessageORM]:
+    """Get the next batch of pending messages of a broadcast, ordered by id."""
+    return (
+        db.query(BroadcastMessageORM)
+        .filter(
+            BroadcastMessageORM.broadcast_id == broadcast_id,
+            BroadcastMessageORM.status == BroadcastStatus.pending,
+            BroadcastMessageORM.id > after_id,
+        )
+        .order_by(BroadcastMessageORM.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def update_broadcast_messages(db: Session, messages_update_in: list[dict]) -> None:
+    """Update the status of a batch of messages, given as dicts including their id."""
+    db.execute(update(BroadcastMessageORM), messages_update_in)
+    db.commit()
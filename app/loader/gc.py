@@ -0,0 +1,129 @@
+import argparse
+import datetime
+import logging
+import statistics
+import time
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.answerer.push.agent import get_events_filter
+from app.constants import (
+    EMBEDDING_SIZE,
+    N_EVENTS_CONTEXT,
+    VECTORSTORE_GC_BATCH_SIZE,
+    VECTORSTORE_GC_INTERVAL,
+    VECTORSTORE_GC_LATENCY_QUERIES,
+)
+from app.db.services import (
+    get_expired_vectorized_events,
+    set_events_not_vectorized,
+)
+from app.vectorstore import VectorBackend, get_vector_backend
+
+
+class VectorstoreGC:
+    """
+    Garbage collector of the vectors of the expired events, which no query
+    of the agent can match anymore but that every query has to filter out.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        vector_backend: VectorBackend | None = None,
+        batch_size: int = VECTORSTORE_GC_BATCH_SIZE,
+    ) -> None:
+        self.db = db
+        self.vector_backend = (
+            vector_backend if vector_backend is not None else get_vector_backend(db=db)
+        )
+        self.batch_size = batch_size
+
+    def get_query_latency(
+        self, today: datetime.date, n_queries: int = VECTORSTORE_GC_LATENCY_QUERIES
+    ) -> float:
+        """
+        Get the median latency in milliseconds of the search of the agent for
+        the next week, with random embeddings as the results don't matter.
+        """
+        events_filter = get_events_filter(today_date=today)
+        embeddings = np.random.default_rng(0).standard_normal(
+            (n_queries, EMBEDDING_SIZE)
+        )
+        latencies = []
+        for embedding in embeddings:
+            started_at = time.perf_counter()
+            self.vector_backend.query(
+                embedding.tolist(), k=N_EVENTS_CONTEXT, filter=events_filter
+            )
+            latencies.append(1000 * (time.perf_counter() - started_at))
+        return statistics.median(latencies)
+
+    def collect(self, today: datetime.date | None = None) -> dict:
+        """
+        Delete the vectors of the events ended before today in batches, then
+        flag the events as not vectorized with a single update.
+        Return the size of the vectorstore and the query latency before and after.
+        """
+        today = today if today is not None else datetime.date.today()
+        report = {
+            "vectors_before": self.vector_backend.count(),
+            "latency_before": self.get_query_latency(today),
+        }
+
+        db_events = get_expired_vectorized_events(db=self.db, today=today)
+        for i in range(0, len(db_events), self.batch_size):
+            self.vector_backend.delete_events(
+                {e.id: e.vector_id for e in db_events[i : i + self.batch_size]}
+            )
+            logging.info(
+                f"Deleted vectors of {min(i + self.batch_size, len(db_events))}"
+                + f"/{len(db_events)} expired events."
+            )
+        if len(db_events) > 0:
+            self.vector_backend.flush()
+            set_events_not_vectorized(db=self.db, event_ids=[e.id for e in db_events])
+
+        report |= {
+            "expired_events": len(db_events),
+            "vectors_after": self.vector_backend.count(),
+            "latency_after": self.get_query_latency(today),
+        }
+        logging.info(
+            f"Collected {report['expired_events']} expired events: "
+            + f"{report['vectors_before']} -> {report['vectors_after']} vectors, "
+            + f"query latency {report['latency_before']:.1f} -> "
+            + f"{report['latency_after']:.1f} ms."
+        )
+        return report
+
+
+if __name__ == "__main__":
+    from app.db.db import SessionLocal
+
+    parser = argparse.ArgumentParser(
+        description="Delete the expired events from the vectorstore."
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="Collect once, e.g. from a cron job."
+    )
+    parser.add_argument("--batch-size", type=int, default=VECTORSTORE_GC_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    while True:
+        # a session per collection, not to keep a transaction open meanwhile
+        db = SessionLocal()
+        try:
+            VectorstoreGC(db=db, batch_size=args.batch_size).collect()
+        except Exception as e:
+            if args.once:
+                raise
+            logging.exception(f"Vectorstore gc failed: {e}")
+        finally:
+            db.close()
+
+        if args.once:
+            break
+        time.sleep(VECTORSTORE_GC_INTERVAL)
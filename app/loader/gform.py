@@ -9,7 +9,7 @@ from sqlalchemy.orm import Session
 
 from app.db.enums import CityEnum, PriceLevel
 from app.db.schemas import Event
-from app.db.services import get_event, register_event
+from app.db.services import register_events_bulk
 
 GFORM_SUPPORTED_SOURCES = {
     # maps source identifier to sheet name
@@ -192,7 +192,7 @@ class GFormLoader:
             logging.info("No data is present.")
             return
 
-        counter = 0
+        events_in: list[Event] = []
         for exp_type in ["Locale", "Evento"]:
             cols = self._COLS_MAP[exp_type]
             df = self.df.loc[self.df[self._COL_EXPERIENCE_TYPE] == exp_type][
@@ -271,7 +271,7 @@ class GFormLoader:
                         f"Opening period has a not accepted value: {row[cols['opening_period']]}."
                     )
 
-                new_event = Event(
+                event = Event(
                     description=description,
                     is_vectorized=False,
                     city=city,
@@ -292,17 +292,12 @@ class GFormLoader:
                     price_level=price_level,
                 )
 
-                db_event = get_event(
-                    db=self.db,
-                    source=self.source,
-                    url=url,
-                    start_date=start_date,
-                    end_date=end_date,
-                )
-                if db_event is None:
-                    db_event = register_event(
-                        db=self.db, event_in=new_event, source=self.source
-                    )
-                    counter += 1
+                events_in.append(event)
 
-        logging.info(f"Inserted {counter} new events.")
+        inserted_ids, skipped_ids = register_events_bulk(
+            db=self.db, events_in=events_in, source=self.source, update_existing=True
+        )
+        logging.info(
+            f"Inserted {len(inserted_ids)} new events, "
+            + f"{len(skipped_ids)} already present."
+        )
@@ -1,80 +1,367 @@
-import uuid
+import argparse
+import datetime
+import functools
+import hashlib
+import json
+import logging
+import time
+from typing import Iterator
 
-from langchain.docstore.document import Document
+import tiktoken
+from langchain.embeddings.base import Embeddings
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
-from app.constants import PINECONE_NAMESPACE, VECTORSTORE_TEXT_KEY
+from app.constants import (
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_MODEL,
+    VECTORIZE_BATCH_SIZE,
+    VECTORSTORE_REINDEX_BATCH_SIZE,
+)
 from app.db.models import EventORM
 from app.db.schemas import EventInVectorstore
-from app.utils.conn import get_pinecone_index, get_vectorstore
+from app.db.services import (
+    get_event_embeddings,
+    register_event_embeddings,
+    set_events_vectorized,
+)
+from app.utils.conn import get_embeddings
+from app.vectorstore import VectorBackend, VectorRecord, get_vector_backend
+
+
+def get_content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def get_metadata_hash(metadata: dict) -> str:
+    return get_content_hash(json.dumps(metadata, sort_keys=True, default=str))
 
 
 class Loader:
-    def __init__(self, db: Session) -> None:
+    def __init__(
+        self,
+        db: Session,
+        embeddings: Embeddings | None = None,
+        vector_backend: VectorBackend | None = None,
+    ) -> None:
         self.db = db
-        self.pinecone_index = get_pinecone_index()
-        self.vectorstore = get_vectorstore(index=self.pinecone_index)
+        self.embeddings = embeddings if embeddings is not None else get_embeddings()
+        self.vector_backend = (
+            vector_backend if vector_backend is not None else get_vector_backend(db=db)
+        )
+
+    @functools.cached_property
+    def encoding(self) -> tiktoken.Encoding:
+        """Tokenizer of the embedding model, loaded once texts are embedded."""
+        return tiktoken.encoding_for_model(EMBEDDING_MODEL)
 
-    def add_document_sync(self, doc: Document) -> str:
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        """Embed texts with one request per batch of EMBEDDING_BATCH_MAX_TOKENS."""
+        batches = [[]]
+        batch_tokens = 0
+        for text in texts:
+            n_tokens = len(self.encoding.encode(text))
+            if batch_tokens + n_tokens > EMBEDDING_BATCH_MAX_TOKENS and batches[-1]:
+                batches.append([])
+                batch_tokens = 0
+            batches[-1].append(text)
+            batch_tokens += n_tokens
+        return [v for batch in batches for v in self.embeddings.embed_documents(batch)]
+
+    def stream_events(self, *criteria, batch_size: int) -> Iterator[list[EventORM]]:
+        """
+        Stream the events matching the criteria in batches, in the order of the
+        ids. They are read by a server-side cursor of another session, which is
+        not closed by the commits of the loader meanwhile.
         """
-        Add a single document synchronously to the vectorstore.
-        This implementation is vectorstore-specific: Pinecone.
+        with Session(bind=self.db.get_bind()) as stream_db:
+            yield from stream_db.scalars(
+                select(EventORM)
+                .where(*criteria)
+                .order_by(EventORM.id)
+                .execution_options(yield_per=batch_size)
+            ).partitions()
+
+    def get_vector_records(self, db_events: list[EventORM]) -> list[VectorRecord]:
         """
-        doc_id = str(uuid.uuid4())
-        doc_embedding = self.vectorstore.embeddings.embed_documents([doc.page_content])[
-            0
+        Get the records to add to the vectorstore from the stored embeddings of
+        the events. Only the events without an embedding of their current
+        description are embedded, and their embeddings are stored.
+        """
+        # read before the embeddings are committed, which expires the events
+        records = [
+            VectorRecord(
+                event_id=db_event.id,
+                embedding=[],
+                text=db_event.description,
+                metadata=EventInVectorstore.from_event_orm(db_event).__dict__,
+            )
+            for db_event in db_events
         ]
-        doc_metadata = doc.metadata
-        doc_metadata[VECTORSTORE_TEXT_KEY] = doc.page_content
 
-        _ = self.pinecone_index.upsert(
-            vectors=[(doc_id, doc_embedding, doc_metadata)],
-            namespace=PINECONE_NAMESPACE,
-            async_req=False,
+        db_embeddings = get_event_embeddings(
+            db=self.db, event_ids=[r.event_id for r in records], model=EMBEDDING_MODEL
         )
-        return doc_id
+        records_to_embed = []
+        for record in records:
+            db_embedding = db_embeddings.get(record.event_id)
+            content_hash = get_content_hash(record.text)
+            if db_embedding is not None and db_embedding.content_hash == content_hash:
+                record.embedding = db_embedding.embedding.tolist()
+            else:
+                records_to_embed.append(record)
 
-    def add_document_async(self, doc: Document) -> str:
+        if len(records_to_embed) > 0:
+            vectors = self.embed_texts([r.text for r in records_to_embed])
+            for record, vector in zip(records_to_embed, vectors):
+                record.embedding = vector
+            register_event_embeddings(
+                db=self.db,
+                event_embeddings_in=[
+                    {
+                        "event_id": r.event_id,
+                        "model": EMBEDDING_MODEL,
+                        "content_hash": get_content_hash(r.text),
+                        "embedding": r.embedding,
+                    }
+                    for r in records_to_embed
+                ],
+            )
+        return records
+
+    def add_events(self, db_events: list[EventORM]) -> None:
         """
-        Add a single document asynchronously to the vectorstore.
-        This implementation is generic using Langchain interface.
+        Upsert a batch of events to the vectorstore and flag them as vectorized
+        with the id and the hashes of what was upserted. The vectors the events
+        had under another id are deleted, looked up for the events vectorized
+        before their vector id was stored.
         """
-        doc_ids = self.vectorstore.add_documents([doc])
-        return doc_ids[0]
+        previous_vector_ids = {
+            e.id: [e.vector_id] if e.vector_id is not None else [] for e in db_events
+        }
+        legacy_event_ids = [
+            e.id for e in db_events if e.is_vectorized and e.vector_id is None
+        ]
+        if len(legacy_event_ids) > 0:
+            previous_vector_ids |= self.vector_backend.find_vector_ids(legacy_event_ids)
+        records = self.get_vector_records(db_events)
+        self.vector_backend.upsert(records)
+        replaced_vector_ids = [
+            v
+            for r in records
+            for v in previous_vector_ids[r.event_id]
+            if v != r.vector_id
+        ]
+        if len(replaced_vector_ids) > 0:
+            self.vector_backend.delete(replaced_vector_ids)
+        # the vectors are persisted before the events are flagged
+        self.vector_backend.flush()
+        set_events_vectorized(
+            db=self.db,
+            vectors_in=[
+                {
+                    "id": r.event_id,
+                    "vector_id": r.vector_id,
+                    "vectorized_text_hash": get_content_hash(r.text),
+                    "vectorized_metadata_hash": get_metadata_hash(r.metadata),
+                }
+                for r in records
+            ],
+        )
 
-    def vectorize_event(self, db_event: EventORM, async_add: bool = True) -> None:
+    def vectorize_event(self, db_event: EventORM) -> None:
         """Vectorize and add a single event to the vectorstore."""
         if db_event.is_vectorized:
             raise Exception(
                 f"Can't vectorize event (id={db_event.id}) which is already vectorized."
             )
 
-        event_doc = Document(
-            page_content=db_event.description,
-            metadata=EventInVectorstore.from_event_orm(db_event).__dict__,
+        self.add_events([db_event])
+
+    def get_not_vectorized_events(self) -> list[EventORM]:
+        """Get non-vectorized events in the database, not expired yet."""
+        query = self.db.query(EventORM).filter(
+            EventORM.is_vectorized == False,
+            EventORM.end_date >= datetime.date.today(),
         )
+        return [e for e in query]
 
-        if async_add:
-            _ = self.add_document_async(event_doc)
-        else:
-            _ = self.add_document_sync(event_doc)
+    def vectorize_events(self, batch_size: int = VECTORIZE_BATCH_SIZE) -> int:
+        """
+        Vectorize all non-vectorized events not expired yet in the database
+        and add them to the vectorstore, in batches: each batch is embedded
+        with few requests, upserted at once and flagged with a single update.
+        Return the number of events vectorized.
+        """
+        # the expired events are left out, the vectorstore gc unflagged them
+        pending = (
+            EventORM.is_vectorized == False,
+            EventORM.end_date >= datetime.date.today(),
+        )
+        n_pending = self.db.scalar(select(func.count(EventORM.id)).where(*pending))
+        if n_pending == 0:
+            return 0
 
-        db_event.is_vectorized = True
-        self.db.commit()
+        n_events = 0
+        started_at = time.perf_counter()
+        for db_events in self.stream_events(*pending, batch_size=batch_size):
+            self.add_events(db_events)
 
-    def get_not_vectorized_events(self) -> list[EventORM]:
-        """Get non-vectorized events in the database."""
-        query = self.db.query(EventORM).filter(EventORM.is_vectorized == False)
-        return [e for e in query]
+            n_events += len(db_events)
+            elapsed = time.perf_counter() - started_at
+            logging.info(
+                f"Vectorized {n_events}/{n_pending} events "
+                + f"({n_events / elapsed:.1f} events/s)."
+            )
+        return n_events
+
+    def reindex_events(self, batch_size: int = VECTORSTORE_REINDEX_BATCH_SIZE) -> int:
+        """
+        Add the vectorized events not expired yet to the vectorstore, e.g. to
+        fill a new backend, in batches. The stored embeddings are used, so only
+        the events vectorized before they were stored are embedded.
+        Return the number of events added.
+        """
+        n_events = 0
+        started_at = time.perf_counter()
+        for db_events in self.stream_events(
+            EventORM.is_vectorized == True,
+            EventORM.end_date >= datetime.date.today(),
+            batch_size=batch_size,
+        ):
+            self.add_events(db_events)
+
+            n_events += len(db_events)
+            elapsed = time.perf_counter() - started_at
+            logging.info(
+                f"Reindexed {n_events} events ({n_events / elapsed:.1f} events/s)."
+            )
+        return n_events
+
+    def sync_events(self, batch_size: int = VECTORIZE_BATCH_SIZE) -> dict[str, int]:
+        """
+        Upsert again the vectorized events not expired yet whose text or
+        metadata changed since, by their hashes. Only the events whose text
+        changed are embedded again, the others are upserted with their stored
+        embedding. Return the number of events by change.
+        """
+        n_events = {"text": 0, "metadata": 0, "unchanged": 0}
+        for db_events in self.stream_events(
+            EventORM.is_vectorized == True,
+            EventORM.end_date >= datetime.date.today(),
+            batch_size=batch_size,
+        ):
+            db_events_changed = []
+            for db_event in db_events:
+                text_hash = get_content_hash(db_event.description)
+                metadata = EventInVectorstore.from_event_orm(db_event).__dict__
+                if db_event.vectorized_text_hash != text_hash:
+                    n_events["text"] += 1
+                elif db_event.vectorized_metadata_hash != get_metadata_hash(metadata):
+                    n_events["metadata"] += 1
+                else:
+                    n_events["unchanged"] += 1
+                    continue
+                db_events_changed.append(db_event)
+
+            if len(db_events_changed) > 0:
+                self.add_events(db_events_changed)
+            logging.info(
+                f"Synced events with changed text: {n_events['text']}, "
+                + f"changed metadata: {n_events['metadata']}, "
+                + f"unchanged: {n_events['unchanged']}."
+            )
+        return n_events
 
-    def vectorize_events(self) -> None:
+    def backfill_vector_ids(
+        self, batch_size: int = VECTORSTORE_REINDEX_BATCH_SIZE
+    ) -> int:
         """
-        Vectorize all non-vectorized events in the database
-        and add them to the vectorstore.
+        Store the vector ids of the events vectorized before they were stored,
+        looked up once in the vectorstore, and delete the extra vectors of the
+        events vectorized twice. Return the number of events with a vector id.
         """
-        events = self.get_not_vectorized_events()
-        if len(events) == 0:
-            return
+        n_events = 0
+        n_not_found = 0
+        for db_events in self.stream_events(
+            EventORM.is_vectorized == True,
+            EventORM.vector_id == None,
+            batch_size=batch_size,
+        ):
+            vector_ids = self.vector_backend.find_vector_ids([e.id for e in db_events])
+            kept_vector_ids = {
+                event_id: str(event_id) if str(event_id) in ids else ids[0]
+                for event_id, ids in vector_ids.items()
+            }
+            duplicate_vector_ids = [
+                v
+                for event_id, ids in vector_ids.items()
+                for v in ids
+                if v != kept_vector_ids[event_id]
+            ]
+            if len(duplicate_vector_ids) > 0:
+                self.vector_backend.delete(duplicate_vector_ids)
+                self.vector_backend.flush()
+            if len(kept_vector_ids) > 0:
+                set_events_vectorized(
+                    db=self.db,
+                    vectors_in=[
+                        {"id": event_id, "vector_id": vector_id}
+                        for event_id, vector_id in kept_vector_ids.items()
+                    ],
+                )
+
+            n_events += len(kept_vector_ids)
+            n_not_found += len(db_events) - len(kept_vector_ids)
+            logging.info(
+                f"Stored the vector ids of {n_events} events, "
+                + f"{n_not_found} not found in the vectorstore."
+            )
+        return n_events
+
 
-        for db_event in events:
-            self.vectorize_event(db_event)
+if __name__ == "__main__":
+    from app.db.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Load events into the vectorstore.")
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        help="Add the events already vectorized to the configured backend.",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Upsert again the vectorized events that changed since.",
+    )
+    parser.add_argument(
+        "--backfill-vector-ids",
+        action="store_true",
+        help="Store the vector ids of the events vectorized before they were.",
+    )
+    parser.add_argument("--batch-size", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        loader = Loader(db=db)
+        if args.reindex:
+            n_events = loader.reindex_events(
+                args.batch_size or VECTORSTORE_REINDEX_BATCH_SIZE
+            )
+            logging.info(f"Reindexed {n_events} events.")
+        elif args.backfill_vector_ids:
+            n_events = loader.backfill_vector_ids(
+                args.batch_size or VECTORSTORE_REINDEX_BATCH_SIZE
+            )
+            logging.info(f"Stored the vector ids of {n_events} events.")
+        elif args.sync:
+            n_events = loader.sync_events(args.batch_size or VECTORIZE_BATCH_SIZE)
+            logging.info(f"Synced events: {n_events}.")
+        else:
+            n_events = loader.vectorize_events(args.batch_size or VECTORIZE_BATCH_SIZE)
+            logging.info(f"Vectorized {n_events} events.")
+        logging.info(f"{loader.vector_backend.count()} vectors in the vectorstore.")
+    finally:
+        db.close()
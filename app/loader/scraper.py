@@ -8,7 +8,7 @@ from tenacity import retry, stop_after_attempt
 
 from app.db.enums import CityEnum
 from app.db.schemas import Event
-from app.db.services import get_event, register_event
+from app.db.services import get_event, get_event_urls, register_events_bulk
 from app.utils.datetime_utils import convert_italian_month
 
 
@@ -402,17 +402,24 @@ class Scraper:
         self.scraper: BaseScraper = SCRAPER_SUPPORTED_SOURCES[identifier](db=self.db)
 
     def update_db(self) -> int:
-        counter = 0
+        """
+        Register the scraped events whose url is not in the db yet: an event
+        scraped again with other dates is not registered a second time.
+        """
+        existing_urls = get_event_urls(
+            db=self.db,
+            source=self.scraper.source,
+            urls=[e.url for e in self.scraper.output],
+        )
+        new_events = {}
         for event in self.scraper.output:
-            db_event = get_event(db=self.db, source=self.scraper.source, url=event.url)
-            if db_event is None:
-                db_event = register_event(
-                    db=self.db, event_in=event, source=self.scraper.source
-                )
-                counter += 1
+            if event.url not in existing_urls:
+                new_events.setdefault(event.url, event)
 
-        self.db.commit()
-        return counter
+        inserted_ids, _ = register_events_bulk(
+            db=self.db, events_in=list(new_events.values()), source=self.scraper.source
+        )
+        return len(inserted_ids)
 
     def run(self) -> None:
         logging.info(f"Starting scraper for {self.scraper.identifier}.")
@@ -0,0 +1,87 @@
+import datetime
+import threading
+import time
+
+from app.constants import (
+    BLOCKED_USERS_AUDIT_INTERVAL,
+    BLOCKED_USERS_CACHE_SIZE,
+    BLOCKED_USERS_CACHE_TTL,
+)
+
+
+class BlockedUsersCache:
+    """
+    Per-process cache of the phone numbers of blocked users, so that their
+    messages can be dropped before reaching the db.
+    An entry expires with the block or after a TTL, whichever comes first.
+    Once per audit interval a message of a cached user is let through, so that
+    it is recorded and the block is checked against the db: users unblocked by
+    another process are not invalidated here otherwise.
+    """
+
+    def __init__(
+        self,
+        ttl: float = BLOCKED_USERS_CACHE_TTL,
+        audit_interval: float = BLOCKED_USERS_AUDIT_INTERVAL,
+        max_size: int = BLOCKED_USERS_CACHE_SIZE,
+    ) -> None:
+        self.ttl = ttl
+        self.audit_interval = audit_interval
+        self.max_size = max_size
+        # phone number -> (expires at, last audit at), as monotonic times
+        self._entries: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(
+        self, phone_number: str, block_expires_at: datetime.datetime | None
+    ) -> None:
+        now = time.monotonic()
+        expires_at = now + self.ttl
+        if block_expires_at is not None:
+            block_seconds_left = (
+                block_expires_at - datetime.datetime.utcnow()
+            ).total_seconds()
+            expires_at = min(expires_at, now + block_seconds_left)
+        if expires_at <= now:
+            return
+
+        with self._lock:
+            if (
+                phone_number not in self._entries
+                and len(self._entries) >= self.max_size
+            ):
+                self._evict(now)
+            self._entries[phone_number] = (expires_at, now)
+
+    def discard(self, phone_number: str) -> None:
+        with self._lock:
+            self._entries.pop(phone_number, None)
+
+    def is_blocked(self, phone_number: str) -> bool:
+        """Whether a message of the user is to be dropped, audits are not."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(phone_number)
+            if entry is None:
+                return False
+            expires_at, audited_at = entry
+            if expires_at <= now:
+                del self._entries[phone_number]
+                return False
+            if now - audited_at >= self.audit_interval:
+                self._entries[phone_number] = (expires_at, now)
+                return False
+            return True
+
+    def _evict(self, now: float) -> None:
+        """Drop the expired entries, or the oldest one if none is expired."""
+        expired = [
+            p for p, (expires_at, _) in self._entries.items() if expires_at <= now
+        ]
+        for phone_number in expired:
+            del self._entries[phone_number]
+        if len(expired) == 0:
+            del self._entries[next(iter(self._entries))]
+
+
+blocked_users_cache = BlockedUsersCache()
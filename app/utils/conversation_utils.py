@@ -8,7 +8,10 @@ def db_to_langchain_conversation(
     conversation = []
     for db_conversation in db_conversations:
         conversation.append(("human", db_conversation.from_message))
-        if db_conversation.answer_type != AnswerType.unanswered:
+        if db_conversation.answer_type not in [
+            AnswerType.unanswered,
+            AnswerType.merged,
+        ]:
             conversation.append(("ai", db_conversation.to_message))
     return conversation
 
@@ -3,13 +3,13 @@ import json
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.constants import CUSTOM_ROOT_URL
-from app.db.db import get_db
+from app.db.async_services import get_event_by_id, get_user_by_id, register_click
+from app.db.db import get_async_db
 from app.db.models import UserORM
 from app.db.schemas import Click
-from app.db.services import get_event_by_id, get_user_by_id, register_click
 
 
 def encode_url_key(payload: Click) -> str:
@@ -29,7 +29,9 @@ router = APIRouter()
 
 
 @router.get("/events/{url_key}")
-def forward_to_target_url(url_key: str, db: Session = Depends(get_db)) -> None:
+async def forward_to_target_url(
+    url_key: str, db: AsyncSession = Depends(get_async_db)
+) -> None:
     try:
         payload = decode_url_key(url_key)
     except:
@@ -37,21 +39,21 @@ def forward_to_target_url(url_key: str, db: Session = Depends(get_db)) -> None:
             status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect url key."
         )
 
-    db_event = get_event_by_id(db=db, id=payload.event_id)
+    db_event = await get_event_by_id(db=db, id=payload.event_id)
     if db_event is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="This event does not exist.",
         )
 
-    db_user = get_user_by_id(db=db, id=payload.user_id, orm=UserORM)
+    db_user = await get_user_by_id(db=db, id=payload.user_id, orm=UserORM)
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="This user does not exist.",
         )
 
-    db_click = register_click(
+    db_click = await register_click(
         db=db, click_in=Click(event_id=payload.event_id, user_id=payload.user_id)
     )
 
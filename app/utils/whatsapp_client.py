@@ -1,18 +1,109 @@
+import datetime
+import email.utils
+import functools
+
 import requests
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    RetryCallState,
+    Retrying,
+    retry_if_exception_type,
+    retry_if_result,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from app.constants import (
+    WHATSAPP_API_TOKEN,
+    WHATSAPP_API_URL,
+    WHATSAPP_MAX_BACKOFF,
+    WHATSAPP_MAX_RETRIES,
+    WHATSAPP_POOL_SIZE,
+    WHATSAPP_TIMEOUT,
+)
+
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+def _is_retryable_response(response: requests.Response) -> bool:
+    return response.status_code in RETRY_STATUS_CODES
 
-from app.constants import WHATSAPP_API_TOKEN
+
+def _get_retry_after(response: requests.Response) -> float | None:
+    """Get the seconds to wait from the Retry-After header, if present."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+    # a malformed date is ignored, falling back to the exponential backoff
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.datetime.now(retry_at.tzinfo)).total_seconds(), 0)
+
+
+def _wait_retry_after(retry_state: RetryCallState) -> float:
+    """
+    Wait for as long as the Retry-After header asks to, otherwise
+    back off exponentially with jitter.
+    """
+    if not retry_state.outcome.failed:
+        retry_after = _get_retry_after(retry_state.outcome.result())
+        if retry_after is not None:
+            return min(retry_after, WHATSAPP_MAX_BACKOFF)
+    return wait_random_exponential(multiplier=0.5, max=WHATSAPP_MAX_BACKOFF)(
+        retry_state
+    )
 
 
 class WhatsappWrapper:
-    API_URL = "https://graph.facebook.com/v17.0/"
+    API_URL = WHATSAPP_API_URL
     API_TOKEN = WHATSAPP_API_TOKEN
 
-    def __init__(self, number_id: str) -> None:
-        self.headers = {
-            "Authorization": f"Bearer {self.API_TOKEN}",
-            "Content-Type": "application/json",
-        }
+    def __init__(
+        self,
+        number_id: str,
+        timeout: tuple[float, float] = WHATSAPP_TIMEOUT,
+        max_retries: int = WHATSAPP_MAX_RETRIES,
+        pool_size: int = WHATSAPP_POOL_SIZE,
+    ) -> None:
         self.url = self.API_URL + number_id
+        self.timeout = timeout
+
+        # connections are kept alive and reused across messages
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "Authorization": f"Bearer {self.API_TOKEN}",
+                "Content-Type": "application/json",
+            }
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # read timeouts are not retried as the message may have been sent
+        self.retrying = Retrying(
+            stop=stop_after_attempt(max_retries + 1),
+            wait=_wait_retry_after,
+            retry=(
+                retry_if_result(_is_retryable_response)
+                | retry_if_exception_type(requests.ConnectionError)
+            ),
+            retry_error_callback=lambda retry_state: retry_state.outcome.result(),
+        )
+
+    def _post_message(self, payload: dict) -> requests.Response:
+        return self.retrying.copy()(
+            self.session.post,
+            f"{self.url}/messages",
+            json=payload,
+            timeout=self.timeout,
+        )
 
     def send_message(
         self,
@@ -30,9 +121,7 @@ class WhatsappWrapper:
             },
         }
 
-        response = requests.post(
-            f"{self.url}/messages", headers=self.headers, json=payload
-        )
+        response = self._post_message(payload)
 
         return response
 
@@ -52,8 +141,14 @@ class WhatsappWrapper:
             },
         }
 
-        response = requests.post(
-            f"{self.url}/messages", headers=self.headers, json=payload
-        )
+        response = self._post_message(payload)
 
         return response
+
+
+@functools.cache
+def get_whatsapp_client(
+    number_id: str, max_retries: int = WHATSAPP_MAX_RETRIES
+) -> WhatsappWrapper:
+    """Get the client of a WhatsApp number, shared within the process."""
+    return WhatsappWrapper(number_id=number_id, max_retries=max_retries)
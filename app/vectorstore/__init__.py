@@ -0,0 +1,37 @@
+import functools
+
+from sqlalchemy.orm import Session
+
+from app.constants import LOCAL_VECTORSTORE_PATH, VECTORSTORE_BACKEND
+from app.vectorstore.base import VectorBackend, VectorRecord
+from app.vectorstore.local import LocalBackend
+from app.vectorstore.pinecone import PineconeBackend
+from app.vectorstore.postgres import PostgresBackend
+
+
+@functools.cache
+def _get_pinecone_backend() -> PineconeBackend:
+    """Connect to the Pinecone index once per process."""
+    return PineconeBackend()
+
+
+@functools.cache
+def _get_local_backend(path: str) -> LocalBackend:
+    """Load the local vectorstore once per process."""
+    return LocalBackend(path=path)
+
+
+def get_vector_backend(
+    db: Session | None = None, backend: str = VECTORSTORE_BACKEND
+) -> VectorBackend:
+    """Get the vectorstore backend set by the configuration."""
+    if backend == "pinecone":
+        return _get_pinecone_backend()
+    elif backend == "local":
+        return _get_local_backend(LOCAL_VECTORSTORE_PATH)
+    elif backend == "postgres":
+        if db is None:
+            raise Exception("The postgres vectorstore backend requires a db session.")
+        return PostgresBackend(db=db)
+    else:
+        raise Exception(f"Vectorstore backend not supported: {backend}.")
@@ -0,0 +1,105 @@
+import operator
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+from langchain.chains.query_constructor.ir import Comparator, Comparison, Operation
+from langchain.docstore.document import Document
+from sqlalchemy.orm import Session
+
+from app.db.models import EventORM
+
+# comparators of the filters supported by all the backends
+COMPARATORS = {
+    Comparator.EQ: operator.eq,
+    Comparator.NE: operator.ne,
+    Comparator.GT: operator.gt,
+    Comparator.GTE: operator.ge,
+    Comparator.LT: operator.lt,
+    Comparator.LTE: operator.le,
+}
+
+
+@dataclass
+class VectorRecord:
+    event_id: int
+    embedding: list[float]
+    text: str
+    metadata: dict  # EventInVectorstore, filtered on by the queries
+
+    @property
+    def vector_id(self) -> str:
+        return str(self.event_id)
+
+
+class VectorBackend(ABC):
+    """
+    Store of the event embeddings, searched by the push agent.
+    Filters are given in the langchain query language and translated by each
+    backend. Scores are cosine similarities and the documents returned carry
+    the event id in their metadata.
+    Vectors are keyed by the vector id of their record, which is stored on the
+    event; the vectors added to pinecone by langchain before have random ids.
+    """
+
+    @abstractmethod
+    def upsert(self, records: list[VectorRecord]) -> None:
+        """Add a batch of events, replacing the vectors they already have."""
+
+    @abstractmethod
+    def delete(self, vector_ids: list[str]) -> None:
+        """Remove a batch of vectors by their ids."""
+
+    def find_vector_ids(self, event_ids: list[int]) -> dict[int, list[str]]:
+        """Look up the ids of the vectors of the events, for the ones not stored."""
+        return {event_id: [str(event_id)] for event_id in event_ids}
+
+    def delete_events(self, vector_ids: dict[int, str | None]) -> None:
+        """
+        Remove the vectors of a batch of events, given their stored vector ids
+        by event id; the ids not stored yet are looked up.
+        """
+        event_ids_missing = [e for e, v in vector_ids.items() if v is None]
+        found_vector_ids = (
+            self.find_vector_ids(event_ids_missing)
+            if len(event_ids_missing) > 0
+            else {}
+        )
+        self.delete(
+            [v for v in vector_ids.values() if v is not None]
+            + [v for ids in found_vector_ids.values() for v in ids]
+        )
+
+    @abstractmethod
+    def query(
+        self,
+        embedding: list[float],
+        k: int,
+        filter: Operation | Comparison | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Get the k events most similar to an embedding, best first."""
+
+    def query_events(
+        self,
+        db: Session,
+        embedding: list[float],
+        k: int,
+        filter: Operation | Comparison | None = None,
+    ) -> list[tuple[EventORM, float]]:
+        """
+        Get the k events most similar to an embedding, best first, as rows of
+        the db: the results of the query are fetched with one query.
+        """
+        # the services import the backends
+        from app.db.services import get_events_by_ids
+
+        docs = self.query(embedding, k, filter=filter)
+        scores = {doc.metadata["id"]: score for doc, score in docs}
+        db_events = get_events_by_ids(db=db, ids=list(scores))
+        return [(db_event, scores[db_event.id]) for db_event in db_events]
+
+    @abstractmethod
+    def count(self) -> int:
+        """Get the number of vectors in the store."""
+
+    def flush(self) -> None:
+        """Persist the changes made so far, for the backends that buffer them."""
@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+
+import numpy as np
+from langchain.chains.query_constructor.ir import Comparison, Operation, Operator
+from langchain.docstore.document import Document
+
+from app.constants import EMBEDDING_SIZE
+from app.vectorstore.base import COMPARATORS, VectorBackend, VectorRecord
+
+
+class LocalBackend(VectorBackend):
+    """
+    In-process vectorstore for catalogs small enough to fit in memory.
+    Embeddings are normalized rows of a float32 matrix and each metadata
+    attribute is a column array, so that a query is a boolean mask over the
+    columns and a single matrix-vector product ranked with a partial sort.
+    If a path is given, the store is saved to a file on flush, once per batch
+    of changes; it is loaded once per process, so it is not shared between
+    running processes.
+    """
+
+    def __init__(self, path: str | None = None, dimension: int = EMBEDDING_SIZE):
+        self.path = path
+        self.dimension = dimension
+        self._is_changed = False
+        self._set_rows(
+            event_ids=np.empty(0, dtype=np.int64),
+            matrix=np.empty((0, dimension), dtype=np.float32),
+            texts=[],
+            metadatas=[],
+        )
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def _set_rows(
+        self,
+        event_ids: np.ndarray,
+        matrix: np.ndarray,
+        texts: list[str],
+        metadatas: list[dict],
+    ) -> None:
+        self._event_ids = event_ids
+        self._matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self._texts = texts
+        self._metadatas = metadatas
+        keys = set().union(*metadatas) if len(metadatas) > 0 else set()
+        # missing values are None, so that they match no comparison
+        self._columns = {key: np.array([m.get(key) for m in metadatas]) for key in keys}
+
+    def _keep_rows(self, keep: np.ndarray) -> tuple:
+        return (
+            self._event_ids[keep],
+            self._matrix[keep],
+            [t for t, k in zip(self._texts, keep) if k],
+            [m for m, k in zip(self._metadatas, keep) if k],
+        )
+
+    def upsert(self, records: list[VectorRecord]) -> None:
+        new_matrix = np.asarray(
+            [r.embedding for r in records], dtype=np.float32
+        ).reshape(-1, self.dimension)
+        norms = np.linalg.norm(new_matrix, axis=1, keepdims=True)
+        new_matrix /= np.where(norms > 0, norms, 1)
+
+        event_ids, matrix, texts, metadatas = self._keep_rows(
+            ~np.isin(self._event_ids, [r.event_id for r in records])
+        )
+        self._set_rows(
+            event_ids=np.concatenate(
+                [event_ids, np.array([r.event_id for r in records], dtype=np.int64)]
+            ),
+            matrix=np.vstack([matrix, new_matrix]),
+            texts=texts + [r.text for r in records],
+            metadatas=metadatas + [dict(r.metadata) for r in records],
+        )
+        self._is_changed = True
+
+    def delete(self, vector_ids: list[str]) -> None:
+        # vectors are keyed by event id, other ids can't be in the store
+        event_ids = [int(v) for v in vector_ids if v.isdigit()]
+        self._set_rows(*self._keep_rows(~np.isin(self._event_ids, event_ids)))
+        self._is_changed = True
+
+    def find_vector_ids(self, event_ids: list[int]) -> dict[int, list[str]]:
+        found = self._event_ids[np.isin(self._event_ids, event_ids)]
+        return {int(event_id): [str(event_id)] for event_id in found}
+
+    def count(self) -> int:
+        return len(self._event_ids)
+
+    def _mask(self, filter: Operation | Comparison) -> np.ndarray:
+        """Evaluate a filter of the query language on the metadata columns."""
+        if isinstance(filter, Comparison):
+            column = self._columns.get(filter.attribute)
+            if column is None:
+                return np.zeros(self.count(), dtype=bool)
+            compare = COMPARATORS[filter.comparator]
+            if column.dtype != object:
+                return compare(column, filter.value)
+            # the column has missing values, comparisons with them are false
+            present = column != None  # noqa: E711
+            mask = np.zeros(self.count(), dtype=bool)
+            mask[present] = compare(
+                column[present].astype(type(filter.value)), filter.value
+            )
+            return mask
+
+        masks = [self._mask(argument) for argument in filter.arguments]
+        if filter.operator == Operator.AND:
+            return np.logical_and.reduce(masks)
+        elif filter.operator == Operator.OR:
+            return np.logical_or.reduce(masks)
+        elif filter.operator == Operator.NOT:
+            return ~masks[0]
+        else:
+            raise Exception(f"Operator not supported: {filter.operator}.")
+
+    def query(
+        self,
+        embedding: list[float],
+        k: int,
+        filter: Operation | Comparison | None = None,
+    ) -> list[tuple[Document, float]]:
+        candidates = (
+            np.flatnonzero(self._mask(filter))
+            if filter is not None
+            else np.arange(self.count())
+        )
+        if len(candidates) == 0:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        # the product is memory bound: the rows of few candidates are gathered
+        if 2 * len(candidates) < self.count():
+            scores = self._matrix[candidates] @ query
+        else:
+            scores = (self._matrix @ query)[candidates]
+        if k < len(candidates):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            (
+                Document(
+                    page_content=self._texts[i], metadata=dict(self._metadatas[i])
+                ),
+                float(score),
+            )
+            for i, score in zip(candidates[top], scores[top])
+        ]
+
+    def flush(self) -> None:
+        if self.path is not None and self._is_changed:
+            self.save()
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "wb") as f:
+            np.savez(
+                f,
+                event_ids=self._event_ids,
+                matrix=self._matrix,
+                texts=np.array(self._texts, dtype=str),
+                metadatas=np.array([json.dumps(m) for m in self._metadatas], dtype=str),
+            )
+        self._is_changed = False
+
+    def load(self) -> None:
+        with np.load(self.path) as data:
+            self._set_rows(
+                event_ids=data["event_ids"],
+                matrix=data["matrix"],
+                texts=data["texts"].tolist(),
+                metadatas=[json.loads(m) for m in data["metadatas"]],
+            )
+        logging.info(f"Loaded {self.count()} vectors from {self.path}.")
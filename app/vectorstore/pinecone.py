@@ -0,0 +1,123 @@
+import logging
+
+import pinecone
+from langchain.chains.query_constructor.ir import Comparison, Operation
+from langchain.docstore.document import Document
+from langchain.retrievers.self_query.base import PineconeTranslator
+
+from app.constants import (
+    EMBEDDING_SIZE,
+    PINECONE_API_KEY,
+    PINECONE_ENV,
+    PINECONE_INDEX,
+    PINECONE_NAMESPACE,
+    VECTORSTORE_TEXT_KEY,
+    VECTORSTORE_UPSERT_CONCURRENCY,
+)
+from app.vectorstore.base import VectorBackend, VectorRecord
+
+PINECONE_BATCH_SIZE = 100  # vectors per upsert request
+PINECONE_MAX_TOP_K = 10000
+PINECONE_MAX_DELETE = 1000  # ids per delete request
+
+
+def get_pinecone_index() -> pinecone.Index:
+    pinecone.init(api_key=PINECONE_API_KEY, environment=PINECONE_ENV)
+    if PINECONE_INDEX not in pinecone.list_indexes():
+        logging.info(f"Creating Pinecone index at: {PINECONE_INDEX}")
+
+        pinecone.create_index(
+            name=PINECONE_INDEX,
+            metric="cosine",
+            dimension=EMBEDDING_SIZE,
+            source_collection=(
+                # retrieve from collections if present
+                PINECONE_INDEX
+                if PINECONE_INDEX in pinecone.list_collections()
+                else ""
+            ),
+        )
+    return pinecone.Index(PINECONE_INDEX, pool_threads=VECTORSTORE_UPSERT_CONCURRENCY)
+
+
+class PineconeBackend(VectorBackend):
+    """Vectors in a Pinecone index namespace, with the event text in the metadata."""
+
+    def __init__(self, index: pinecone.Index | None = None) -> None:
+        self.index = index if index is not None else get_pinecone_index()
+        self.translator = PineconeTranslator()
+
+    def upsert(self, records: list[VectorRecord]) -> None:
+        vectors = [
+            (r.vector_id, r.embedding, r.metadata | {VECTORSTORE_TEXT_KEY: r.text})
+            for r in records
+        ]
+        # the requests are sent in parallel by the threads of the index
+        async_results = [
+            self.index.upsert(
+                vectors=vectors[i : i + PINECONE_BATCH_SIZE],
+                namespace=PINECONE_NAMESPACE,
+                async_req=True,
+            )
+            for i in range(0, len(vectors), PINECONE_BATCH_SIZE)
+        ]
+        for async_result in async_results:
+            async_result.get()
+
+    def delete(self, vector_ids: list[str]) -> None:
+        for i in range(0, len(vector_ids), PINECONE_MAX_DELETE):
+            batch_ids = vector_ids[i : i + PINECONE_MAX_DELETE]
+            delete_response = self.index.delete(
+                ids=batch_ids, namespace=PINECONE_NAMESPACE
+            )
+            if delete_response:
+                raise Exception(
+                    f"Pinecone failed to delete vectors (ids={batch_ids}). "
+                    + f"Response: {delete_response}"
+                )
+
+    def find_vector_ids(self, event_ids: list[int]) -> dict[int, list[str]]:
+        """Find the vectors by the event id in their metadata, with fake queries."""
+        vector_ids = {}
+        for i in range(0, len(event_ids), PINECONE_MAX_TOP_K):
+            matches = self.index.query(
+                vector=[0] * EMBEDDING_SIZE,
+                top_k=PINECONE_MAX_TOP_K,
+                namespace=PINECONE_NAMESPACE,
+                include_metadata=True,
+                include_values=False,
+                filter={"id": {"$in": event_ids[i : i + PINECONE_MAX_TOP_K]}},
+            )["matches"]
+            for match in matches:
+                event_id = int(match.metadata["id"])  # numbers are returned as floats
+                vector_ids.setdefault(event_id, []).append(match.id)
+        return vector_ids
+
+    def query(
+        self,
+        embedding: list[float],
+        k: int,
+        filter: Operation | Comparison | None = None,
+    ) -> list[tuple[Document, float]]:
+        matches = self.index.query(
+            vector=embedding,
+            top_k=k,
+            namespace=PINECONE_NAMESPACE,
+            include_metadata=True,
+            include_values=False,
+            filter=filter.accept(self.translator) if filter is not None else None,
+        )["matches"]
+
+        docs = []
+        for match in matches:
+            metadata = dict(match.metadata)
+            text = metadata.pop(VECTORSTORE_TEXT_KEY)
+            metadata["id"] = int(metadata["id"])  # numbers are returned as floats
+            docs.append((Document(page_content=text, metadata=metadata), match.score))
+        return docs
+
+    def count(self) -> int:
+        namespaces = self.index.describe_index_stats()["namespaces"]
+        if PINECONE_NAMESPACE not in namespaces:
+            return 0
+        return namespaces[PINECONE_NAMESPACE]["vector_count"]
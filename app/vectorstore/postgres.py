@@ -0,0 +1,137 @@
+from langchain.chains.query_constructor.ir import (
+    Comparison,
+    Operation,
+    Operator,
+    StructuredQuery,
+    Visitor,
+)
+from langchain.docstore.document import Document
+from sqlalchemy import and_, func, not_, or_, select, text, true, update
+from sqlalchemy.orm import Session
+
+from app.constants import VECTORSTORE_HNSW_EF_SEARCH
+from app.db.models import EventORM
+from app.db.schemas import EventInVectorstore
+from app.utils.datetime_utils import timestamp_to_date
+from app.vectorstore.base import COMPARATORS, VectorBackend, VectorRecord
+
+
+class PostgresTranslator(Visitor):
+    """Translate filters of the query language to predicates on the events."""
+
+    allowed_comparators = list(COMPARATORS)
+    allowed_operators = [Operator.AND, Operator.OR, Operator.NOT]
+
+    def visit_operation(self, operation: Operation):
+        self._validate_func(operation.operator)
+        arguments = [argument.accept(self) for argument in operation.arguments]
+        if operation.operator == Operator.AND:
+            return and_(*arguments)
+        elif operation.operator == Operator.OR:
+            return or_(*arguments)
+        else:
+            return not_(arguments[0])
+
+    def visit_comparison(self, comparison: Comparison):
+        self._validate_func(comparison.comparator)
+        column = getattr(EventORM, comparison.attribute)
+        value = comparison.value
+        if comparison.attribute in ["start_date", "end_date"]:
+            # dates are stored as days from the origin in the vector metadata
+            value = timestamp_to_date(value)
+        return COMPARATORS[comparison.comparator](column, value)
+
+    def visit_structured_query(self, structured_query: StructuredQuery):
+        if structured_query.filter is None:
+            return true()
+        return structured_query.filter.accept(self)
+
+
+class PostgresBackend(VectorBackend):
+    """
+    Vectors in the embedding column of the events, with pgvector.
+    Filters are predicates on the event columns, so the metadata of the
+    records is not stored: it is the event itself.
+    """
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+        self.translator = PostgresTranslator()
+
+    def upsert(self, records: list[VectorRecord]) -> None:
+        self.db.execute(
+            update(EventORM),
+            [{"id": r.event_id, "embedding": r.embedding} for r in records],
+        )
+        self.db.commit()
+
+    def delete(self, vector_ids: list[str]) -> None:
+        # vectors are keyed by event id, other ids can't be in the store
+        event_ids = [int(v) for v in vector_ids if v.isdigit()]
+        self.db.execute(
+            update(EventORM)
+            .where(EventORM.id.in_(event_ids))
+            .values(embedding=None)
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+
+    def find_vector_ids(self, event_ids: list[int]) -> dict[int, list[str]]:
+        found = self.db.scalars(
+            select(EventORM.id).where(
+                EventORM.id.in_(event_ids), EventORM.embedding.is_not(None)
+            )
+        )
+        return {event_id: [str(event_id)] for event_id in found}
+
+    def query_events(
+        self,
+        db: Session,
+        embedding: list[float],
+        k: int,
+        filter: Operation | Comparison | None = None,
+    ) -> list[tuple[EventORM, float]]:
+        """
+        Get the k events most similar to an embedding, best first, with a
+        single query that returns the event rows along with their scores.
+        """
+        # the hnsw index scan returns ef_search candidates before the filters
+        # are applied, so it is raised for the filters to leave k of them
+        db.execute(
+            text(f"SET LOCAL hnsw.ef_search = {max(VECTORSTORE_HNSW_EF_SEARCH, k)}")
+        )
+        distance = EventORM.embedding.cosine_distance(embedding)
+        rows = db.execute(
+            select(EventORM, distance.label("distance"))
+            .where(
+                EventORM.embedding.is_not(None),
+                filter.accept(self.translator) if filter is not None else True,
+            )
+            .order_by(distance)
+            .limit(k)
+        ).all()
+        return [(row.EventORM, 1 - row.distance) for row in rows]
+
+    def query(
+        self,
+        embedding: list[float],
+        k: int,
+        filter: Operation | Comparison | None = None,
+    ) -> list[tuple[Document, float]]:
+        return [
+            (
+                Document(
+                    page_content=db_event.description,
+                    metadata=EventInVectorstore.from_event_orm(db_event).__dict__,
+                ),
+                score,
+            )
+            for db_event, score in self.query_events(
+                self.db, embedding, k, filter=filter
+            )
+        ]
+
+    def count(self) -> int:
+        return self.db.scalar(
+            select(func.count(EventORM.id)).where(EventORM.embedding.is_not(None))
+        )
@@ -0,0 +1,59 @@
+"""
+Benchmark the sustained throughput of the broadcaster against a local stand-in
+of the WhatsApp Cloud API.
+Run with: python -m benchmarks.broadcast_throughput
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.broadcaster.broadcaster import Broadcaster, TokenBucket
+from benchmarks.whatsapp_stub import run_stub_server
+
+
+async def run_benchmark(
+    broadcaster: Broadcaster, messages: int, batch_size: int
+) -> float:
+    token_bucket = TokenBucket(rate=broadcaster.rate)
+    phone_numbers = [f"39{i:010d}" for i in range(messages)]
+
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=broadcaster.concurrency) as executor:
+        for i in range(0, messages, batch_size):
+            async for _, status_code in broadcaster.send_batch(
+                messages=list(enumerate(phone_numbers[i : i + batch_size], i)),
+                template_name="hello_world",
+                language_code="en_US",
+                token_bucket=token_bucket,
+                executor=executor,
+            ):
+                assert status_code == 200
+    return messages / (time.monotonic() - started_at)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--rates", type=float, nargs="+", default=[20, 80, 250])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32])
+    args = parser.parse_args()
+
+    server = run_stub_server(latency=args.latency, throttle_rate=args.throttle_rate)
+    for rate in args.rates:
+        for concurrency in args.concurrency:
+            broadcaster = Broadcaster(
+                db=None, wa_number_id="benchmark", rate=rate, concurrency=concurrency
+            )
+            broadcaster.wa_client.url = server.url + "benchmark"
+            throughput = asyncio.run(
+                run_benchmark(broadcaster, args.messages, args.batch_size)
+            )
+            print(
+                f"rate limit: {rate:>6.0f}/s | concurrency: {concurrency:>3} | "
+                + f"throughput: {throughput:>6.1f} messages/s"
+            )
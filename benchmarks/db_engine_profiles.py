@@ -0,0 +1,65 @@
+"""
+Benchmark the pooling profiles of the db engine under concurrent requests.
+Each request opens a session, runs a short query and closes it, as the webhook does.
+Run with: python -m benchmarks.db_engine_profiles
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app.constants import SQLALCHEMY_DATABASE_URL
+from app.db.db import EngineProfile, create_db_engine
+
+
+def run_benchmark(
+    url: str, profile: EngineProfile, concurrency: int, requests: int
+) -> dict[str, int | float]:
+    engine, metrics = create_db_engine(url, profile)
+    SessionBenchmark = sessionmaker(bind=engine)
+
+    def request(_) -> None:
+        with SessionBenchmark() as db:
+            db.execute(text("SELECT pg_sleep(0.005)"))
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(request, range(requests)))
+    elapsed = time.perf_counter() - started_at
+
+    stats = metrics.snapshot()
+    stats["requests_per_second"] = requests / elapsed
+    engine.dispose()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument(
+        "--pgbouncer-url",
+        default=SQLALCHEMY_DATABASE_URL,
+        help="URL of the db through PgBouncer, Postgres itself by default.",
+    )
+    args = parser.parse_args()
+
+    for concurrency in args.concurrency:
+        for profile in EngineProfile:
+            url = (
+                args.pgbouncer_url
+                if profile == EngineProfile.pgbouncer
+                else SQLALCHEMY_DATABASE_URL
+            )
+            stats = run_benchmark(url, profile, concurrency, args.requests)
+            print(
+                f"{profile.value:>9} | concurrency: {concurrency:>3} | "
+                + f"{stats['requests_per_second']:>7.1f} requests/s | "
+                + f"connects: {stats['connects']:>4} "
+                + f"(avg {stats['avg_connect_ms']:.2f} ms) | "
+                + f"checkout wait: avg {stats['avg_checkout_wait_ms']:.2f} ms, "
+                + f"max {stats['max_checkout_wait_ms']:.2f} ms"
+            )
@@ -0,0 +1,127 @@
+"""
+Benchmark the search_events path of the push agent, from the query embedding
+to the event rows, over a synthetic catalog loaded in a transaction that is
+rolled back:
+- postgres: a single query ranks, filters and returns the events (pgvector);
+- two-system: the vectorstore is queried, then the hits are fetched from the
+  db with one query (bulk) or one query per hit (per-hit), with the local
+  backend standing for pinecone unless --pinecone is set (it then has to hold
+  the events of the db, e.g. on a copy of production).
+The top-k of the two paths are compared, the local search being exact.
+Run with: python -m benchmarks.event_search
+"""
+
+import argparse
+import statistics
+import time
+from typing import Callable
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.constants import EMBEDDING_SIZE, N_EVENTS_CONTEXT
+from app.db.models import EventORM
+from app.db.services import get_event_by_id, get_events_by_ids
+from app.vectorstore import VectorBackend
+from app.vectorstore.local import LocalBackend
+from app.vectorstore.pinecone import PineconeBackend
+from app.vectorstore.postgres import PostgresBackend
+from benchmarks.vector_search import get_filters, get_records, report, seed_events
+
+
+def search_two_system(
+    db: Session,
+    backend: VectorBackend,
+    embedding: list[float],
+    filter,
+    bulk: bool = True,
+) -> list[EventORM]:
+    docs = backend.query(embedding, k=N_EVENTS_CONTEXT, filter=filter)
+    ids = [doc.metadata["id"] for doc, _ in docs]
+    if bulk:
+        return get_events_by_ids(db=db, ids=ids)
+    return [get_event_by_id(db=db, id=id) for id in ids]
+
+
+def run_searches(
+    search: Callable[[list[float], object], list[EventORM]],
+    query_vectors: np.ndarray,
+    filters: list,
+) -> tuple[list[float], list[list[int]]]:
+    """Latencies of the searches in milliseconds, and the ids of the events."""
+    latencies = []
+    results = []
+    for i, query_vector in enumerate(query_vectors):
+        started_at = time.perf_counter()
+        db_events = search(query_vector.tolist(), filters[i % len(filters)])
+        latencies.append(1000 * (time.perf_counter() - started_at))
+        results.append([db_event.id for db_event in db_events])
+    return latencies, results
+
+
+if __name__ == "__main__":
+    from app.db.db import engine
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--pinecone", action="store_true")
+    args = parser.parse_args()
+
+    filters = get_filters()
+    query_vectors = np.random.default_rng(1).standard_normal(
+        (args.queries, EMBEDDING_SIZE)
+    )
+    print(f"{args.events} events, {args.queries} queries, k={N_EVENTS_CONTEXT}")
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        records = seed_events(db, get_records(args.events))
+        postgres_backend = PostgresBackend(db=db)
+        postgres_backend.upsert(records)
+        connection.exec_driver_sql("ANALYZE events")
+
+        local_backend = LocalBackend()
+        local_backend.upsert(records)
+        vector_backend = PineconeBackend() if args.pinecone else local_backend
+
+        # the events are fetched from the db on each search, as in the agent
+        def search_postgres(embedding: list[float], filter) -> list[EventORM]:
+            db.expunge_all()
+            return [
+                db_event
+                for db_event, _ in postgres_backend.query_events(
+                    db, embedding, k=N_EVENTS_CONTEXT, filter=filter
+                )
+            ]
+
+        def search_per_hit(embedding: list[float], filter) -> list[EventORM]:
+            db.expunge_all()
+            return search_two_system(db, vector_backend, embedding, filter, bulk=False)
+
+        def search_bulk(embedding: list[float], filter) -> list[EventORM]:
+            db.expunge_all()
+            return search_two_system(db, vector_backend, embedding, filter)
+
+        latencies, two_system_results = run_searches(
+            search_per_hit, query_vectors, filters
+        )
+        report("per-hit", latencies)
+        latencies, _ = run_searches(search_bulk, query_vectors, filters)
+        report("bulk", latencies)
+        latencies, results = run_searches(search_postgres, query_vectors, filters)
+        report(
+            "postgres",
+            latencies,
+            overlap=statistics.mean(
+                len(set(a) & set(b)) / max(len(a), 1)
+                for a, b in zip(two_system_results, results)
+            ),
+            reference="two-system",
+        )
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
@@ -0,0 +1,460 @@
+"""
+Record the EXPLAIN ANALYZE timings of the queries of the db services and of the
+dashboard on millions of synthetic rows, to catch query plan regressions.
+Rows are loaded in a transaction that is rolled back at the end, the services
+commit to savepoints of it.
+Run with: python -m benchmarks.query_plans [--output plans.json] [--compare plans.json]
+"""
+
+import argparse
+import datetime
+import json
+import time
+from typing import Callable
+
+from sqlalchemy import Connection, event, text
+from sqlalchemy.orm import Session
+
+from app.constants import (
+    CONVERSATION_HOURS_WINDOW,
+    CONVERSATION_MAX_MESSAGES,
+    LIMIT_MAX_USERS,
+    N_EVENTS_CONTEXT,
+)
+from app.db.db import engine
+from app.db.enums import AnswerType
+from app.db.models import BusinessConversationORM, ConversationORM, UserORM
+from app.db.schemas import Click, ConversationTemp, Job
+from app.db.services import (
+    admit_user,
+    claim_temp_conversations,
+    claim_user_jobs,
+    get_business,
+    get_conversation_by_waid,
+    get_conversation_event_ids,
+    get_conversations_by_ids,
+    get_event,
+    get_event_by_id,
+    get_events_by_ids,
+    get_events_recommendation_stats,
+    get_expired_vectorized_events,
+    get_pending_broadcast_messages,
+    get_user,
+    get_user_answers_count,
+    get_user_by_id,
+    get_user_conversations,
+    get_user_count,
+    load_user_context,
+    register_click,
+    register_jobs,
+)
+
+# rows loaded at scale 1
+ROWS = {
+    "users": 100_000,
+    "businesses": 10_000,
+    "conversations": 2_000_000,
+    "business_conversations": 200_000,
+    "events": 100_000,
+    "clicks": 500_000,
+    "jobs": 200_000,
+    "broadcast_messages": 200_000,
+}
+
+SEED_SQL = """
+INSERT INTO users (phone_number, is_blocked, is_admin, registered_at)
+SELECT 'bench' || i, i % 50 = 0, false, now() - random() * interval '365 days'
+FROM generate_series(1, :users) i;
+
+INSERT INTO businesses (phone_number, registered_at)
+SELECT 'bench' || i, now() - random() * interval '365 days'
+FROM generate_series(1, :businesses) i;
+
+INSERT INTO conversations (
+    user_id, wa_id, from_message, to_message, answer_type, used_event_ids,
+    received_at, registered_at
+)
+SELECT
+    u.first_id + i % :users, 'wamid.bench.' || i, 'Cosa faccio stasera?',
+    'Ecco qualche idea.',
+    (ARRAY['ai', 'blocked', 'conversational', 'template', 'unanswered'])[1 + i % 5]
+        ::answertype,
+    '[]', t.registered_at, t.registered_at
+FROM generate_series(1, :conversations) i,
+    (SELECT min(id) AS first_id FROM users WHERE phone_number LIKE 'bench%') u,
+    LATERAL (
+        SELECT now() - random() * interval '90 days' + i * interval '0' AS registered_at
+    ) t;
+
+INSERT INTO business_conversations (
+    user_id, wa_id, from_message, to_message, answer_type, used_event_ids,
+    received_at, registered_at
+)
+SELECT
+    b.first_id + i % :businesses, 'wamid.bench.business.' || i, 'Nuovo evento',
+    'Evento registrato.', 'conversational', '[]', t.registered_at, t.registered_at
+FROM generate_series(1, :business_conversations) i,
+    (SELECT min(id) AS first_id FROM businesses WHERE phone_number LIKE 'bench%') b,
+    LATERAL (
+        SELECT now() - random() * interval '90 days' + i * interval '0' AS registered_at
+    ) t;
+
+INSERT INTO user_answer_counters (
+    user_id, answer_type, day, count, first_registered_at
+)
+SELECT user_id, answer_type, registered_at::date, count(*), min(registered_at)
+FROM conversations WHERE wa_id LIKE 'wamid.bench.%'
+GROUP BY user_id, answer_type, registered_at::date;
+
+INSERT INTO events (
+    description, is_vectorized, source, registered_at, city, start_date, end_date,
+    is_closed_mon, is_closed_tue, is_closed_wed, is_closed_thu, is_closed_fri,
+    is_closed_sat, is_closed_sun, is_during_day, is_during_night, name, location,
+    url, price_level
+)
+SELECT
+    'Evento ' || i, true, 'bench' || i % 20, now(), 'Torino',
+    current_date + i % 30, current_date + i % 30 + 7,
+    false, false, false, false, false, false, false, true, false,
+    'Evento ' || i, 'Torino', 'https://example.com/' || i, 'free'
+FROM generate_series(1, :events) i;
+
+INSERT INTO conversation_events (conversation_id, position, event_id)
+SELECT c.id, p, e.first_id + (c.id * 3 + p) % :events
+FROM conversations c, generate_series(1, 3) p,
+    (SELECT min(id) AS first_id FROM events WHERE source LIKE 'bench%') e
+WHERE c.wa_id LIKE 'wamid.bench.%' AND c.answer_type = 'ai';
+
+INSERT INTO clicks (event_id, user_id, registered_at)
+SELECT e.first_id + i % :events, u.first_id + i % :users,
+    now() - random() * interval '90 days'
+FROM generate_series(1, :clicks) i,
+    (SELECT min(id) AS first_id FROM users WHERE phone_number LIKE 'bench%') u,
+    (SELECT min(id) AS first_id FROM events WHERE source LIKE 'bench%') e;
+
+INSERT INTO jobs (
+    status, attempts, registered_at, available_at, finished_at, wa_number_id,
+    conversation_id, wa_id, phone_number, body, timestamp
+)
+SELECT
+    CASE WHEN i % 1000 = 0 THEN 'pending' ELSE 'done' END::jobstatus, 1,
+    now() - interval '1 hour', now() - interval '1 hour', now(), 'bench', i,
+    'wamid.bench.' || i, 'bench' || i % :users, 'Ciao', 0
+FROM generate_series(1, :jobs) i;
+
+INSERT INTO broadcasts (wa_number_id, template_name, language_code, registered_at)
+VALUES ('bench', 'bench', 'it', now());
+
+INSERT INTO broadcast_messages (broadcast_id, phone_number, status, attempts)
+SELECT (SELECT max(id) FROM broadcasts), 'bench' || i,
+    CASE WHEN i % 2 = 0 THEN 'sent' ELSE 'pending' END::broadcaststatus,
+    CASE WHEN i % 2 = 0 THEN 1 ELSE 0 END
+FROM generate_series(1, :broadcast_messages) i;
+"""
+
+ANALYZED_TABLES = [
+    "users",
+    "businesses",
+    "conversations",
+    "business_conversations",
+    "user_answer_counters",
+    "events",
+    "conversation_events",
+    "clicks",
+    "jobs",
+    "broadcast_messages",
+]
+
+
+def seed(connection: Connection, scale: float) -> dict:
+    rows = {name: max(int(count * scale), 1) for name, count in ROWS.items()}
+    for statement in SEED_SQL.split(";"):
+        if statement.strip():
+            connection.execute(text(statement), rows)
+    for table_name in ANALYZED_TABLES:
+        connection.exec_driver_sql(f"ANALYZE {table_name}")
+
+    # the most active user, business and event to look up
+    user_id, phone_number = connection.execute(
+        text(
+            """
+            SELECT u.id, u.phone_number FROM users u
+            WHERE u.phone_number LIKE 'bench%' AND NOT u.is_blocked
+            ORDER BY u.id LIMIT 1
+            """
+        )
+    ).one()
+    return {
+        "user_id": user_id,
+        "phone_number": phone_number,
+        "business_id": connection.execute(
+            text("SELECT min(id) FROM businesses WHERE phone_number LIKE 'bench%'")
+        ).scalar(),
+        "business_phone_number": "bench1",
+        "event": connection.execute(
+            text(
+                """
+                SELECT id, source, url, start_date, end_date FROM events
+                WHERE source LIKE 'bench%' ORDER BY id DESC LIMIT 1
+                """
+            )
+        ).one(),
+        "event_ids": connection.execute(
+            text(
+                f"""
+                SELECT id FROM events WHERE source LIKE 'bench%'
+                ORDER BY random() LIMIT {N_EVENTS_CONTEXT}
+                """
+            )
+        )
+        .scalars()
+        .all(),
+        "conversation_ids": connection.execute(
+            text(
+                """
+                SELECT id FROM conversations WHERE user_id = :user_id
+                ORDER BY id DESC LIMIT 10
+                """
+            ),
+            {"user_id": user_id},
+        )
+        .scalars()
+        .all(),
+        "broadcast_id": connection.execute(
+            text("SELECT max(id) FROM broadcasts")
+        ).scalar(),
+    }
+
+
+def get_scenarios(keys: dict) -> dict[str, Callable[[Session], object]]:
+    now = datetime.datetime.utcnow()
+    week_ago = now - datetime.timedelta(days=7)
+    conversations_from = now - datetime.timedelta(hours=CONVERSATION_HOURS_WINDOW)
+    event = keys["event"]
+
+    scenarios = {
+        "get_user": lambda db: get_user(db, phone_number=keys["phone_number"]),
+        "get_user_by_id": lambda db: get_user_by_id(
+            db, id=keys["user_id"], orm=UserORM
+        ),
+        "get_user_count": lambda db: get_user_count(db),
+        "get_user_answers_count": lambda db: get_user_answers_count(
+            db,
+            user_id=keys["user_id"],
+            answer_type=AnswerType.ai,
+            datetime_limit=week_ago,
+        ),
+        "load_user_context": lambda db: load_user_context(
+            db,
+            phone_number=keys["phone_number"],
+            answer_types=[AnswerType.ai, AnswerType.blocked],
+            answers_from_datetime=week_ago,
+            conversations_from_datetime=conversations_from,
+            max_messages=CONVERSATION_MAX_MESSAGES,
+        ),
+        "admit_user": lambda db: admit_user(db, limit=LIMIT_MAX_USERS),
+        "get_business": lambda db: get_business(
+            db, phone_number=keys["business_phone_number"]
+        ),
+        "get_conversation_by_waid": lambda db: get_conversation_by_waid(
+            db, wa_id="wamid.bench.1", orm=ConversationORM
+        ),
+        "get_conversations_by_ids": lambda db: get_conversations_by_ids(
+            db, ids=keys["conversation_ids"], orm=ConversationORM
+        ),
+        "get_user_conversations": lambda db: get_user_conversations(
+            db,
+            user_id=keys["user_id"],
+            from_datetime=conversations_from,
+            orm=ConversationORM,
+            max_messages=CONVERSATION_MAX_MESSAGES,
+        ),
+        "get_user_conversations (business)": lambda db: get_user_conversations(
+            db,
+            user_id=keys["business_id"],
+            from_datetime=conversations_from,
+            orm=BusinessConversationORM,
+            max_messages=CONVERSATION_MAX_MESSAGES,
+        ),
+        "claim_temp_conversations": lambda db: claim_temp_conversations(
+            db,
+            conversations_temp_in=[
+                ConversationTemp(
+                    from_message="Ciao",
+                    wa_id=f"wamid.bench.claim.{i}",
+                    received_at=now,
+                )
+                for i in range(10)
+            ],
+            orm=ConversationORM,
+        ),
+        "get_event_by_id": lambda db: get_event_by_id(db, id=event.id),
+        "get_events_by_ids": lambda db: get_events_by_ids(db, ids=keys["event_ids"]),
+        "get_expired_vectorized_events": lambda db: (
+            get_expired_vectorized_events(db, today=now.date())
+        ),
+        "get_event": lambda db: get_event(
+            db,
+            source=event.source,
+            url=event.url,
+            start_date=event.start_date,
+            end_date=event.end_date,
+        ),
+        "get_conversation_event_ids": lambda db: get_conversation_event_ids(
+            db, conversation_id=keys["conversation_ids"][0], orm=ConversationORM
+        ),
+        "get_events_recommendation_stats": lambda db: (
+            get_events_recommendation_stats(
+                db,
+                from_datetime=week_ago,
+                to_datetime=week_ago + datetime.timedelta(days=1),
+            )
+        ),
+        "register_click": lambda db: register_click(
+            db, click_in=Click(event_id=event.id, user_id=keys["user_id"])
+        ),
+        "register_jobs": lambda db: register_jobs(
+            db,
+            jobs_in=[
+                Job(
+                    wa_number_id="bench",
+                    conversation_id=i,
+                    wa_id=f"wamid.bench.job.{i}",
+                    phone_number=keys["phone_number"],
+                    body="Ciao",
+                    timestamp=0,
+                )
+                for i in range(10)
+            ],
+        ),
+        "claim_user_jobs": lambda db: claim_user_jobs(db, limit=10),
+        "get_pending_broadcast_messages": lambda db: get_pending_broadcast_messages(
+            db, broadcast_id=keys["broadcast_id"], after_id=0, limit=500
+        ),
+    }
+
+    try:
+        from interface.utils.dashboard import get_dashboard_stats
+
+        scenarios["get_dashboard_stats"] = lambda db: get_dashboard_stats(
+            db,
+            start_date=(now - datetime.timedelta(days=7)).date(),
+            end_date=now.date(),
+        )
+    except ImportError:
+        print("Skipping the dashboard: the interface requirements are not installed.")
+
+    return scenarios
+
+
+def _seq_scans(plan: dict) -> list[str]:
+    """Tables read with a sequential scan in a plan."""
+    seq_scans = []
+    if plan["Node Type"] == "Seq Scan":
+        seq_scans.append(plan["Relation Name"])
+    for subplan in plan.get("Plans", []):
+        seq_scans += _seq_scans(subplan)
+    return seq_scans
+
+
+def explain_scenario(
+    connection: Connection, db: Session, run: Callable[[Session], object]
+) -> list[dict]:
+    """Run a scenario, then EXPLAIN ANALYZE each statement it has executed."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        run(db)
+        db.flush()
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    plans = []
+    for statement, parameters in statements:
+        if statement.startswith(("SAVEPOINT", "RELEASE", "ROLLBACK")):
+            continue
+        connection.exec_driver_sql("SAVEPOINT explain")
+        try:
+            [[result]] = connection.exec_driver_sql(
+                f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters
+            ).all()
+        finally:
+            connection.exec_driver_sql("ROLLBACK TO SAVEPOINT explain")
+        plans.append(
+            {
+                "statement": " ".join(statement.split())[:80],
+                "planning_ms": result[0]["Planning Time"],
+                "execution_ms": result[0]["Execution Time"],
+                "seq_scans": sorted(set(_seq_scans(result[0]["Plan"]))),
+            }
+        )
+    return plans
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of the results against a baseline: slower plans or new scans."""
+    regressions = []
+    for name, plans in results.items():
+        for i, plan in enumerate(plans):
+            try:
+                baseline_plan = baseline[name][i]
+            except (KeyError, IndexError):
+                continue
+            if plan["execution_ms"] > max(tolerance * baseline_plan["execution_ms"], 1):
+                regressions.append(
+                    f"{name} [{i}]: {baseline_plan['execution_ms']:.2f} ms -> "
+                    + f"{plan['execution_ms']:.2f} ms"
+                )
+            new_seq_scans = set(plan["seq_scans"]) - set(baseline_plan["seq_scans"])
+            if len(new_seq_scans) > 0:
+                regressions.append(f"{name} [{i}]: new seq scan on {new_seq_scans}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--output", help="File to save the plans to, as JSON.")
+    parser.add_argument("--compare", help="File of plans to compare against.")
+    parser.add_argument(
+        "--tolerance", type=float, default=2.0, help="Slowdown flagged as regression."
+    )
+    args = parser.parse_args()
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    try:
+        started_at = time.perf_counter()
+        keys = seed(connection, args.scale)
+        print(f"Loaded synthetic rows in {time.perf_counter() - started_at:.1f} s.")
+
+        db = Session(bind=connection, join_transaction_mode="create_savepoint")
+        results = {}
+        for name, run in get_scenarios(keys).items():
+            results[name] = explain_scenario(connection, db, run)
+            for plan in results[name]:
+                print(
+                    f"{name:>34} | {plan['execution_ms']:>9.3f} ms "
+                    + f"(planning {plan['planning_ms']:.3f} ms) | "
+                    + f"seq scans: {', '.join(plan['seq_scans']) or '-'}"
+                )
+        db.close()
+    finally:
+        transaction.rollback()
+        connection.close()
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions) > 0:
+            raise SystemExit(1)
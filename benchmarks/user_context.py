@@ -0,0 +1,131 @@
+"""
+Benchmark the loading of the context of a returning user in the push journey:
+the previous path with four sequential queries against the single query of
+load_user_context. Data is seeded in a transaction that is rolled back.
+Run with: python -m benchmarks.user_context
+"""
+
+import argparse
+import datetime
+import random
+import time
+
+from sqlalchemy import event
+
+from app.constants import CONVERSATION_HOURS_WINDOW, CONVERSATION_MAX_MESSAGES
+from app.db.db import SessionLocal, engine
+from app.db.enums import AnswerType
+from app.db.models import ConversationORM, UserORM
+from app.db.services import (
+    get_user,
+    get_user_answers_count,
+    get_user_conversations,
+    increment_user_answer_counter,
+    load_user_context,
+)
+
+ANSWER_TYPES = [AnswerType.ai, AnswerType.blocked]
+
+
+def seed_user(db, conversations: int) -> str:
+    now = datetime.datetime.utcnow()
+    phone_number = f"00{random.randint(10**9, 10**10 - 1)}"
+    db_user = UserORM(
+        phone_number=phone_number, is_blocked=False, is_admin=False, registered_at=now
+    )
+    db.add(db_user)
+    db.flush()
+    db_conversations = [
+        ConversationORM(
+            user_id=db_user.id,
+            from_message="Cosa faccio stasera?",
+            to_message="Ecco qualche idea.",
+            answer_type=random.choice(list(AnswerType)),
+            used_event_ids="[]",
+            wa_id=f"wamid.benchmark.{phone_number}.{i}",
+            received_at=now - datetime.timedelta(hours=i),
+            registered_at=now - datetime.timedelta(hours=i),
+        )
+        for i in range(conversations)
+    ]
+    db.add_all(db_conversations)
+    for db_conversation in db_conversations:
+        if db_conversation.answer_type != AnswerType.merged:
+            increment_user_answer_counter(
+                db=db,
+                user_id=db_user.id,
+                answer_type=db_conversation.answer_type,
+                registered_at=db_conversation.registered_at,
+            )
+    db.flush()
+    return phone_number
+
+
+def load_with_queries(db, phone_number: str) -> None:
+    db_user = get_user(db, phone_number=phone_number)
+    for answer_type in ANSWER_TYPES:
+        get_user_answers_count(
+            db=db,
+            user_id=db_user.id,
+            answer_type=answer_type,
+            datetime_limit=datetime.datetime.utcnow() - datetime.timedelta(days=7),
+        )
+    get_user_conversations(
+        db=db,
+        user_id=db_user.id,
+        from_datetime=(
+            datetime.datetime.now()
+            - datetime.timedelta(hours=CONVERSATION_HOURS_WINDOW)
+        ),
+        orm=ConversationORM,
+        max_messages=CONVERSATION_MAX_MESSAGES,
+    )
+
+
+def load_with_context(db, phone_number: str) -> None:
+    load_user_context(
+        db=db,
+        phone_number=phone_number,
+        answer_types=ANSWER_TYPES,
+        answers_from_datetime=datetime.datetime.utcnow() - datetime.timedelta(days=7),
+        conversations_from_datetime=(
+            datetime.datetime.now()
+            - datetime.timedelta(hours=CONVERSATION_HOURS_WINDOW)
+        ),
+        max_messages=CONVERSATION_MAX_MESSAGES,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=500)
+    args = parser.parse_args()
+
+    statements = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statements(*args):
+        global statements
+        statements += 1
+
+    db = SessionLocal()
+    try:
+        phone_number = seed_user(db, args.conversations)
+        for name, load in [
+            ("4 queries", load_with_queries),
+            ("load_user_context", load_with_context),
+        ]:
+            statements = 0
+            started_at = time.perf_counter()
+            for _ in range(args.iterations):
+                load(db, phone_number)
+                db.expire_all()
+            elapsed = time.perf_counter() - started_at
+            print(
+                f"{name:>17} | {1000 * elapsed / args.iterations:.2f} ms per user | "
+                + f"{statements / args.iterations:.0f} round trips per user"
+            )
+    finally:
+        db.rollback()
+        db.close()
@@ -0,0 +1,201 @@
+"""
+Benchmark the filtered similarity search of the push agent on the vectorstore
+backends, over a synthetic catalog with random embeddings.
+The local and postgres backends are loaded with the same catalog, the
+postgres one in a transaction that is rolled back; their top-k are compared.
+The pinecone backend is queried as it is (add pinecone to --backends, it
+requires the Pinecone settings): only its latency is meaningful.
+Run with: python -m benchmarks.vector_search
+"""
+
+import argparse
+import datetime
+import statistics
+import time
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.answerer.push.agent import get_events_filter
+from app.answerer.schemas import DayTimeEnum
+from app.constants import EMBEDDING_SIZE, N_EVENTS_CONTEXT
+from app.db.enums import CityEnum
+from app.db.models import EventORM
+from app.utils.datetime_utils import date_to_timestamp, timestamp_to_date
+from app.vectorstore import VectorBackend, VectorRecord
+from app.vectorstore.local import LocalBackend
+from app.vectorstore.pinecone import PineconeBackend
+from app.vectorstore.postgres import PostgresBackend
+
+CLOSED_DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def get_records(events: int, seed: int = 0) -> list[VectorRecord]:
+    rng = np.random.default_rng(seed)
+    today = datetime.date.today()
+    embeddings = rng.standard_normal((events, EMBEDDING_SIZE), dtype=np.float32)
+    records = []
+    for i in range(events):
+        start_date = today + datetime.timedelta(days=int(rng.integers(-30, 60)))
+        end_date = start_date + datetime.timedelta(days=int(rng.integers(0, 30)))
+        records.append(
+            VectorRecord(
+                event_id=i,
+                embedding=embeddings[i].tolist(),
+                text=f"Evento {i}",
+                metadata={
+                    "id": i,
+                    "source": "benchmark",
+                    "city": CityEnum.Torino.value,
+                    "start_date": date_to_timestamp(start_date),
+                    "end_date": date_to_timestamp(end_date),
+                    **{f"is_closed_{d}": bool(rng.random() < 0.1) for d in CLOSED_DAYS},
+                    "is_during_day": bool(rng.random() < 0.6),
+                    "is_during_night": bool(rng.random() < 0.5),
+                },
+            )
+        )
+    return records
+
+
+def seed_events(db: Session, records: list[VectorRecord]) -> list[VectorRecord]:
+    """Insert the events of the records, which are returned with the db ids."""
+    db_events = [
+        EventORM(
+            description=r.text,
+            is_vectorized=True,
+            source="benchmark",
+            registered_at=datetime.datetime.utcnow(),
+            city=CityEnum.Torino,
+            start_date=timestamp_to_date(r.metadata["start_date"]),
+            end_date=timestamp_to_date(r.metadata["end_date"]),
+            is_closed_mon=r.metadata["is_closed_mon"],
+            is_closed_tue=r.metadata["is_closed_tue"],
+            is_closed_wed=r.metadata["is_closed_wed"],
+            is_closed_thu=r.metadata["is_closed_thu"],
+            is_closed_fri=r.metadata["is_closed_fri"],
+            is_closed_sat=r.metadata["is_closed_sat"],
+            is_closed_sun=r.metadata["is_closed_sun"],
+            is_during_day=r.metadata["is_during_day"],
+            is_during_night=r.metadata["is_during_night"],
+            name=r.text,
+            location="Torino",
+            url=f"https://example.com/benchmark/{r.event_id}",
+        )
+        for r in records
+    ]
+    db.add_all(db_events)
+    db.flush()
+    return [
+        VectorRecord(
+            event_id=db_event.id,
+            embedding=r.embedding,
+            text=r.text,
+            metadata=r.metadata | {"id": db_event.id},
+        )
+        for r, db_event in zip(records, db_events)
+    ]
+
+
+def get_filters() -> list:
+    """Filters of the agent for the typical ranges asked by the users."""
+    today = datetime.date.today()
+    return [
+        get_events_filter(today_date=today, start_date=start_date, end_date=end_date)
+        for start_date, end_date in [
+            (None, None),  # next week
+            (today, today),
+            (today + datetime.timedelta(days=5), today + datetime.timedelta(days=6)),
+        ]
+    ] + [
+        get_events_filter(today_date=today, time_of_day=time_of_day)
+        for time_of_day in [DayTimeEnum.daytime, DayTimeEnum.nighttime]
+    ]
+
+
+def run_queries(
+    backend: VectorBackend, query_vectors: np.ndarray, filters: list
+) -> tuple[list[float], list[list[str]]]:
+    """Latencies of the queries in milliseconds, and the texts of the results."""
+    latencies = []
+    results = []
+    for i, query_vector in enumerate(query_vectors):
+        started_at = time.perf_counter()
+        docs = backend.query(
+            query_vector.tolist(), k=N_EVENTS_CONTEXT, filter=filters[i % len(filters)]
+        )
+        latencies.append(1000 * (time.perf_counter() - started_at))
+        results.append([doc.page_content for doc, _ in docs])
+    return latencies, results
+
+
+def report(
+    name: str,
+    latencies: list[float],
+    overlap: float | None = None,
+    reference: str = "local",
+) -> None:
+    latencies = sorted(latencies)
+    print(
+        f"{name:>10} | p50 {statistics.median(latencies):8.3f} ms"
+        + f" | p99 {latencies[int(0.99 * (len(latencies) - 1))]:8.3f} ms"
+        + (
+            f" | top-k overlap with {reference} {overlap:.2f}"
+            if overlap is not None
+            else ""
+        )
+    )
+
+
+if __name__ == "__main__":
+    from app.db.db import engine
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=["local", "postgres"],
+        choices=["local", "postgres", "pinecone"],
+    )
+    args = parser.parse_args()
+
+    records = get_records(args.events)
+    filters = get_filters()
+    query_vectors = np.random.default_rng(1).standard_normal(
+        (args.queries, EMBEDDING_SIZE)
+    )
+    print(f"{args.events} events, {args.queries} queries, k={N_EVENTS_CONTEXT}")
+
+    local_backend = LocalBackend()
+    local_backend.upsert(records)
+    local_latencies, local_results = run_queries(local_backend, query_vectors, filters)
+    if "local" in args.backends:
+        report("local", local_latencies)
+
+    if "postgres" in args.backends:
+        connection = engine.connect()
+        transaction = connection.begin()
+        db = Session(bind=connection, join_transaction_mode="create_savepoint")
+        try:
+            postgres_backend = PostgresBackend(db=db)
+            postgres_backend.upsert(seed_events(db, records))
+            connection.exec_driver_sql("ANALYZE events")
+            latencies, results = run_queries(postgres_backend, query_vectors, filters)
+            report(
+                "postgres",
+                latencies,
+                overlap=statistics.mean(
+                    len(set(a) & set(b)) / max(len(a), 1)
+                    for a, b in zip(local_results, results)
+                ),
+            )
+        finally:
+            db.close()
+            transaction.rollback()
+            connection.close()
+
+    if "pinecone" in args.backends:
+        latencies, _ = run_queries(PineconeBackend(), query_vectors, filters)
+        report("pinecone", latencies)
@@ -0,0 +1,95 @@
+"""
+Benchmark the throughput of the loader on a backlog of events not vectorized,
+one event at a time against the batched pipeline, with a stand-in of the
+embedding api that sleeps for a round trip on each request.
+The events are loaded in a transaction that is rolled back, the vectors go to
+the local backend (or to the postgres one with --backend postgres).
+Run with: python -m benchmarks.vectorize_throughput
+"""
+
+import argparse
+import time
+
+from langchain.embeddings.base import Embeddings
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.constants import EMBEDDING_SIZE
+from app.db.models import EventEmbeddingORM, EventORM
+from app.loader.loader import Loader
+from app.vectorstore.local import LocalBackend
+from app.vectorstore.postgres import PostgresBackend
+from benchmarks.vector_search import get_records, seed_events
+
+
+class StubEmbeddings(Embeddings):
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.requests = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.requests += 1
+        time.sleep(self.latency)
+        return [[float(len(text))] + [1.0] * (EMBEDDING_SIZE - 1) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+def reset(db: Session) -> None:
+    """Set the events of the benchmark back to not vectorized."""
+    db.execute(
+        update(EventORM)
+        .where(EventORM.source == "benchmark")
+        .values(is_vectorized=False, embedding=None)
+    )
+    db.query(EventEmbeddingORM).delete()
+    db.commit()
+
+
+if __name__ == "__main__":
+    from app.db.db import engine
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--backend", default="local", choices=["local", "postgres"])
+    args = parser.parse_args()
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    # the commits of the loader are left to the outer transaction, without
+    # savepoints that the session streaming the events would interleave with
+    db = Session(bind=connection, join_transaction_mode="rollback_only")
+    try:
+        seed_events(db, get_records(args.events))
+        db.commit()
+
+        for name in ["per-event", "pipeline"]:
+            reset(db)
+            loader = Loader(
+                db=db,
+                embeddings=StubEmbeddings(latency=args.latency),
+                vector_backend=(
+                    PostgresBackend(db=db)
+                    if args.backend == "postgres"
+                    else LocalBackend()
+                ),
+            )
+            started_at = time.perf_counter()
+            if name == "per-event":
+                db_events = loader.get_not_vectorized_events()
+                for db_event in db_events:
+                    loader.vectorize_event(db_event)
+                n_events = len(db_events)
+            else:
+                n_events = loader.vectorize_events()
+            elapsed = time.perf_counter() - started_at
+            print(
+                f"{name:>10} | {n_events / elapsed:8.1f} events/s"
+                + f" | {loader.embeddings.requests} embedding requests"
+            )
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
@@ -0,0 +1,71 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class WhatsappStubHandler(BaseHTTPRequestHandler):
+    """Stand-in for the messages endpoint of the WhatsApp Cloud API."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive connections
+    latency = 0.1  # in seconds
+    throttle_rate = 0.0  # fraction of requests answered with 429
+
+    def do_POST(self) -> None:
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.latency)
+
+        self.server.requests_count += 1
+        if random.random() < self.throttle_rate:
+            status_code, headers = 429, {"Retry-After": "1"}
+            body = {"error": {"message": "Too many requests", "code": 130429}}
+        else:
+            status_code, headers = 200, {}
+            body = {
+                "messaging_product": "whatsapp",
+                "contacts": [{"input": payload["to"], "wa_id": payload["to"]}],
+                "messages": [{"id": f"wamid.{self.server.requests_count}"}],
+            }
+
+        content = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def run_stub_server(
+    port: int = 0, latency: float = 0.1, throttle_rate: float = 0.0
+) -> ThreadingHTTPServer:
+    """Start the stub server in a background thread, its URL is the API URL."""
+    handler = type(
+        "Handler",
+        (WhatsappStubHandler,),
+        {"latency": latency, "throttle_rate": throttle_rate},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.requests_count = 0
+    server.url = f"http://127.0.0.1:{server.server_port}/"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a WhatsApp Cloud API stub.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = run_stub_server(args.port, args.latency, args.throttle_rate)
+    print(f"WhatsApp stub listening at: {server.url}")
+    threading.Event().wait()
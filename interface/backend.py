@@ -22,7 +22,7 @@ app = FastAPI()
 
 
 @app.post("/chatbot/{chat_type}", response_model=AnswerOutput)
-async def chatbot_api(
+def chatbot_api(
     chat_type: ChatType,
     chatbot_in: ChatbotInput,
     db: Session = Depends(get_db),
@@ -52,7 +52,7 @@ async def chatbot_api(
 
 
 @app.post("/control_panel/scraper/{identifier}")
-async def control_panel_api_run_scraper(
+def control_panel_api_run_scraper(
     identifier: str,
     db: Session = Depends(get_db),
 ):
@@ -65,7 +65,7 @@ async def control_panel_api_run_scraper(
 
 
 @app.post("/control_panel/gform/{identifier}")
-async def control_panel_api_run_scraper(
+def control_panel_api_run_scraper(
     identifier: str,
     db: Session = Depends(get_db),
 ):
@@ -78,7 +78,7 @@ async def control_panel_api_run_scraper(
 
 
 @app.post("/control_panel/loader/show")
-async def control_panel_api_loader_show_not_vectorized_events(
+def control_panel_api_loader_show_not_vectorized_events(
     db: Session = Depends(get_db),
 ):
     agent = Loader(db=db)
@@ -87,14 +87,14 @@ async def control_panel_api_loader_show_not_vectorized_events(
 
 
 @app.post("/control_panel/loader/vectorize")
-async def control_panel_api_loader_vectorize_events(db: Session = Depends(get_db)):
+def control_panel_api_loader_vectorize_events(db: Session = Depends(get_db)):
     agent = Loader(db=db)
     agent.vectorize_events()
     return {"status": status.HTTP_200_OK, "detail": "Everything has been vectorized."}
 
 
 @app.post("/dashboard", response_model=DashboardOutput)
-async def dashboard_api(
+def dashboard_api(
     start_date: datetime.date, end_date: datetime.date, db: Session = Depends(get_db)
 ):
     response = get_dashboard_stats(db=db, start_date=start_date, end_date=end_date)
@@ -0,0 +1,58 @@
+"""Create event embeddings table
+
+Revision ID: a9d4e2b7c613
+Revises: f1c9a3e6b842
+Create Date: 2026-10-18 19:20:44.180376
+
+"""
+
+from typing import Sequence, Union
+
+import pgvector.sqlalchemy
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a9d4e2b7c613"
+down_revision: Union[str, None] = "f1c9a3e6b842"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_SIZE = 1536  # that's specific to OpenAIEmbeddings
+
+
+def upgrade() -> None:
+    op.create_table(
+        "event_embeddings",
+        sa.Column("event_id", sa.Integer(), nullable=False),
+        sa.Column("model", sa.String(), nullable=False),
+        sa.Column("content_hash", sa.String(), nullable=False),
+        sa.Column(
+            "embedding", pgvector.sqlalchemy.Vector(EMBEDDING_SIZE), nullable=False
+        ),
+        sa.Column("registered_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["event_id"], ["events.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("event_id"),
+    )
+
+    # the vectors of the postgres backend are kept, the hash being the one
+    # computed by the loader: the sha256 of the description
+    op.execute(
+        f"""
+        INSERT INTO event_embeddings
+            (event_id, model, content_hash, embedding, registered_at)
+        SELECT
+            id,
+            '{EMBEDDING_MODEL}',
+            encode(sha256(convert_to(description, 'UTF8')), 'hex'),
+            embedding,
+            now() at time zone 'utc'
+        FROM events
+        WHERE embedding IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("event_embeddings")
@@ -0,0 +1,33 @@
+"""Add event vectorized hashes
+
+Revision ID: b2f6d8a41c95
+Revises: a9d4e2b7c613
+Create Date: 2026-10-18 20:03:12.517840
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b2f6d8a41c95"
+down_revision: Union[str, None] = "a9d4e2b7c613"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the events vectorized before have no hashes, the next sync upserts them
+    op.add_column(
+        "events", sa.Column("vectorized_text_hash", sa.String(), nullable=True)
+    )
+    op.add_column(
+        "events", sa.Column("vectorized_metadata_hash", sa.String(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("events", "vectorized_metadata_hash")
+    op.drop_column("events", "vectorized_text_hash")
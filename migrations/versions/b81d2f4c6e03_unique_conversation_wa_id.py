@@ -0,0 +1,58 @@
+"""Unique conversation wa_id
+
+Revision ID: b81d2f4c6e03
+Revises: a3c5e7f90b12
+Create Date: 2026-10-18 10:04:17.226395
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b81d2f4c6e03"
+down_revision: Union[str, None] = "a3c5e7f90b12"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FAKE_USER_ID = -1  # owner of the temporary conversations
+
+
+def upgrade() -> None:
+    # the fake users are created once here instead of checked on every message
+    op.execute(
+        f"""
+        INSERT INTO users (id, phone_number, is_blocked, is_admin, registered_at)
+        VALUES ({FAKE_USER_ID}, '000000000000', false, false, now())
+        ON CONFLICT (id) DO NOTHING
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO businesses (id, phone_number, registered_at)
+        VALUES ({FAKE_USER_ID}, '000000000000', now())
+        ON CONFLICT (id) DO NOTHING
+        """
+    )
+
+    for table_name in ["conversations", "business_conversations"]:
+        # keep only the first conversation of a message processed more than once
+        op.execute(
+            f"""
+            DELETE FROM {table_name} a USING {table_name} b
+            WHERE a.wa_id = b.wa_id AND a.id > b.id
+            """
+        )
+        op.drop_index(op.f(f"ix_{table_name}_wa_id"), table_name=table_name)
+        op.create_index(
+            op.f(f"ix_{table_name}_wa_id"), table_name, ["wa_id"], unique=True
+        )
+
+
+def downgrade() -> None:
+    for table_name in ["conversations", "business_conversations"]:
+        op.drop_index(op.f(f"ix_{table_name}_wa_id"), table_name=table_name)
+        op.create_index(
+            op.f(f"ix_{table_name}_wa_id"), table_name, ["wa_id"], unique=False
+        )
@@ -0,0 +1,64 @@
+"""Add composite indexes
+
+Revision ID: bca50d96bf96
+Revises: f3b7d2e91a64
+Create Date: 2026-10-18 16:02:37.924583
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "bca50d96bf96"
+down_revision: Union[str, None] = "f3b7d2e91a64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    (
+        "ix_business_conversations_user_id_registered_at",
+        "business_conversations",
+        ["user_id", "registered_at"],
+    ),
+    ("ix_businesses_phone_number", "businesses", ["phone_number"]),
+    ("ix_clicks_registered_at", "clicks", ["registered_at"]),
+    ("ix_conversations_received_at", "conversations", ["received_at"]),
+    (
+        "ix_conversations_user_id_registered_at",
+        "conversations",
+        ["user_id", "registered_at"],
+    ),
+    (
+        "ix_events_source_url_start_date_end_date",
+        "events",
+        ["source", "url", "start_date", "end_date"],
+    ),
+]
+
+
+def upgrade() -> None:
+    # indexes are built concurrently so that writes are not blocked meanwhile
+    with op.get_context().autocommit_block():
+        for index_name, table_name, columns in INDEXES:
+            op.create_index(
+                index_name,
+                table_name,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index_name, table_name, _ in INDEXES[::-1]:
+            op.drop_index(
+                index_name,
+                table_name=table_name,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
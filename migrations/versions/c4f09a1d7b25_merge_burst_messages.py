@@ -0,0 +1,38 @@
+"""Merge burst messages
+
+Revision ID: c4f09a1d7b25
+Revises: b81d2f4c6e03
+Create Date: 2026-10-18 11:37:52.841976
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c4f09a1d7b25"
+down_revision: Union[str, None] = "b81d2f4c6e03"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TYPE answertype ADD VALUE IF NOT EXISTS 'merged'")
+    op.add_column(
+        "conversations", sa.Column("merged_wa_ids", sa.String(), nullable=True)
+    )
+    op.add_column(
+        "business_conversations",
+        sa.Column("merged_wa_ids", sa.String(), nullable=True),
+    )
+    op.add_column("jobs", sa.Column("available_at", sa.DateTime(), nullable=True))
+    op.execute("UPDATE jobs SET available_at = registered_at")
+    op.alter_column("jobs", "available_at", nullable=False)
+
+
+def downgrade() -> None:
+    # enum values cannot be dropped: 'merged' is left in the answertype enum
+    op.drop_column("jobs", "available_at")
+    op.drop_column("business_conversations", "merged_wa_ids")
+    op.drop_column("conversations", "merged_wa_ids")
@@ -0,0 +1,28 @@
+"""Add event vector id
+
+Revision ID: c5e9a17f3b28
+Revises: b2f6d8a41c95
+Create Date: 2026-10-18 20:41:37.256093
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c5e9a17f3b28"
+down_revision: Union[str, None] = "b2f6d8a41c95"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the ids of the vectors added before are looked up in the vectorstore by:
+    # python -m app.loader.loader --backfill-vector-ids
+    op.add_column("events", sa.Column("vector_id", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("events", "vector_id")
@@ -0,0 +1,87 @@
+"""Unique event natural key
+
+Revision ID: c7e2a94d0b18
+Revises: bca50d96bf96
+Create Date: 2026-10-18 16:48:05.311742
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c7e2a94d0b18"
+down_revision: Union[str, None] = "bca50d96bf96"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CONSTRAINT_NAME = "uq_events_source_url_start_date_end_date"
+INDEX_NAME = "ix_events_source_url_start_date_end_date"
+COLUMNS = ["source", "url", "start_date", "end_date"]
+
+
+def upgrade() -> None:
+    # keep only the first of the events registered more than once,
+    # their clicks are moved to it; the vectors of the others are left in the
+    # vectorstore, the search skips them (see get_events_by_ids)
+    op.execute(
+        """
+        UPDATE clicks SET event_id = b.id
+        FROM events a, events b
+        WHERE clicks.event_id = a.id
+            AND a.source = b.source AND a.url = b.url
+            AND a.start_date = b.start_date AND a.end_date = b.end_date
+            AND b.id = (
+                SELECT min(c.id) FROM events c
+                WHERE c.source = a.source AND c.url = a.url
+                    AND c.start_date = a.start_date AND c.end_date = a.end_date
+            )
+            AND a.id > b.id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM events a USING events b
+        WHERE a.source = b.source AND a.url = b.url
+            AND a.start_date = b.start_date AND a.end_date = b.end_date
+            AND a.id > b.id
+        """
+    )
+
+    # the unique index is built concurrently, then it backs the constraint
+    with op.get_context().autocommit_block():
+        op.create_index(
+            CONSTRAINT_NAME,
+            "events",
+            COLUMNS,
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+    op.execute(
+        f"ALTER TABLE events ADD CONSTRAINT {CONSTRAINT_NAME} "
+        + f"UNIQUE USING INDEX {CONSTRAINT_NAME}"
+    )
+    with op.get_context().autocommit_block():
+        # redundant with the constraint
+        op.drop_index(
+            INDEX_NAME,
+            table_name="events",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            INDEX_NAME,
+            "events",
+            COLUMNS,
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+    op.drop_constraint(CONSTRAINT_NAME, "events", type_="unique")
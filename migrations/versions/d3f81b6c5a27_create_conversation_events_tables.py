@@ -0,0 +1,66 @@
+"""Create conversation events tables
+
+Revision ID: d3f81b6c5a27
+Revises: c7e2a94d0b18
+Create Date: 2026-10-18 17:21:44.708115
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d3f81b6c5a27"
+down_revision: Union[str, None] = "c7e2a94d0b18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = [
+    ("conversation_events", "conversations"),
+    ("business_conversation_events", "business_conversations"),
+]
+
+
+def upgrade() -> None:
+    for table_name, conversations_table_name in TABLES:
+        op.create_table(
+            table_name,
+            sa.Column("conversation_id", sa.Integer(), nullable=False),
+            sa.Column("position", sa.Integer(), nullable=False),
+            sa.Column("event_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["conversation_id"],
+                [f"{conversations_table_name}.id"],
+                ondelete="CASCADE",
+            ),
+            sa.ForeignKeyConstraint(["event_id"], ["events.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("conversation_id", "position"),
+        )
+        op.create_index(
+            op.f(f"ix_{table_name}_event_id"), table_name, ["event_id"], unique=False
+        )
+        # links are parsed from the json lists, ids of deleted events are dropped
+        op.execute(
+            f"""
+            INSERT INTO {table_name} (conversation_id, position, event_id)
+            SELECT c.id, e.position, e.event_id::integer
+            FROM {conversations_table_name} c,
+                json_array_elements_text(c.used_event_ids::json)
+                    WITH ORDINALITY AS e (event_id, position)
+            WHERE c.used_event_ids LIKE '[%'
+                AND EXISTS (SELECT 1 FROM events WHERE id = e.event_id::integer)
+            """
+        )
+
+    op.create_index(
+        "ix_clicks_event_id_user_id", "clicks", ["event_id", "user_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_clicks_event_id_user_id", table_name="clicks")
+    for table_name, _ in TABLES[::-1]:
+        op.drop_index(op.f(f"ix_{table_name}_event_id"), table_name=table_name)
+        op.drop_table(table_name)
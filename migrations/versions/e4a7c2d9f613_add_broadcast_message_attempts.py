@@ -0,0 +1,32 @@
+"""Add broadcast message attempts
+
+Revision ID: e4a7c2d9f613
+Revises: c5e9a17f3b28
+Create Date: 2026-10-18 21:52:40.618275
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a7c2d9f613"
+down_revision: Union[str, None] = "c5e9a17f3b28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the messages sent or failed before were attempted once
+    op.add_column(
+        "broadcast_messages",
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute("UPDATE broadcast_messages SET attempts = 1 WHERE status != 'pending'")
+    op.alter_column("broadcast_messages", "attempts", server_default=None)
+
+
+def downgrade() -> None:
+    op.drop_column("broadcast_messages", "attempts")
@@ -0,0 +1,57 @@
+"""Create user answer counters table
+
+Revision ID: e5a18c3f2d90
+Revises: d92e6b3a1c47
+Create Date: 2026-10-18 14:06:31.592814
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a18c3f2d90"
+down_revision: Union[str, None] = "d92e6b3a1c47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FAKE_USER_ID = -1  # owner of the temporary conversations
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_answer_counters",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "answer_type",
+            postgresql.ENUM(name="answertype", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("first_registered_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("user_id", "answer_type", "day"),
+    )
+    # counters start from the answers already registered, merged messages excluded
+    # ('merged' is compared as text: it was added to the enum in this transaction)
+    op.execute(
+        f"""
+        INSERT INTO user_answer_counters
+            (user_id, answer_type, day, count, first_registered_at)
+        SELECT user_id, answer_type, registered_at::date, count(*), min(registered_at)
+        FROM conversations
+        WHERE user_id != {FAKE_USER_ID} AND answer_type::text != 'merged'
+        GROUP BY user_id, answer_type, registered_at::date
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_answer_counters")
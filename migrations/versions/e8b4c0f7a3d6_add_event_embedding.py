@@ -0,0 +1,35 @@
+"""Add event embedding
+
+Revision ID: e8b4c0f7a3d6
+Revises: d3f81b6c5a27
+Create Date: 2026-10-18 18:12:09.466281
+
+"""
+
+from typing import Sequence, Union
+
+import pgvector.sqlalchemy
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e8b4c0f7a3d6"
+down_revision: Union[str, None] = "d3f81b6c5a27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMBEDDING_SIZE = 1536  # that's specific to OpenAIEmbeddings
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.add_column(
+        "events",
+        sa.Column(
+            "embedding", pgvector.sqlalchemy.Vector(EMBEDDING_SIZE), nullable=True
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("events", "embedding")
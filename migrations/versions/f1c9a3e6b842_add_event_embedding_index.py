@@ -0,0 +1,47 @@
+"""Add event embedding index
+
+Revision ID: f1c9a3e6b842
+Revises: e8b4c0f7a3d6
+Create Date: 2026-10-18 18:47:21.603915
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f1c9a3e6b842"
+down_revision: Union[str, None] = "e8b4c0f7a3d6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = "ix_events_embedding"
+
+
+def upgrade() -> None:
+    # hnsw keeps a good recall without training, unlike ivfflat, so it can be
+    # built on a column that is still being filled
+    with op.get_context().autocommit_block():
+        op.create_index(
+            INDEX_NAME,
+            "events",
+            ["embedding"],
+            unique=False,
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            INDEX_NAME,
+            table_name="events",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
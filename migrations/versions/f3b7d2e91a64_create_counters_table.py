@@ -0,0 +1,40 @@
+"""Create counters table
+
+Revision ID: f3b7d2e91a64
+Revises: e5a18c3f2d90
+Create Date: 2026-10-18 15:21:44.108263
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f3b7d2e91a64"
+down_revision: Union[str, None] = "e5a18c3f2d90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FAKE_USER_ID = -1  # owner of the temporary conversations
+
+
+def upgrade() -> None:
+    op.create_table(
+        "counters",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("value", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    # the users already registered count towards the cap, as they did before
+    op.execute(
+        f"""
+        INSERT INTO counters (name, value)
+        SELECT 'admitted_users', count(*) FROM users WHERE id != {FAKE_USER_ID}
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("counters")
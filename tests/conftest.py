@@ -1,7 +1,7 @@
 import pytest
 from sqlalchemy.orm import Session
 
-from app.db.db import SessionLocal
+from app.db.db import SessionLocal, engine
 
 
 @pytest.fixture(scope="session")
@@ -11,3 +11,17 @@ def database_session() -> Session:
         yield db
     finally:
         db.close()
+
+
+@pytest.fixture
+def db() -> Session:
+    """Session whose changes, even the committed ones, are rolled back."""
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = Session(bind=connection, join_transaction_mode="rollback_only")
+    try:
+        yield db
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
@@ -0,0 +1,25 @@
+import datetime
+import time
+
+from app.utils.blocked_users_cache import BlockedUsersCache
+
+
+def test_blocked_users_cache():
+    cache = BlockedUsersCache(ttl=60, audit_interval=0.2, max_size=2)
+    cache.add("1", block_expires_at=None)
+    cache.add("2", block_expires_at=datetime.datetime.utcnow())  # already expired
+    assert cache.is_blocked("1")
+    assert not cache.is_blocked("2")
+
+    # a message is let through once per audit interval
+    time.sleep(0.2)
+    assert not cache.is_blocked("1")
+    assert cache.is_blocked("1")
+
+    cache.discard("1")
+    assert not cache.is_blocked("1")
+
+    # the oldest entry is evicted once the cache is full
+    for phone_number in ["3", "4", "5"]:
+        cache.add(phone_number, block_expires_at=None)
+    assert [cache.is_blocked(p) for p in ["3", "4", "5"]] == [False, True, True]
@@ -0,0 +1,92 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from app.broadcaster.broadcaster import Broadcaster, TokenBucket, get_message_status
+from app.constants import BROADCAST_MAX_ATTEMPTS
+from app.db.enums import BroadcastStatus
+
+
+class FakeClock:
+    """Clock advanced by the sleeps only, so that no time really passes."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def test_token_bucket():
+    clock = FakeClock()
+
+    def acquire(token_bucket: TokenBucket, n: int) -> float:
+        """Time taken by n acquisitions, on the fake clock."""
+        started_at = clock()
+
+        async def run() -> None:
+            for _ in range(n):
+                await token_bucket.acquire()
+
+        asyncio.run(run())
+        return clock() - started_at
+
+    # a burst up to the capacity is let through, then tokens are refilled at the rate
+    token_bucket = TokenBucket(rate=20, capacity=5, clock=clock, sleep=clock.sleep)
+    assert acquire(token_bucket, 5) == 0
+    assert acquire(token_bucket, 5) == pytest.approx(0.25)
+
+    # the bucket is refilled while idle, up to its capacity
+    clock.now += 10
+    assert acquire(token_bucket, 5) == 0
+    assert acquire(token_bucket, 1) == pytest.approx(0.05)
+
+    # by default the burst is a single token, so the rate is never exceeded
+    token_bucket = TokenBucket(rate=50, clock=clock, sleep=clock.sleep)
+    assert acquire(token_bucket, 101) == pytest.approx(2)
+
+
+def test_message_status():
+    assert get_message_status(200, attempts=1) == BroadcastStatus.sent
+    assert get_message_status(400, attempts=1) == BroadcastStatus.failed
+    for status_code in [None, 429, 503]:
+        assert get_message_status(status_code, attempts=1) == BroadcastStatus.pending
+        assert (
+            get_message_status(status_code, attempts=BROADCAST_MAX_ATTEMPTS)
+            == BroadcastStatus.failed
+        )
+
+
+def test_send_batch_not_retried_by_client(monkeypatch: pytest.MonkeyPatch):
+    broadcaster = Broadcaster(db=None, wa_number_id="1")
+    posts = []
+
+    def post(url: str, **kwargs) -> requests.Response:
+        posts.append(kwargs["json"]["to"])
+        response = requests.Response()
+        response.status_code = 503
+        return response
+
+    monkeypatch.setattr(broadcaster.wa_client.session, "post", post)
+
+    async def run() -> list[tuple[int, int | None]]:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return [
+                result
+                async for result in broadcaster.send_batch(
+                    messages=[(1, "391234567890"), (2, "391234567891")],
+                    template_name="hello_world",
+                    language_code="en_US",
+                    token_bucket=TokenBucket(rate=1000),
+                    executor=executor,
+                )
+            ]
+
+    # a single post per message, the retries are left to the broadcast passes
+    assert sorted(asyncio.run(run())) == [(1, 503), (2, 503)]
+    assert sorted(posts) == ["391234567890", "391234567891"]
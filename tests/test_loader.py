@@ -0,0 +1,111 @@
+import datetime
+
+from langchain.docstore.document import Document
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.constants import EMBEDDING_MODEL, EMBEDDING_SIZE
+from app.db.enums import CityEnum
+from app.db.models import EventORM
+from app.db.services import register_event_embeddings
+from app.loader.loader import Loader, get_content_hash
+from app.vectorstore import VectorBackend, VectorRecord
+
+
+class LegacyBackend(VectorBackend):
+    """Vectors by id, with the event id in their metadata as on pinecone."""
+
+    def __init__(self) -> None:
+        self.vectors = {}
+
+    def upsert(self, records: list[VectorRecord]) -> None:
+        self.vectors |= {r.vector_id: r.event_id for r in records}
+
+    def delete(self, vector_ids: list[str]) -> None:
+        for vector_id in vector_ids:
+            self.vectors.pop(vector_id, None)
+
+    def find_vector_ids(self, event_ids: list[int]) -> dict[int, list[str]]:
+        vector_ids = {}
+        for vector_id, event_id in self.vectors.items():
+            if event_id in event_ids:
+                vector_ids.setdefault(event_id, []).append(vector_id)
+        return vector_ids
+
+    def query(self, embedding, k, filter=None) -> list[tuple[Document, float]]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        return len(self.vectors)
+
+
+def add_event(
+    db: Session, description: str, end_date: datetime.date, is_vectorized: bool
+) -> int:
+    """Add an event with a stored embedding of its description, return its id."""
+    db_event = EventORM(
+        description=description,
+        is_vectorized=is_vectorized,
+        source="test",
+        registered_at=datetime.datetime.utcnow(),
+        city=CityEnum.Torino,
+        start_date=end_date,
+        end_date=end_date,
+        is_closed_mon=False,
+        is_closed_tue=False,
+        is_closed_wed=False,
+        is_closed_thu=False,
+        is_closed_fri=False,
+        is_closed_sat=False,
+        is_closed_sun=False,
+        is_during_day=False,
+        is_during_night=True,
+        url=f"https://example.com/{description}",
+    )
+    db.add(db_event)
+    db.flush()
+    register_event_embeddings(
+        db=db,
+        event_embeddings_in=[
+            {
+                "event_id": db_event.id,
+                "model": EMBEDDING_MODEL,
+                "content_hash": get_content_hash(description),
+                "embedding": [0.1] * EMBEDDING_SIZE,
+            }
+        ],
+    )
+    return db_event.id
+
+
+def test_add_events_replaces_legacy_vector(db: Session):
+    # vectorized before its vector id was stored
+    event_id = add_event(db, "Concerto", datetime.date.today(), is_vectorized=True)
+    backend = LegacyBackend()
+    backend.vectors["0b9e6c1a-random-id"] = event_id
+
+    loader = Loader(db=db, embeddings=object(), vector_backend=backend)
+    loader.add_events([db.get(EventORM, event_id)])
+    assert backend.vectors == {str(event_id): event_id}
+    assert db.get(EventORM, event_id).vector_id == str(event_id)
+
+    # once the vector id is stored, the event is upserted without a lookup
+    loader.add_events([db.get(EventORM, event_id)])
+    assert backend.vectors == {str(event_id): event_id}
+
+
+def test_vectorize_events_skips_expired(db: Session):
+    db.execute(
+        update(EventORM)
+        .where(EventORM.is_vectorized == False)
+        .values(is_vectorized=True)
+    )
+    today = datetime.date.today()
+    event_id = add_event(db, "Mostra", today, is_vectorized=False)
+    # unflagged by the vectorstore gc
+    add_event(db, "Sagra", today - datetime.timedelta(days=1), is_vectorized=False)
+    backend = LegacyBackend()
+
+    loader = Loader(db=db, embeddings=object(), vector_backend=backend)
+    assert loader.vectorize_events() == 1
+    assert backend.vectors == {str(event_id): event_id}
@@ -0,0 +1,249 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from app.answerer.push.journey import LIMITS_TIMEDELTA, UserJourney
+from app.answerer.push.messages import MESSAGE_WEEK_ANSWERS_LIMIT
+from app.constants import FAKE_USER_ID
+from app.db import services
+from app.db.db import SessionLocal
+from app.db.enums import AnswerType
+from app.db.models import ConversationORM, CounterORM, UserORM
+from app.db.services import (
+    UserContext,
+    admit_user,
+    get_user_answers_count,
+    increment_user_answer_counter,
+    load_user_context,
+)
+from app.utils.blocked_users_cache import blocked_users_cache
+
+ANSWERS_FROM_DATETIME = datetime.datetime(2026, 10, 11, 12)
+
+
+def add_user(db: Session, phone_number: str) -> UserORM:
+    db_user = UserORM(
+        phone_number=phone_number,
+        is_blocked=False,
+        is_admin=False,
+        registered_at=datetime.datetime(2026, 10, 1),
+    )
+    db.add(db_user)
+    db.flush()
+    return db_user
+
+
+def add_conversation(
+    db: Session,
+    db_user: UserORM,
+    answer_type: AnswerType,
+    registered_at: datetime.datetime,
+) -> ConversationORM:
+    """Add an answered conversation, counted as update_temp_conversation does."""
+    db_conversation = ConversationORM(
+        user_id=db_user.id,
+        wa_id=f"wamid.test-{db_user.id}-{registered_at.isoformat()}",
+        from_message="Cosa fare stasera?",
+        to_message="Ciao!",
+        answer_type=answer_type,
+        used_event_ids="[]",
+        received_at=registered_at,
+        registered_at=registered_at,
+    )
+    db.add(db_conversation)
+    db.flush()
+    increment_user_answer_counter(
+        db=db, user_id=db_user.id, answer_type=answer_type, registered_at=registered_at
+    )
+    return db_conversation
+
+
+@pytest.fixture
+def db_user(db: Session) -> UserORM:
+    """User with answers before the window, on its first day and within it."""
+    db_user = add_user(db, phone_number="390000000001")
+    for answer_type, registered_at in [
+        (AnswerType.ai, datetime.datetime(2026, 10, 10, 18)),
+        (AnswerType.ai, datetime.datetime(2026, 10, 11, 9)),
+        (AnswerType.ai, datetime.datetime(2026, 10, 11, 15)),
+        (AnswerType.blocked, datetime.datetime(2026, 10, 11, 16)),
+        (AnswerType.ai, datetime.datetime(2026, 10, 13, 10)),
+        (AnswerType.ai, datetime.datetime(2026, 10, 13, 11)),
+        (AnswerType.conversational, datetime.datetime(2026, 10, 14, 8)),
+        (AnswerType.blocked, datetime.datetime(2026, 10, 17, 19)),
+        (AnswerType.ai, datetime.datetime(2026, 10, 17, 20)),
+    ]:
+        add_conversation(db, db_user, answer_type, registered_at)
+    return db_user
+
+
+def test_answers_counts_match_conversations(db: Session, db_user: UserORM):
+    answer_types = [AnswerType.ai, AnswerType.blocked, AnswerType.failed]
+    user_context = load_user_context(
+        db=db,
+        phone_number=db_user.phone_number,
+        answer_types=answer_types,
+        answers_from_datetime=ANSWERS_FROM_DATETIME,
+        conversations_from_datetime=ANSWERS_FROM_DATETIME,
+        max_messages=10,
+    )
+    assert user_context.answers_counts == {
+        answer_type: tuple(
+            get_user_answers_count(
+                db=db,
+                user_id=db_user.id,
+                answer_type=answer_type,
+                datetime_limit=ANSWERS_FROM_DATETIME,
+            )
+        )
+        for answer_type in answer_types
+    }
+    assert user_context.answers_counts[AnswerType.ai] == (
+        4,
+        datetime.datetime(2026, 10, 11, 15),
+    )
+    assert user_context.answers_counts[AnswerType.failed] == (0, None)
+
+
+@pytest.mark.parametrize("limit", [3, 4, 5])  # over, at and just under the limit
+def test_limits_match_conversations(db: Session, db_user: UserORM, limit: int):
+    user_context = load_user_context(
+        db=db,
+        phone_number=db_user.phone_number,
+        answer_types=[AnswerType.ai],
+        answers_from_datetime=ANSWERS_FROM_DATETIME,
+        conversations_from_datetime=ANSWERS_FROM_DATETIME,
+        max_messages=10,
+    )
+    conversations_context = UserContext(
+        user=db_user,
+        answers_counts={
+            AnswerType.ai: tuple(
+                get_user_answers_count(
+                    db=db,
+                    user_id=db_user.id,
+                    answer_type=AnswerType.ai,
+                    datetime_limit=ANSWERS_FROM_DATETIME,
+                )
+            )
+        },
+        conversations=[],
+    )
+
+    decisions = []
+    for context in [user_context, conversations_context]:
+        db_user.is_blocked = False
+        output = UserJourney(db=db)._check_user_limit_by_answertype(
+            user_context=context,
+            answer_type=AnswerType.ai,
+            limit=limit,
+            block_message=MESSAGE_WEEK_ANSWERS_LIMIT,
+        )
+        decisions.append((output, db_user.is_blocked, db_user.block_expires_at))
+    blocked_users_cache.discard(db_user.phone_number)
+
+    assert decisions[0] == decisions[1]
+    output, is_blocked, block_expires_at = decisions[0]
+    if limit <= 4:
+        assert is_blocked
+        assert (
+            block_expires_at == datetime.datetime(2026, 10, 11, 15) + LIMITS_TIMEDELTA
+        )
+    else:
+        assert output is None and not is_blocked
+
+
+def test_load_user_context(db: Session, db_user: UserORM):
+    user_context = load_user_context(
+        db=db,
+        phone_number=db_user.phone_number,
+        answer_types=[AnswerType.ai],
+        answers_from_datetime=ANSWERS_FROM_DATETIME,
+        conversations_from_datetime=datetime.datetime(2026, 10, 13),
+        max_messages=3,
+    )
+    assert user_context.user.id == db_user.id
+    # the last ones within the window, from the oldest to the newest
+    assert [c.registered_at for c in user_context.conversations] == [
+        datetime.datetime(2026, 10, 14, 8),
+        datetime.datetime(2026, 10, 17, 19),
+        datetime.datetime(2026, 10, 17, 20),
+    ]
+
+    # a user without answers is loaded on a single row
+    db_user = add_user(db, phone_number="390000000002")
+    user_context = load_user_context(
+        db=db,
+        phone_number=db_user.phone_number,
+        answer_types=[AnswerType.ai],
+        answers_from_datetime=ANSWERS_FROM_DATETIME,
+        conversations_from_datetime=ANSWERS_FROM_DATETIME,
+        max_messages=3,
+    )
+    assert user_context == UserContext(
+        user=db_user, answers_counts={AnswerType.ai: (0, None)}, conversations=[]
+    )
+
+
+def test_load_user_context_of_fake_user(db: Session):
+    # the owner of the temporary conversations is never loaded as a user
+    db_user = db.get(UserORM, FAKE_USER_ID)
+    if db_user is None:
+        db_user = UserORM(
+            id=FAKE_USER_ID,
+            phone_number="000000000000",
+            is_blocked=False,
+            is_admin=False,
+            registered_at=datetime.datetime(2026, 10, 1),
+        )
+        db.add(db_user)
+        db.flush()
+    add_conversation(db, db_user, AnswerType.ai, datetime.datetime(2026, 10, 17, 20))
+    user_context = load_user_context(
+        db=db,
+        phone_number=db_user.phone_number,
+        answer_types=[AnswerType.ai],
+        answers_from_datetime=ANSWERS_FROM_DATETIME,
+        conversations_from_datetime=ANSWERS_FROM_DATETIME,
+        max_messages=3,
+    )
+    assert user_context is None
+
+
+def test_admit_user_concurrently(monkeypatch: pytest.MonkeyPatch):
+    # a counter of its own, as the signups are committed by separate sessions
+    counter_name = "test_admitted_users"
+    monkeypatch.setattr(services, "ADMITTED_USERS_COUNTER", counter_name)
+    with SessionLocal() as db:
+        db.add(CounterORM(name=counter_name, value=0))
+        db.commit()
+
+    n_signups = 8
+    barrier = threading.Barrier(n_signups)
+
+    def signup() -> bool:
+        with SessionLocal() as db:
+            barrier.wait()
+            is_admitted = admit_user(db=db, limit=3)
+            db.commit()
+            return is_admitted
+
+    try:
+        with ThreadPoolExecutor(max_workers=n_signups) as executor:
+            admitted = list(executor.map(lambda _: signup(), range(n_signups)))
+        with SessionLocal() as db:
+            assert db.get(CounterORM, counter_name).value == 3
+            assert not admit_user(db=db, limit=3)
+            # the slot is given back if the signup is rolled back
+            assert admit_user(db=db, limit=4)
+            db.rollback()
+            assert db.get(CounterORM, counter_name).value == 3
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(CounterORM).where(CounterORM.name == counter_name))
+            db.commit()
+    assert admitted.count(True) == 3
@@ -0,0 +1,76 @@
+import datetime
+import os
+
+from app.answerer.push.agent import get_events_filter
+from app.answerer.schemas import DayTimeEnum
+from app.utils.datetime_utils import date_to_timestamp
+from app.vectorstore import VectorRecord
+from app.vectorstore.local import LocalBackend
+
+
+def test_local_backend():
+    today = datetime.date(2024, 1, 1)  # Monday
+    backend = LocalBackend(dimension=2)
+    backend.upsert(
+        [
+            VectorRecord(
+                event_id=i,
+                embedding=embedding,
+                text=str(i),
+                metadata={
+                    "id": i,
+                    "start_date": date_to_timestamp(today + datetime.timedelta(days=d)),
+                    "end_date": date_to_timestamp(today + datetime.timedelta(days=d)),
+                    "is_closed_mon": is_closed_mon,
+                    "is_during_day": True,
+                    "is_during_night": is_during_night,
+                },
+            )
+            for i, embedding, d, is_closed_mon, is_during_night in [
+                (1, [1, 0], 0, False, True),
+                (2, [1, 1], 0, False, False),
+                (3, [0, 1], 0, False, True),
+                (4, [1, 0.1], 10, False, True),  # out of the range
+                (5, [1, 0], 0, True, True),  # closed
+            ]
+        ]
+    )
+    events_filter = get_events_filter(
+        today_date=today,
+        start_date=today,
+        end_date=today,
+        time_of_day=DayTimeEnum.nighttime,
+    )
+
+    docs = backend.query([1, 0], k=1, filter=events_filter)
+    assert [d.metadata["id"] for d, _ in docs] == [1]
+    docs = backend.query([1, 0], k=3, filter=events_filter)
+    assert [d.metadata["id"] for d, _ in docs] == [1, 3]
+
+    assert backend.find_vector_ids([1, 6]) == {1: ["1"]}
+    backend.delete_events({1: None, 2: "2"})
+    docs = backend.query([1, 0], k=3, filter=events_filter)
+    assert [d.metadata["id"] for d, _ in docs] == [3]
+    assert backend.count() == 3
+
+
+def test_local_backend_flush(tmp_path):
+    path = str(tmp_path / "vectorstore.npz")
+    backend = LocalBackend(path=path, dimension=2)
+    backend.upsert(
+        [
+            VectorRecord(event_id=i, embedding=[1, i], text=str(i), metadata={"id": i})
+            for i in range(3)
+        ]
+    )
+    backend.delete(["0"])
+    # the changes are saved at once on flush, not on each of them
+    assert not os.path.exists(path)
+    backend.flush()
+    mtime = os.path.getmtime(path)
+    backend.flush()
+    assert os.path.getmtime(path) == mtime
+    assert LocalBackend(path=path, dimension=2).find_vector_ids([0, 1, 2]) == {
+        1: ["1"],
+        2: ["2"],
+    }
@@ -0,0 +1,61 @@
+from app.answerer.schemas import MessageInput, WebhookPayload
+from app.answerer.webhook import _parse_text_messages
+
+
+def get_payload(*values: dict) -> WebhookPayload:
+    return WebhookPayload.parse_obj(
+        {
+            "object": "whatsapp_business_account",
+            "entry": [{"changes": [{"value": value} for value in values]}],
+        }
+    )
+
+
+def get_message(id: str, type: str = "text", **fields) -> dict:
+    message = {"from": "391234567890", "id": id, "timestamp": "1700000000"}
+    message |= {"type": type} | fields
+    if type == "text":
+        message["text"] = {"body": f"Ciao {id}"}
+    return message
+
+
+def test_parse_text_messages():
+    # mixed messages of two numbers, only the text ones are kept
+    payload = get_payload(
+        {
+            "metadata": {"phone_number_id": "1"},
+            "messages": [
+                get_message("a"),
+                get_message("b", type="image"),
+                get_message("c"),
+            ],
+        },
+        {"metadata": {"phone_number_id": "2"}, "messages": [get_message("d")]},
+    )
+    has_messages, messages_per_number_id = _parse_text_messages(payload)
+    assert has_messages
+    assert {k: [m.wa_id for m in v] for k, v in messages_per_number_id.items()} == {
+        "1": ["a", "c"],
+        "2": ["d"],
+    }
+    assert messages_per_number_id["1"][0] == MessageInput(
+        wa_id="a", phone_number="391234567890", body="Ciao a", timestamp=1700000000
+    )
+
+    # status callbacks and empty payloads carry no messages
+    payload = get_payload({"statuses": [{"id": "a", "status": "read"}]})
+    assert _parse_text_messages(payload) == (False, {})
+    assert _parse_text_messages(get_payload()) == (False, {})
+
+    # unsupported and system messages, without some of the fields, are skipped
+    payload = get_payload(
+        {
+            "metadata": {"phone_number_id": "1"},
+            "messages": [
+                {"from": "391234567890", "id": "e", "type": "unsupported"},
+                {"type": "system", "system": {"body": "Number changed"}},
+                {"id": "f", "type": "text", "text": {"body": "Ciao"}},
+            ],
+        }
+    )
+    assert _parse_text_messages(payload) == (True, {})
@@ -0,0 +1,69 @@
+import requests
+
+from app.utils.whatsapp_client import WhatsappWrapper, _get_retry_after
+
+
+def get_response(status_code: int, retry_after: str | None = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    if retry_after is not None:
+        response.headers["Retry-After"] = retry_after
+    return response
+
+
+def get_client(
+    responses: list[requests.Response],
+) -> tuple[WhatsappWrapper, list, list]:
+    """Client answered by the given responses, recording its posts and waits."""
+    client = WhatsappWrapper(number_id="1", max_retries=3)
+    posts = []
+    waits = []
+
+    def post(url: str, **kwargs) -> requests.Response:
+        posts.append(kwargs["json"])
+        return responses[len(posts) - 1]
+
+    client.session.post = post
+    client.retrying = client.retrying.copy(sleep=waits.append)
+    return client, posts, waits
+
+
+def test_retry_after_rate_limit():
+    client, posts, waits = get_client([get_response(429, "2"), get_response(200)])
+    response = client.send_message(to_phone_number="391234567890", message="Ciao")
+    assert response.status_code == 200
+    assert len(posts) == 2
+    assert waits == [2]  # as asked by the Retry-After header
+
+
+def test_no_retry_on_client_error():
+    client, posts, waits = get_client([get_response(400), get_response(200)])
+    response = client.send_message(to_phone_number="391234567890", message="Ciao")
+    assert response.status_code == 400
+    assert len(posts) == 1
+    assert waits == []
+
+
+def test_retries_exhausted():
+    client, posts, _ = get_client([get_response(503)] * 4)
+    response = client.send_message(to_phone_number="391234567890", message="Ciao")
+    assert response.status_code == 503  # the last response is returned
+    assert len(posts) == 4
+
+
+def test_retry_after_header():
+    assert _get_retry_after(get_response(429)) is None
+    assert _get_retry_after(get_response(429, "2.5")) == 2.5
+    assert _get_retry_after(get_response(429, "-1")) == 0
+    assert _get_retry_after(get_response(429, "Wed, 21 Oct 2015 07:28:00 GMT")) == 0
+    # a malformed header is ignored instead of failing the send
+    assert _get_retry_after(get_response(429, "soon")) is None
+    assert _get_retry_after(get_response(429, "Wed, 99 Foo 2015")) is None
+
+
+def test_malformed_retry_after():
+    client, posts, waits = get_client([get_response(429, "soon"), get_response(200)])
+    response = client.send_message(to_phone_number="391234567890", message="Ciao")
+    assert response.status_code == 200
+    assert len(posts) == 2
+    assert len(waits) == 1  # backed off exponentially